@@ -1,18 +1,52 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
 import os
-from datetime import datetime, timedelta, timezone
+import base64
+import binascii
+import functools
+import hashlib
+import codecs
+import csv
+import io
+import json
+import mimetypes
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
 from config import current_config
+from auth import PasswordHasher
+from cache import DataVersion, TTLCache
+from storage import AttachmentStorage
+from events import EventHub, format_sse
+from database import PoolStats, engine_options, install_sqlite_pragmas
+from metrics import Metrics, profile_requests
+from compression import Compressor, StaticAssets
+from serialization import FastJSONEncoder, dumps, format_datetime, isoformat, iter_dicts, rows_to_dicts
+from ledger import (ADJUSTMENT_CATEGORY, balances_as_of, balances_select_from, compact, counts_in_windows,
+                    credit_rollups, is_application, latest_snapshot_select, open_accounts, window_points_select)
 
 app = Flask(__name__, static_folder='static')
 CORS(app)
 app.config.from_object(current_config)
 
-# 确保上传目录存在
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# 安装了 orjson 时 jsonify 用它编码
+if app.config['JSON_FAST_ENCODER']:
+    app.json_encoder = FastJSONEncoder
+
+# 按数据库类型配置连接池，SQLite 连接建立时设置 WAL 等 PRAGMA
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config))
+install_sqlite_pragmas(app.config['SQLITE_PRAGMAS'])
+
+# 附件按内容寻址保存在上传目录下（同时确保上传目录存在）
+attachment_storage = AttachmentStorage.from_config(app.config, app.root_path)
+
+# 密码哈希策略，校验在独立的进程池中进行
+password_hasher = PasswordHasher.from_config(app.config)
 
 # 配置JWT
 jwt = JWTManager(app)
@@ -40,12 +74,42 @@ def unauthorized_callback(error):
         'message': '未提供Token，请先登录'
     }), 401
 
+# JSON、HTML 等文本响应按 Accept-Encoding 压缩
+compressor = Compressor.from_config(app.config)
+compressor.init_app(app)
+
+# 页面和静态资源启动时预加载、预压缩，带内容哈希 ETag 和长期缓存
+static_assets = StaticAssets.from_config(app.config, app.root_path, reload=app.debug)
+static_assets.load(['index.html', 'main.html', 'admin', 'static'])
+
+def send_static_asset(directory, filename):
+    """优先返回预加载的文件，未预加载（过大或启动后新增）时从磁盘发送"""
+    name = f'{directory}/{filename}' if directory != '.' else filename
+    response = static_assets.send(name)
+    if response is None:
+        response = send_from_directory(directory, filename)
+    return response
+
+@app.endpoint('static')
+def serve_static(filename):
+    return send_static_asset('static', filename)
+
 @app.route('/admin/<path:filename>')
 def serve_admin(filename):
-    return send_from_directory('admin', filename)
+    return send_static_asset('admin', filename)
 
 db = SQLAlchemy(app)
 
+# 连接池借出统计，由健康检查接口输出
+with app.app_context():
+    pool_stats = PoolStats.attach(db.engine)
+    metrics = Metrics.from_config(app.config).attach(db.engine)
+
+# 每个请求的耗时、SQL 语句数和慢查询，通过 /metrics 输出
+metrics.init_app(app)
+if app.config['PROFILER_ENABLED']:
+    profile_requests(app, os.path.join(app.root_path, app.config['PROFILER_OUTPUT_DIR']))
+
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -54,8 +118,15 @@ class User(db.Model):
     name = db.Column(db.String(80), nullable=False)
     type = db.Column(db.String(20), nullable=False)  # 'normal' or 'branch'
     role = db.Column(db.String(20), nullable=False)
-    points = db.Column(db.Integer, default=80)
+    points = db.Column(db.Integer, default=80, index=True)  # 账本（已通过的积分记录）之和的缓存；排名按积分计数，需要索引
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        # 支部委员按 (type, role) 查询职务是否已被占用
+        db.Index('ix_user_type_role', 'type', 'role'),
+        # 用户目录按姓名前缀搜索并排序
+        db.Index('ix_user_name_id', 'name', 'id'),
+    )
 
 class Activity(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -72,6 +143,13 @@ class Activity(db.Model):
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     reviewed_at = db.Column(db.DateTime)
     
+    __table_args__ = (
+        db.Index('ix_activity_created_at_id', 'created_at', 'id'),
+        db.Index('ix_activity_status_created_at', 'status', 'created_at'),
+        db.Index('ix_activity_status_start_time', 'status', 'start_time'),
+        db.Index('ix_activity_status_end_time', 'status', 'end_time'),
+    )
+    
     # 次要负责人关联表
     sub_responsibles = db.relationship('User', secondary='activity_sub_responsibles',
                                      backref=db.backref('sub_activities', lazy='dynamic'))
@@ -91,10 +169,39 @@ class PointsRecord(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     points = db.Column(db.Integer, nullable=False)
     reason = db.Column(db.Text)
+    category = db.Column(db.String(50), index=True)  # 贡献分类，活动负责人积分为 '活动'
+    subcategory = db.Column(db.String(50))
+    summary = db.Column(db.Text)
+    hours = db.Column(db.Integer)  # 仅 '其他贡献' 按时长计分
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     reviewer_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     reviewed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_points_record_category_subcategory', 'category', 'subcategory'),
+        # 待审核列表、月榜/周榜窗口聚合
+        db.Index('ix_points_record_status_created_at', 'status', 'created_at'),
+        # 已通过积分流水按审核时间筛选和排序
+        db.Index('ix_points_record_status_reviewed_at', 'status', 'reviewed_at'),
+        # 个人积分记录和分类汇总
+        db.Index('ix_points_record_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+class Attachment(db.Model):
+    """按 SHA-256 去重保存的支撑材料文件"""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    mimetype = db.Column(db.String(100), nullable=False)
+    original_name = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+class PointsRecordAttachment(db.Model):
+    __tablename__ = 'points_record_attachments'
+    points_record_id = db.Column(db.Integer, db.ForeignKey('points_record.id'), primary_key=True)
+    attachment_id = db.Column(db.Integer, db.ForeignKey('attachment.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
 class ActivityParticipant(db.Model):
     __tablename__ = 'activity_participants'
@@ -102,12 +209,601 @@ class ActivityParticipant(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
+class LeaderboardSnapshot(db.Model):
+    """滚动时间窗口排行榜（月榜、周榜）的快照元信息"""
+    __tablename__ = 'leaderboard_snapshot'
+    period = db.Column(db.String(20), primary_key=True)
+    window_start = db.Column(db.DateTime, nullable=False)
+    built_at = db.Column(db.DateTime)  # 为空表示快照已失效，需要重建
+
+class LeaderboardEntry(db.Model):
+    """排行榜快照中每个用户在该时间窗口内的积分"""
+    __tablename__ = 'leaderboard_entry'
+    period = db.Column(db.String(20), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.Index('ix_leaderboard_entry_period_points', 'period', 'points'),)
+
+class PointsDailyRollup(db.Model):
+    """每个用户每天（按积分记录创建日期，UTC）获得的积分，不含基础分，用于任意时间段的排行"""
+    __tablename__ = 'points_daily_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+
+class PointsBalanceSnapshot(db.Model):
+    """截至 as_of（不含）每个用户的账本余额，由每日压缩任务写入，见 ledger.py"""
+    __tablename__ = 'points_balance_snapshot'
+    as_of = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    balance = db.Column(db.Integer, nullable=False)
+
 # Helper Functions
 def is_branch_member(user):
-    return user.type == 'branch'
+    return user is not None and user.type == 'branch'
 
 def is_admin(user):
-    return user.role == '支部书记'
+    return user is not None and user.role == '支部书记'
+
+# 支部委员中每个职务只能有一人
+COMMITTEE_ROLES = ['宣传委员', '组织委员', '支部书记']
+
+# 当前用户的身份信息快照，不含会随审核变化的积分
+CachedUser = namedtuple('CachedUser', ['id', 'username', 'name', 'type', 'role'])
+
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+# 用户资料被修改或删除的时间，在此之前签发的 Token 声明不再可信
+_user_changed_at = {}
+
+def create_user_token(user):
+    """签发 Token，并把 type、role 写入声明，权限判断无需再查询数据库"""
+    return create_access_token(identity=user.id, additional_claims={'type': user.type, 'role': user.role})
+
+def load_current_user():
+    """请求内共享的当前用户行加载器，同一请求最多查询一次数据库"""
+    if 'current_user' not in g:
+        g.current_user = User.query.get(get_jwt_identity())
+        if g.current_user is not None:
+            remember_user(g.current_user)
+    return g.current_user
+
+def remember_user(user):
+    user_cache.set(user.id, CachedUser(user.id, user.username, user.name, user.type, user.role))
+
+def cached_identity(user_id, claims):
+    """不查询数据库能得到的当前用户：声明仍然有效时使用声明，其次使用进程内缓存，都没有时返回 None
+
+    Flask 视图和 asgi 的异步视图共用，缓存未命中时各自查询数据库。
+    """
+    issued_at = claims.get('iat', 0)
+    if ('type' in claims and 'role' in claims
+            and issued_at > _user_changed_at.get(user_id, 0)
+            and time.time() - issued_at < app.config['USER_CLAIMS_MAX_AGE']):
+        return CachedUser(user_id, None, None, claims['type'], claims['role'])
+    return user_cache.get(user_id)
+
+def get_current_identity():
+    """返回当前用户的 id、type、role，用户不存在时返回 None
+
+    Token 签发后 USER_CLAIMS_MAX_AGE 秒内且用户资料未被修改时直接使用声明；
+    否则使用进程内缓存，缓存过期才查询数据库。多进程部署下资料修改最迟在
+    max(USER_CLAIMS_MAX_AGE, USER_CACHE_TTL) 秒后对所有进程生效。
+    """
+    user_id = get_jwt_identity()
+    cached = cached_identity(user_id, get_jwt())
+    if cached is not None:
+        return cached
+    user = load_current_user()
+    return user_cache.get(user_id) if user is not None else None
+
+def invalidate_user_cache(user_id):
+    """用户资料修改或删除后调用，使缓存和已签发 Token 的声明失效"""
+    _user_changed_at[user_id] = time.time()
+    user_cache.delete(user_id)
+
+# 读多写少接口的响应缓存，写接口提交后递增 data_version，版本号不一致的缓存即失效
+CachedResponse = namedtuple('CachedResponse', ['version', 'body', 'etag'])
+
+data_version = DataVersion()
+response_cache = TTLCache(
+    maxsize=app.config['RESPONSE_CACHE_SIZE'],
+    ttl=app.config['RESPONSE_CACHE_TTL'],
+    maxbytes=app.config['RESPONSE_CACHE_MAX_BYTES']
+)
+
+def cached_response(scope=None):
+    """缓存 GET 接口的 JSON 响应，并支持 ETag / If-None-Match 条件请求
+
+    缓存键为 (接口, 查询参数, 可见范围)，scope 返回响应所依赖的可见范围（如当前用户 id），
+    响应与用户无关时返回 None。缓存命中且版本号未变时不访问数据库，If-None-Match
+    与 ETag 一致时返回 304。data_version 只记录本进程内的写入，其他进程（调度 worker、
+    其他 Web worker）的写入最迟在 RESPONSE_CACHE_TTL 秒后可见。
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.endpoint, tuple(sorted(request.args.items(multi=True))), scope() if scope else None)
+            version = data_version.current
+            cached = response_cache.get(key)
+            if cached is not None and cached.version == version:
+                response = Response(cached.body, mimetype='application/json')
+                response.set_etag(cached.etag)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed or response.mimetype != 'application/json':
+                    return response
+                body = response.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                # 以视图执行前读取的版本号入缓存，执行期间发生的写入会让这条缓存立即失效
+                response_cache.set(key, CachedResponse(version, body, etag), size=len(body))
+                response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+# 实时推送：写接口提交后发布事件，客户端通过 /api/events（SSE）订阅
+EVENT_TOPICS = ['points', 'activities', 'rankings', 'reviews']
+
+def parse_event_topics(value):
+    """解析逗号分隔的 topics 参数，默认订阅全部，含未知主题时抛出 ValueError"""
+    topics = value.split(',') if value else EVENT_TOPICS
+    if not set(topics) <= set(EVENT_TOPICS):
+        raise ValueError(f'topics 只能是 {",".join(EVENT_TOPICS)}')
+    return topics
+
+# 事件流的固定文本，同步部署和 asgi 的事件流共用
+def sse_opening():
+    return f"retry: {app.config['EVENT_RETRY_MILLISECONDS']}\n: connected\n\n"
+
+SSE_HEARTBEAT = ': heartbeat\n\n'
+
+def sse_resync():
+    return f'event: resync\ndata: {{"version": {data_version.current}}}\n\n'
+
+event_hub = EventHub.from_config(app.config)
+
+def publish_event(topic, event_type, data=None, user_ids=None, branch_only=False):
+    """发布实时事件，附带当前数据版本号；推送失败不影响写接口本身"""
+    try:
+        event_hub.publish(topic, event_type, {'version': data_version.current, **(data or {})},
+                          user_ids=user_ids, branch_only=branch_only)
+    except Exception as e:
+        print('推送事件错误:', str(e))
+
+def current_user_scope():
+    return get_jwt_identity()
+
+def verify_password(user, password):
+    """校验密码；哈希参数落后于当前策略时顺带用新策略重新哈希"""
+    if not password_hasher.verify(user.password, password):
+        return False
+    if password_hasher.needs_rehash(user.password):
+        user.password = password_hasher.hash(password)
+        db.session.commit()
+    return True
+
+def find_missing_user_ids(user_ids):
+    """用一条 IN 查询确认用户存在，按传入顺序返回不存在的 ID"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+    found = {user_id for user_id, in db.session.query(User.id).filter(User.id.in_(user_ids))}
+    return [user_id for user_id in user_ids if user_id not in found]
+
+def user_rank_queries(points):
+    """计算排名的两条计数查询：(积分严格高于 points 的人数, 总人数)，两次计数都走 user.points 索引"""
+    return (db.select(db.func.count(User.id)).where(User.points > points),
+            db.select(db.func.count(User.id)))
+
+def get_user_rank(user):
+    """返回用户的 (排名, 总人数)
+
+    排名 = 积分严格高于该用户的人数 + 1，相同积分获得相同排名，不需要把整张用户表加载到内存。
+    """
+    higher, total = (db.session.execute(query).scalar() for query in user_rank_queries(user.points))
+    return higher + 1, total
+
+def user_info_payload(user, rank, total_users):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'name': user.name,
+        'type': user.type,
+        'role': user.role,
+        'points': user.points,
+        'rank': rank,
+        'total_users': total_users
+    }
+
+# 滚动时间窗口排行榜，总榜直接读取 user.points 索引
+LEADERBOARD_PERIODS = {
+    'month': timedelta(days=30),
+    'week': timedelta(days=7)
+}
+
+_leaderboard_lock = threading.Lock()
+
+def _leaderboard_is_fresh(snapshot):
+    if snapshot is None or snapshot.built_at is None:
+        return False
+    max_age = timedelta(seconds=app.config['LEADERBOARD_REFRESH_SECONDS'])
+    return datetime.utcnow() - snapshot.built_at < max_age
+
+def rebuild_leaderboard(period):
+    """用一条 INSERT ... SELECT 重建指定时间窗口的排行榜快照（由调用方提交事务）"""
+    now = datetime.utcnow()
+    window_start = now - LEADERBOARD_PERIODS[period]
+    period_points = db.session.query(
+        PointsRecord.user_id,
+        db.func.sum(PointsRecord.points).label('points')
+    ).filter(
+        PointsRecord.status == 'approved',
+        PointsRecord.created_at >= window_start,
+        counts_in_windows(PointsRecord.__table__)
+    ).group_by(PointsRecord.user_id).subquery()
+    rows = db.session.query(
+        db.literal(period),
+        User.id,
+        db.func.coalesce(period_points.c.points, 0)
+    ).outerjoin(period_points, period_points.c.user_id == User.id)
+    
+    LeaderboardEntry.query.filter_by(period=period).delete(synchronize_session=False)
+    db.session.execute(LeaderboardEntry.__table__.insert().from_select(['period', 'user_id', 'points'], rows))
+    db.session.merge(LeaderboardSnapshot(period=period, window_start=window_start, built_at=now))
+
+def ensure_leaderboard(period):
+    """快照缺失或过期时重建；并发请求只会有一个线程执行重建"""
+    if _leaderboard_is_fresh(LeaderboardSnapshot.query.get(period)):
+        return
+    with _leaderboard_lock:
+        # 结束当前读事务，以便看到其他线程或进程刚刚提交的快照
+        db.session.commit()
+        if _leaderboard_is_fresh(LeaderboardSnapshot.query.populate_existing().get(period)):
+            return
+        try:
+            rebuild_leaderboard(period)
+            db.session.commit()
+        except IntegrityError:
+            # 其他进程同时完成了重建，直接使用它的结果
+            db.session.rollback()
+
+def invalidate_leaderboards():
+    """用户增删后标记快照失效，下次读取时重建"""
+    LeaderboardSnapshot.query.update({LeaderboardSnapshot.built_at: None}, synchronize_session=False)
+
+def credit_points_bulk(credits):
+    """批量加分，credits 为 (user_id, 积分, 积分记录创建时间) 的列表
+
+    同一用户的积分先在内存中合并，每个用户只执行一条原子 UPDATE（executemany），
+    排行榜快照和按天汇总表按各条记录的创建时间分别累加，与月榜、周榜的统计口径一致。
+    """
+    deltas = {}
+    for user_id, points, _ in credits:
+        deltas[user_id] = deltas.get(user_id, 0) + points
+    if not deltas:
+        return
+    rows = [{'target_id': user_id, 'delta': delta} for user_id, delta in deltas.items()]
+    user_table = User.__table__
+    db.session.execute(
+        user_table.update().where(user_table.c.id == db.bindparam('target_id'))
+        .values(points=user_table.c.points + db.bindparam('delta')),
+        rows
+    )
+    _credit_leaderboards(credits)
+    credit_rollups(db, credits)
+
+def _credit_leaderboards(credits):
+    """把积分累加到窗口覆盖该记录创建时间的排行榜快照中"""
+    entry_table = LeaderboardEntry.__table__
+    for period, window_start in db.session.query(LeaderboardSnapshot.period, LeaderboardSnapshot.window_start):
+        deltas = {}
+        for user_id, points, created_at in credits:
+            if created_at >= window_start:
+                deltas[user_id] = deltas.get(user_id, 0) + points
+        if not deltas:
+            continue
+        db.session.execute(
+            entry_table.update().where(
+                entry_table.c.period == period,
+                entry_table.c.user_id == db.bindparam('target_id')
+            ).values(points=entry_table.c.points + db.bindparam('delta')),
+            [{'target_id': user_id, 'delta': delta} for user_id, delta in deltas.items()]
+        )
+
+class ReviewConflictError(Exception):
+    """批量审核时部分记录已被其他审核人处理"""
+
+REVIEW_BATCH_MAX = 500
+
+def parse_review_decisions(items, id_field):
+    """把 [{id_field: id, 'approved': bool}] 解析为 {id: approved}，格式错误时返回 None"""
+    if not isinstance(items, list) or not items or len(items) > REVIEW_BATCH_MAX:
+        return None
+    decisions = {}
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        try:
+            record_id = int(item.get(id_field))
+        except (TypeError, ValueError):
+            return None
+        decisions[record_id] = bool(item.get('approved'))
+    return decisions
+
+def _apply_review_status(model, ids, status, reviewer_id, reviewed_at):
+    """把仍为 pending 的记录改为审核结果，受影响行数不符说明有并发审核"""
+    if not ids:
+        return
+    updated = model.query.filter(model.id.in_(ids), model.status == 'pending').update({
+        model.status: status,
+        model.reviewer_id: reviewer_id,
+        model.reviewed_at: reviewed_at
+    }, synchronize_session=False)
+    if updated != len(ids):
+        raise ReviewConflictError()
+
+def review_points_records(decisions, reviewer_id):
+    """在当前事务内审核一批积分申请，由调用方提交或回滚
+
+    decisions 为 {record_id: approved}。待审核记录用一条 SELECT ... FOR UPDATE
+    一次取出并加锁，状态按通过、拒绝各一条 UPDATE，通过的积分按用户合并后批量
+    加分。返回 (outcomes, owners)：outcomes 为 {record_id: 'approved' | 'rejected' |
+    'not_found' | 'already_reviewed'}，owners 为本次审核的记录的 {record_id: 申请人 id}。
+    """
+    records = db.session.query(
+        PointsRecord.id, PointsRecord.user_id, PointsRecord.points,
+        PointsRecord.status, PointsRecord.created_at
+    ).filter(PointsRecord.id.in_(list(decisions))).with_for_update().all()
+    found = {record.id: record for record in records}
+    
+    outcomes = {}
+    owners = {}
+    approved_ids, rejected_ids, credits = [], [], []
+    for record_id, approved in decisions.items():
+        record = found.get(record_id)
+        if record is None:
+            outcomes[record_id] = 'not_found'
+        elif record.status != 'pending':
+            outcomes[record_id] = 'already_reviewed'
+        elif approved:
+            outcomes[record_id] = 'approved'
+            owners[record_id] = record.user_id
+            approved_ids.append(record_id)
+            credits.append((record.user_id, record.points, record.created_at))
+        else:
+            outcomes[record_id] = 'rejected'
+            owners[record_id] = record.user_id
+            rejected_ids.append(record_id)
+    
+    reviewed_at = datetime.utcnow()
+    _apply_review_status(PointsRecord, approved_ids, 'approved', reviewer_id, reviewed_at)
+    _apply_review_status(PointsRecord, rejected_ids, 'rejected', reviewer_id, reviewed_at)
+    credit_points_bulk(credits)
+    return outcomes, owners
+
+def review_activities(decisions, reviewer_id):
+    """在当前事务内审核一批活动，返回值同 review_points_records，owners 为活动申请人
+
+    活动开始、结束后的状态推进和负责人积分发放由活动状态调度器完成，这里只改状态。
+    """
+    found = {activity.id: activity for activity in db.session.query(
+        Activity.id, Activity.status, Activity.applicant_id
+    ).filter(Activity.id.in_(list(decisions))).with_for_update()}
+    
+    outcomes = {}
+    owners = {}
+    approved_ids, rejected_ids = [], []
+    for activity_id, approved in decisions.items():
+        activity = found.get(activity_id)
+        if activity is None:
+            outcomes[activity_id] = 'not_found'
+        elif activity.status != 'pending':
+            outcomes[activity_id] = 'already_reviewed'
+        elif approved:
+            outcomes[activity_id] = 'approved'
+            owners[activity_id] = activity.applicant_id
+            approved_ids.append(activity_id)
+        else:
+            outcomes[activity_id] = 'rejected'
+            owners[activity_id] = activity.applicant_id
+            rejected_ids.append(activity_id)
+    
+    reviewed_at = datetime.utcnow()
+    _apply_review_status(Activity, approved_ids, 'approved', reviewer_id, reviewed_at)
+    _apply_review_status(Activity, rejected_ids, 'rejected', reviewer_id, reviewed_at)
+    return outcomes, owners
+
+def notify_reviewed(topic, event_type, outcomes, owners):
+    """审核提交后推送事件：每位申请人收到自己的审核结果，委员的待审核列表随之刷新"""
+    results_by_owner = {}
+    for record_id, owner_id in owners.items():
+        results_by_owner.setdefault(owner_id, []).append({'id': record_id, 'result': outcomes[record_id]})
+    for owner_id, results in results_by_owner.items():
+        publish_event(topic, event_type, {'results': results}, user_ids=[owner_id])
+    if owners:
+        publish_event('reviews', 'review_list.changed', {'kind': topic}, branch_only=True)
+    return 'approved' in outcomes.values()
+
+def review_results(outcomes):
+    return [{'id': record_id, 'result': result} for record_id, result in outcomes.items()]
+
+def run_query_plan(plan):
+    """在当前会话中执行查询计划
+
+    查询计划是产出 select 语句、接收执行结果的生成器，返回值即计划的结果。Flask 视图用本函数
+    执行，asgi 的异步视图用异步连接按相同的步骤执行，两种部署共用同一套查询。
+    """
+    try:
+        query = next(plan)
+        while True:
+            query = plan.send(db.session.execute(query))
+    except StopIteration as e:
+        return e.value
+
+def user_names_plan(user_ids):
+    """用一次 IN 查询取回一批用户的姓名，返回 {user_id: name}（查询计划，见 run_query_plan）"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return {}
+    return dict((yield db.select(User.id, User.name).where(User.id.in_(user_ids))).all())
+
+def activity_members_plan(association, activity_ids):
+    """用一次联表查询取回多个活动的关联用户（次要负责人或参与者）
+
+    association 为 ActivitySubResponsible 或 ActivityParticipant，
+    返回 {activity_id: [(user_id, name), ...]}（查询计划，见 run_query_plan）。
+    """
+    members = {activity_id: [] for activity_id in activity_ids}
+    if not members:
+        return members
+    rows = (yield db.select(
+        association.activity_id, User.id, User.name
+    ).join(User, User.id == association.user_id).where(
+        association.activity_id.in_(members)
+    ).order_by(association.created_at, association.user_id)).all()
+    for activity_id, user_id, name in rows:
+        members[activity_id].append((user_id, name))
+    return members
+
+def load_user_names(user_ids):
+    return run_query_plan(user_names_plan(user_ids))
+
+def load_activity_members(association, activity_ids):
+    return run_query_plan(activity_members_plan(association, activity_ids))
+
+# 活动列表分页
+ACTIVITY_PAGE_SIZE = 20
+ACTIVITY_PAGE_SIZE_MAX = 100
+
+def encode_activity_cursor(activity):
+    """把分页位置 (created_at, id) 编码为不透明的游标字符串"""
+    raw = f'{activity.created_at.isoformat()}|{activity.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_activity_cursor(cursor):
+    """解析游标，返回 (created_at, id)；格式错误时抛出 ValueError"""
+    if not cursor:
+        return None
+    try:
+        created_at, activity_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError('invalid cursor')
+    return datetime.fromisoformat(created_at), int(activity_id)
+
+def parse_date_arg(value):
+    """解析 YYYY-MM-DD 格式的查询参数，格式错误时抛出 ValueError"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d')
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+
+# 浏览器中可以直接显示的附件类型，其余类型一律作为下载返回，避免上传的 HTML/SVG 在本站执行脚本
+INLINE_MIMETYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp'}
+
+def attachment_mimetype(filename):
+    """按已校验的扩展名确定附件类型，不采用客户端声明的 Content-Type"""
+    return mimetypes.guess_type(f"file.{filename.rsplit('.', 1)[-1].lower()}")[0] or 'application/octet-stream'
+
+def find_attachment(sha256):
+    return Attachment.query.filter_by(sha256=sha256).first()
+
+def save_attachment(file, sha256, size):
+    """返回内容为 sha256 的 Attachment，不存在时在当前事务中创建
+
+    两个请求同时上传相同内容时，后插入的一方违反唯一约束，回滚到保存点后取回对方的记录，
+    不影响同一事务中已写入的积分记录。
+    """
+    attachment = find_attachment(sha256)
+    if attachment is not None:
+        return attachment
+    try:
+        with db.session.begin_nested():
+            attachment = Attachment(
+                sha256=sha256,
+                size=size,
+                mimetype=attachment_mimetype(file.filename),
+                original_name=file.filename[:255]
+            )
+            db.session.add(attachment)
+    except IntegrityError:
+        attachment = find_attachment(sha256)
+    return attachment
+
+def load_record_attachments(record_ids):
+    """一次查询取回多条积分记录的附件 id，返回 {points_record_id: [attachment_id, ...]}"""
+    attachments = {record_id: [] for record_id in record_ids}
+    if not attachments:
+        return attachments
+    rows = db.session.query(
+        PointsRecordAttachment.points_record_id, PointsRecordAttachment.attachment_id
+    ).filter(PointsRecordAttachment.points_record_id.in_(attachments)).order_by(
+        PointsRecordAttachment.points_record_id, PointsRecordAttachment.attachment_id
+    ).all()
+    for record_id, attachment_id in rows:
+        attachments[record_id].append(attachment_id)
+    return attachments
+
+# 流式响应：每次从数据库取的行数，以及攒够多少字节向客户端输出一次
+STREAM_BATCH_SIZE = 500
+STREAM_FLUSH_BYTES = 64 * 1024
+
+def stream_csv(header, rows):
+    """把行迭代器编码为分块输出的 CSV，带 BOM 方便直接用 Excel 打开"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    # 先输出表头，客户端立即收到首字节
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_ndjson(items):
+    """把字典迭代器编码为分块输出的 JSON Lines"""
+    items = iter(items)
+    # 与 stream_csv 的表头一样，第一条记录单独输出，客户端立即收到首字节
+    for item in items:
+        yield dumps(item) + '\n'
+        break
+    chunk = []
+    size = 0
+    for item in items:
+        line = dumps(item) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= STREAM_FLUSH_BYTES:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    yield ''.join(chunk)
+
+def _rank_rows(rows, first_rank, start_position):
+    """为一页排行数据计算排名，相同积分获得相同排名；first_rank 为本页第一行的排名"""
+    rankings = []
+    current_rank = None
+    current_points = None
+    for i, row in enumerate(rows):
+        if current_points != row.points:
+            current_rank = first_rank if current_rank is None else start_position + i + 1
+            current_points = row.points
+        rankings.append({
+            'name': row.name,
+            'points': row.points,
+            'userId': row.user_id,
+            'rank': current_rank
+        })
+    return rankings
 
 # API Routes
 @app.route('/api/login', methods=['POST'])
@@ -115,10 +811,10 @@ def login():
     data = request.get_json()
     user = User.query.filter_by(username=data['username']).first()
     
-    if user and check_password_hash(user.password, data['password']):
+    if user and verify_password(user, data['password']):
         if (data['type'] == 'branch' and is_branch_member(user)) or \
            (data['type'] == 'normal' and not is_branch_member(user)):
-            access_token = create_access_token(identity=user.id)
+            access_token = create_user_token(user)
             return jsonify({
                 'success': True,
                 'token': access_token,
@@ -132,7 +828,7 @@ def login():
             })
         return jsonify({'success': False, 'message': '身份类型不匹配'}), 401
         
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
         return jsonify({
             'success': True,
             'token': access_token,
@@ -152,8 +848,8 @@ def admin_login():
     data = request.get_json()
     user = User.query.filter_by(username=data['username']).first()
     
-    if user and check_password_hash(user.password, data['password']) and is_admin(user):
-        access_token = create_access_token(identity=user.id)
+    if user and verify_password(user, data['password']) and is_admin(user):
+        access_token = create_user_token(user)
         return jsonify({
             'success': True,
             'token': access_token
@@ -164,7 +860,7 @@ def admin_login():
 @app.route('/api/admin/users', methods=['GET'])
 @jwt_required()
 def get_users():
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_admin(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
@@ -198,7 +894,7 @@ def get_users():
 @app.route('/api/admin/users', methods=['POST'])
 @jwt_required()
 def create_user():
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_admin(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
@@ -207,28 +903,176 @@ def create_user():
         return jsonify({'success': False, 'message': '用户名已存在'}), 400
     
     # 检查支部委员职务唯一性
-    if data['type'] == 'branch' and data['role'] in ['宣传委员', '组织委员', '支部书记']:
+    if data['type'] == 'branch' and data['role'] in COMMITTEE_ROLES:
         existing_user = User.query.filter_by(type='branch', role=data['role']).first()
         if existing_user:
             return jsonify({'success': False, 'message': f'{data["role"]}职务已存在'}), 400
     
     user = User(
         username=data['username'],
-        password=generate_password_hash(data['password']),
+        password=password_hasher.hash(data['password']),
         name=data['name'],
         type=data['type'],
         role=data['role']
     )
     
     db.session.add(user)
+    db.session.flush()
+    open_accounts(db, [user.id])
+    invalidate_leaderboards()
     db.session.commit()
+    data_version.bump()
     
     return jsonify({'success': True})
 
+# 批量导入的必填字段和每个事务插入的行数
+IMPORT_FIELDS = ['username', 'password', 'name', 'type', 'role']
+IMPORT_CHUNK_SIZE = 200
+
+IMPORT_DECODE_ERROR = '文件不是 UTF-8 编码，请另存为 UTF-8 后重新导入；本行及之后的内容未导入'
+
+def iter_import_rows(stream, mimetype):
+    """逐行解析上传的 CSV 或 JSON Lines，产出 (行号, 行数据或解析错误信息)，不把整个文件读入内存
+
+    编码错误或 CSV 格式错误时产出出错的行号和错误信息后停止，之前的行照常导入。
+    """
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if mimetype == 'text/csv':
+        reader = csv.DictReader(lines)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except UnicodeDecodeError:
+            yield reader.line_num + 1, IMPORT_DECODE_ERROR
+        except csv.Error as e:
+            yield reader.line_num, f'CSV 格式错误：{e}；本行及之后的内容未导入'
+        return
+    line_num = 0
+    try:
+        for line in lines:
+            line_num += 1
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_num, '无法解析的 JSON'
+                continue
+            yield line_num, row if isinstance(row, dict) else '每行必须是一个 JSON 对象'
+    except UnicodeDecodeError:
+        yield line_num + 1, IMPORT_DECODE_ERROR
+
+def _insert_import_chunk(chunk, report):
+    """并行哈希一批用户的密码，并在一个事务内插入"""
+    passwords = password_hasher.hash_many(row['password'] for _, row in chunk)
+    try:
+        db.session.execute(User.__table__.insert(), [{
+            'username': row['username'],
+            'password': password,
+            'name': row['name'],
+            'type': row['type'],
+            'role': row['role']
+        } for (_, row), password in zip(chunk, passwords)])
+        open_accounts(db, [user_id for user_id, in db.session.query(User.id).filter(
+            User.username.in_([row['username'] for _, row in chunk])
+        )])
+        db.session.commit()
+        data_version.bump()
+        report['created'] += len(chunk)
+    except IntegrityError:
+        # 导入期间有其他请求创建了同名用户，本批次整体失败
+        db.session.rollback()
+        for line_num, row in chunk:
+            report['errors'].append({'line': line_num, 'username': row['username'], 'message': '写入失败，用户名可能已被占用'})
+
+@app.route('/api/admin/users/import', methods=['POST'])
+@jwt_required()
+def import_users():
+    current_user = get_current_identity()
+    if not is_admin(current_user):
+        return jsonify({'success': False, 'message': '权限不足'}), 403
+    
+    if request.mimetype not in ('text/csv', 'application/x-ndjson', 'application/jsonl'):
+        return jsonify({'success': False, 'message': '仅支持 CSV 或 JSON Lines 格式'}), 415
+    
+    # 预先取出已有用户名和已被占用的委员职务，逐行校验时不再查询数据库
+    usernames = {username for username, in db.session.query(User.username)}
+    taken_roles = {role for role, in db.session.query(User.role).filter(
+        User.type == 'branch', User.role.in_(COMMITTEE_ROLES)
+    )}
+    
+    report = {'created': 0, 'errors': []}
+    chunk = []
+    for line_num, row in iter_import_rows(request.stream, request.mimetype):
+        if isinstance(row, str):
+            report['errors'].append({'line': line_num, 'username': None, 'message': row})
+            continue
+        row = {field: str(row.get(field) or '').strip() for field in IMPORT_FIELDS}
+        missing = [field for field in IMPORT_FIELDS if not row[field]]
+        if missing:
+            message = f'缺少必要字段：{", ".join(missing)}'
+        elif row['type'] not in ('normal', 'branch'):
+            message = f'无效的用户类型：{row["type"]}'
+        elif row['username'] in usernames:
+            message = '用户名已存在'
+        elif row['type'] == 'branch' and row['role'] in taken_roles:
+            message = f'{row["role"]}职务已存在'
+        else:
+            message = None
+        if message:
+            report['errors'].append({'line': line_num, 'username': row['username'] or None, 'message': message})
+            continue
+        
+        usernames.add(row['username'])
+        if row['type'] == 'branch' and row['role'] in COMMITTEE_ROLES:
+            taken_roles.add(row['role'])
+        chunk.append((line_num, row))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            _insert_import_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        _insert_import_chunk(chunk, report)
+    
+    if report['created']:
+        invalidate_leaderboards()
+        db.session.commit()
+    
+    return jsonify({
+        'success': not report['errors'],
+        'created': report['created'],
+        'failed': len(report['errors']),
+        'errors': report['errors']
+    })
+
+@app.route('/api/admin/users/export', methods=['GET'])
+@jwt_required()
+def export_users():
+    current_user = get_current_identity()
+    if not is_admin(current_user):
+        return jsonify({'success': False, 'message': '权限不足'}), 403
+    
+    rows = db.session.query(
+        User.id, User.username, User.name, User.type, User.role, User.points
+    ).order_by(User.points.desc(), User.id).yield_per(STREAM_BATCH_SIZE)
+    
+    def ranked_rows():
+        current_rank = 1
+        current_points = None
+        for i, row in enumerate(rows):
+            if current_points != row.points:
+                current_rank = i + 1
+                current_points = row.points
+            yield [row.id, row.username, row.name, row.type, row.role, row.points, current_rank]
+    
+    header = ['id', 'username', 'name', 'type', 'role', 'points', 'rank']
+    return Response(stream_with_context(stream_csv(header, ranked_rows())), mimetype='text/csv', headers={
+        'Content-Disposition': 'attachment; filename=users.csv'
+    })
+
 @app.route('/api/admin/users/<int:user_id>', methods=['GET'])
 @jwt_required()
 def get_user(user_id):
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_admin(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
@@ -247,7 +1091,7 @@ def get_user(user_id):
 @app.route('/api/admin/users/<int:user_id>', methods=['PUT'])
 @jwt_required()
 def update_user(user_id):
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_admin(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
@@ -260,7 +1104,7 @@ def update_user(user_id):
         user.username = data['username']
     
     if 'password' in data:
-        user.password = generate_password_hash(data['password'])
+        user.password = password_hasher.hash(data['password'])
     
     if 'name' in data:
         user.name = data['name']
@@ -270,44 +1114,34 @@ def update_user(user_id):
     
     if 'role' in data:
         # 检查支部委员职务唯一性
-        if data.get('type', user.type) == 'branch' and data['role'] in ['宣传委员', '组织委员', '支部书记']:
+        if data.get('type', user.type) == 'branch' and data['role'] in COMMITTEE_ROLES:
             existing_user = User.query.filter(User.id != user_id, User.type == 'branch', User.role == data['role']).first()
             if existing_user:
                 return jsonify({'success': False, 'message': f'{data["role"]}职务已存在'}), 400
         user.role = data['role']
     
     db.session.commit()
+    data_version.bump()
+    invalidate_user_cache(user_id)
     return jsonify({'success': True})
 
 @app.route('/api/user/info', methods=['GET'])
 @jwt_required()
 def get_user_info():
     try:
-        current_user = User.query.get(get_jwt_identity())
+        current_user = load_current_user()
         if not current_user:
             return jsonify({
                 'success': False,
                 'message': '获取用户信息失败'
             }), 404
         
-        # 获取所有用户并按积分降序排序
-        users = User.query.order_by(User.points.desc()).all()
-        
-        # 找到当前用户的排名
-        user_rank = next((index + 1 for index, user in enumerate(users) if user.id == current_user.id), None)
+        # 通过索引计数得到当前用户的排名
+        user_rank, total_users = get_user_rank(current_user)
         
         return jsonify({
             'success': True,
-            'user': {
-                'id': current_user.id,
-                'username': current_user.username,
-                'name': current_user.name,
-                'type': current_user.type,
-                'role': current_user.role,
-                'points': current_user.points,
-                'rank': user_rank,
-                'total_users': len(users)
-            }
+            'user': user_info_payload(current_user, user_rank, total_users)
         })
     except Exception as e:
         print('获取用户信息错误:', str(e))
@@ -320,24 +1154,21 @@ def get_user_info():
 @jwt_required()
 def get_user_points():
     try:
-        current_user = User.query.get(get_jwt_identity())
+        current_user = load_current_user()
         if not current_user:
             return jsonify({
                 'success': False,
                 'message': '获取用户信息失败'
             }), 404
         
-        # 获取所有用户并按积分降序排序
-        users = User.query.order_by(User.points.desc()).all()
-        
-        # 找到当前用户的排名
-        user_rank = next((index + 1 for index, user in enumerate(users) if user.id == current_user.id), None)
+        # 通过索引计数得到当前用户的排名
+        user_rank, total_users = get_user_rank(current_user)
         
         return jsonify({
             'success': True,
             'points': current_user.points,
             'rank': user_rank,
-            'total_users': len(users)
+            'total_users': total_users
         })
     except Exception as e:
         print('获取积分错误:', str(e))
@@ -346,22 +1177,67 @@ def get_user_points():
             'message': f'获取积分失败: {str(e)}'
         }), 500
 
+@app.route('/api/admin/users/<int:user_id>/points', methods=['POST'])
+@jwt_required()
+def adjust_user_points(user_id):
+    current_user = get_current_identity()
+    if not is_admin(current_user):
+        return jsonify({'success': False, 'message': '权限不足'}), 403
+    
+    data = request.get_json() or {}
+    points = data.get('points')
+    reason = str(data.get('reason') or '').strip()
+    if not isinstance(points, int) or isinstance(points, bool) or points == 0:
+        return jsonify({'success': False, 'message': '调整分值须为非零整数'}), 400
+    if not reason:
+        return jsonify({'success': False, 'message': '请填写调整原因'}), 400
+    
+    user = User.query.get_or_404(user_id)
+    now = datetime.utcnow()
+    # 调整同样是一条已通过的账本记录，余额和排行榜与审核通过的积分走同一条路径
+    db.session.add(PointsRecord(
+        user_id=user.id,
+        points=points,
+        reason=f'{ADJUSTMENT_CATEGORY}: {reason}',
+        category=ADJUSTMENT_CATEGORY,
+        summary=reason,
+        status='approved',
+        reviewer_id=current_user.id,
+        created_at=now,
+        reviewed_at=now
+    ))
+    credit_points_bulk([(user.id, points, now)])
+    db.session.commit()
+    data_version.bump()
+    
+    return jsonify({
+        'success': True,
+        'points': db.session.query(User.points).filter(User.id == user.id).scalar()
+    })
+
 @app.route('/api/admin/users/<int:user_id>', methods=['DELETE'])
 @jwt_required()
 def delete_user(user_id):
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_admin(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
     user = User.query.get_or_404(user_id)
+    LeaderboardEntry.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    PointsBalanceSnapshot.query.filter_by(user_id=user.id).delete(synchronize_session=False)
     db.session.delete(user)
     db.session.commit()
+    data_version.bump()
+    invalidate_user_cache(user_id)
     return jsonify({'success': True})
 
+# 按时长计分的贡献，单次申请的时长上限（小时）
+MAX_CONTRIBUTION_HOURS = 100
+
 @app.route('/api/points/apply', methods=['POST'])
 @jwt_required()
 def apply_points():
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     
     # 获取表单数据
     category = request.form.get('category')
@@ -369,54 +1245,158 @@ def apply_points():
     summary = request.form.get('summary')
     hours = request.form.get('hours')
     
-    # 获取上传的文件
-    file = request.files.get('file')
-    if not file:
+    # 获取上传的文件（可上传多个）
+    files = [file for file in request.files.getlist('file') if file.filename]
+    if not files:
         return jsonify({'success': False, 'message': '请上传支撑材料'}), 400
+    for file in files:
+        if not allowed_file(file.filename):
+            return jsonify({'success': False, 'message': f'不支持的文件类型：{file.filename}'}), 400
     
     # 计算积分
     points = 0
     if category in contributionCategories and subcategory in contributionCategories[category]:
         points = contributionCategories[category][subcategory]
         if category == '其他贡献' and hours:
-            points *= int(hours)
+            try:
+                hours = int(hours)
+            except ValueError:
+                hours = None
+            if hours is None or not 1 <= hours <= MAX_CONTRIBUTION_HOURS:
+                return jsonify({'success': False, 'message': '无效的时长'}), 400
+            points *= hours
+        else:
+            hours = None
     else:
         return jsonify({'success': False, 'message': '无效的贡献类型'}), 400
     
-    # 创建积分记录
-    points_record = PointsRecord(
-        user_id=current_user.id,
-        points=points,
-        reason=f'{category}-{subcategory}: {summary}',
-        status='pending'
-    )
+    # 先把支撑材料写入临时文件，数据库提交后再移入存储，失败时删除，不留下无记录引用的文件
+    staged = []
+    try:
+        for file in files:
+            staged.append(attachment_storage.stage(file.stream))
+        
+        # 创建积分记录
+        points_record = PointsRecord(
+            user_id=current_user.id,
+            points=points,
+            reason=f'{category}-{subcategory}: {summary}',
+            category=category,
+            subcategory=subcategory,
+            summary=summary,
+            hours=hours,
+            status='pending'
+        )
+        
+        db.session.add(points_record)
+        db.session.flush()
+        
+        # 关联支撑材料，相同内容的文件只保存一份
+        attachments = [save_attachment(file, sha256, size) for file, (sha256, size, _) in zip(files, staged)]
+        for attachment in {attachment.id: attachment for attachment in attachments}.values():
+            db.session.add(PointsRecordAttachment(points_record_id=points_record.id, attachment_id=attachment.id))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for _, _, tmp_path in staged:
+            attachment_storage.discard(tmp_path)
+        print('提交积分申请错误:', str(e))
+        return jsonify({'success': False, 'message': '服务器处理请求时发生错误'}), 500
     
-    db.session.add(points_record)
-    db.session.commit()
+    for sha256, _, tmp_path in staged:
+        attachment_storage.publish(sha256, tmp_path)
+    data_version.bump()
+    publish_event('reviews', 'points.submitted', {'applicationId': points_record.id}, branch_only=True)
+    
+    for attachment in attachments:
+        if attachment.mimetype.startswith('image/'):
+            attachment_storage.schedule_thumbnail(attachment.sha256)
     
     return jsonify({'success': True})
 
 
 
+def _get_visible_attachment(attachment_id):
+    """返回当前用户有权查看的附件：支部委员可查看全部，普通党员只能查看自己申请的附件"""
+    current_user = get_current_identity()
+    attachment = Attachment.query.get(attachment_id)
+    if attachment is None or current_user is None:
+        return None
+    if is_branch_member(current_user):
+        return attachment
+    owned = db.session.query(db.exists().where(db.and_(
+        PointsRecordAttachment.attachment_id == attachment_id,
+        PointsRecordAttachment.points_record_id == PointsRecord.id,
+        PointsRecord.user_id == current_user.id
+    ))).scalar()
+    return attachment if owned else None
+
+def _send_attachment_file(path, mimetype, sha256, download_name=None):
+    """支持 Range 请求和 ETag 协商的文件响应；内容按哈希寻址，可长期缓存
+
+    只有 INLINE_MIMETYPES 中的图片在浏览器内显示，其余内容（包括旧数据中按客户端声明
+    保存的类型）以 application/octet-stream 下载，并禁止浏览器嗅探类型。
+    """
+    inline = mimetype in INLINE_MIMETYPES
+    response = send_file(path, mimetype=mimetype if inline else 'application/octet-stream',
+                         as_attachment=not inline, conditional=True, etag=sha256,
+                         download_name=download_name,
+                         max_age=app.config['ATTACHMENT_CACHE_MAX_AGE'])
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    # 附件需要登录才能访问，只允许浏览器私有缓存
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@app.route('/api/attachments/<int:attachment_id>', methods=['GET'])
+@jwt_required()
+def get_attachment(attachment_id):
+    attachment = _get_visible_attachment(attachment_id)
+    if attachment is None:
+        return jsonify({'success': False, 'message': '附件不存在'}), 404
+    return _send_attachment_file(attachment_storage.path_for(attachment.sha256), attachment.mimetype,
+                                 attachment.sha256, attachment.original_name)
+
+@app.route('/api/attachments/<int:attachment_id>/thumbnail', methods=['GET'])
+@jwt_required()
+def get_attachment_thumbnail(attachment_id):
+    attachment = _get_visible_attachment(attachment_id)
+    if attachment is None:
+        return jsonify({'success': False, 'message': '附件不存在'}), 404
+    path = attachment_storage.thumbnail_path_for(attachment.sha256)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'message': '缩略图尚未生成'}), 404
+    return _send_attachment_file(path, 'image/jpeg', f'{attachment.sha256}-thumb')
+
 @app.route('/api/activity/review/list', methods=['GET'])
 @jwt_required()
 def get_activity_review_list():
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_branch_member(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
-    # 获取所有待审核的活动，按创建时间倒序排序
-    pending_activities = Activity.query.filter_by(status='pending').order_by(Activity.created_at.desc()).all()
+    # 获取所有待审核的活动，按创建时间倒序排序，只取需要的列
+    pending_activities = db.session.query(
+        Activity.id,
+        Activity.title,
+        Activity.description,
+        Activity.points,
+        Activity.start_time,
+        Activity.end_time,
+        Activity.applicant_id,
+        Activity.created_at
+    ).filter(Activity.status == 'pending').order_by(Activity.created_at.desc()).all()
+    user_names = load_user_names(activity.applicant_id for activity in pending_activities)
     
     activities = [{
         'id': activity.id,
         'title': activity.title,
         'description': activity.description,
         'points': activity.points,
-        'start_time': activity.start_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'end_time': activity.end_time.strftime('%Y-%m-%d %H:%M:%S'),
-        'applicant': User.query.get(activity.applicant_id).name,
-        'created_at': activity.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        'start_time': format_datetime(activity.start_time),
+        'end_time': format_datetime(activity.end_time),
+        'applicant': user_names.get(activity.applicant_id),
+        'created_at': format_datetime(activity.created_at)
     } for activity in pending_activities]
     
     return jsonify({
@@ -427,27 +1407,33 @@ def get_activity_review_list():
 @app.route('/api/points/review/list', methods=['GET'])
 @jwt_required()
 def get_points_review_list():
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_branch_member(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
-    # 获取所有待审核的积分记录
-    pending_records = PointsRecord.query.filter_by(status='pending').all()
+    # 获取所有待审核的积分记录，直接按列取值并联表取得申请人姓名
+    pending_records = db.session.query(
+        PointsRecord.id,
+        User.name,
+        PointsRecord.category,
+        PointsRecord.subcategory,
+        PointsRecord.summary,
+        PointsRecord.hours,
+        PointsRecord.points
+    ).join(User, User.id == PointsRecord.user_id).filter(PointsRecord.status == 'pending').all()
     
-    applications = []
-    for record in pending_records:
-        user = User.query.get(record.user_id)
-        try:
-            applications.append({
-                'id': record.id,
-                'userName': user.name,
-                'category': record.reason.split('-')[0],
-                'subcategory': record.reason.split('-')[1].split(':')[0].strip(),
-                'summary': record.reason.split(':')[1].strip(),
-                'points': record.points
-            })
-        except Exception as e:
-            continue
+    attachments = load_record_attachments([record.id for record in pending_records])
+    
+    applications = [{
+        'id': record.id,
+        'userName': record.name,
+        'category': record.category,
+        'subcategory': record.subcategory,
+        'summary': record.summary,
+        'hours': record.hours,
+        'points': record.points,
+        'attachments': attachments[record.id]
+    } for record in pending_records]
     
     return jsonify({
         'success': True,
@@ -457,34 +1443,76 @@ def get_points_review_list():
 @app.route('/api/points/review', methods=['POST'])
 @jwt_required()
 def review_points():
-    current_user = User.query.get(get_jwt_identity())
+    current_user = get_current_identity()
     if not is_branch_member(current_user):
         return jsonify({'success': False, 'message': '权限不足'}), 403
     
     data = request.get_json()
-    record_id = data.get('applicationId')
-    approved = data.get('approved')
+    decisions = parse_review_decisions([data], 'applicationId')
+    if decisions is None:
+        return jsonify({'success': False, 'message': '参数错误'}), 400
+    record_id, = decisions
     
-    record = PointsRecord.query.get_or_404(record_id)
-    if record.status != 'pending':
-        return jsonify({'success': False, 'message': '该申请已被审核'}), 400
-    
-    record.status = 'approved' if approved else 'rejected'
-    record.reviewer_id = current_user.id
-    record.reviewed_at = datetime.utcnow()
+    try:
+        outcomes, owners = review_points_records(decisions, current_user.id)
+        outcome = outcomes[record_id]
+        if outcome == 'not_found':
+            db.session.rollback()
+            return jsonify({'success': False, 'message': '申请不存在'}), 404
+        if outcome == 'already_reviewed':
+            db.session.rollback()
+            return jsonify({'success': False, 'message': '该申请已被审核'}), 409
+        
+        db.session.commit()
+        data_version.bump()
+        if notify_reviewed('points', 'points.reviewed', outcomes, owners):
+            publish_event('rankings', 'rankings.changed')
+        return jsonify({'success': True})
     
-    if approved:
-        user = User.query.get(record.user_id)
-        user.points += record.points
+    except ReviewConflictError:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': '该申请已被审核'}), 409
+    except Exception as e:
+        db.session.rollback()
+        print('审核积分申请错误:', str(e))
+        return jsonify({'success': False, 'message': '服务器处理请求时发生错误'}), 500
+
+@app.route('/api/points/review/batch', methods=['POST'])
+@jwt_required()
+def review_points_batch():
+    try:
+        current_user = get_current_identity()
+        if not is_branch_member(current_user):
+            return jsonify({'success': False, 'message': '权限不足'}), 403
+        
+        data = request.get_json() or {}
+        decisions = parse_review_decisions(data.get('items'), 'applicationId')
+        if decisions is None:
+            return jsonify({
+                'success': False,
+                'message': f'items 须为 1 到 {REVIEW_BATCH_MAX} 条 {{applicationId, approved}}'
+            }), 400
+        
+        outcomes, owners = review_points_records(decisions, current_user.id)
+        db.session.commit()
+        data_version.bump()
+        if notify_reviewed('points', 'points.reviewed', outcomes, owners):
+            publish_event('rankings', 'rankings.changed')
+        return jsonify({'success': True, 'results': review_results(outcomes)})
     
-    db.session.commit()
-    return jsonify({'success': True})
+    except ReviewConflictError:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': '部分申请已被其他人审核，请刷新后重试'}), 409
+    except Exception as e:
+        db.session.rollback()
+        print('批量审核积分申请错误:', str(e))
+        return jsonify({'success': False, 'message': '服务器处理请求时发生错误'}), 500
 
 @app.route('/api/activity/apply', methods=['POST'])
 @jwt_required()
 def apply_activity():
     try:
-        current_user = User.query.get(get_jwt_identity())
+        current_user = get_current_identity()
         data = request.get_json()
         
         # 数据验证
@@ -516,20 +1544,33 @@ def apply_activity():
                 'message': '时间格式错误'
             }), 400
         
-        # 验证负责人
-        main_responsible = User.query.get(data['mainResponsible'])
-        if not main_responsible:
+        # 验证负责人：主要负责人和全部次要负责人用一条 IN 查询确认存在
+        if not isinstance(data['subResponsibles'], list):
+            return jsonify({
+                'success': False,
+                'message': '负责人ID格式错误'
+            }), 400
+        try:
+            main_responsible_id = int(data['mainResponsible'])
+            sub_responsible_ids = list(dict.fromkeys(int(sub_id) for sub_id in data['subResponsibles']))
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': '负责人ID格式错误'
+            }), 400
+        
+        missing = find_missing_user_ids([main_responsible_id] + sub_responsible_ids)
+        if main_responsible_id in missing:
             return jsonify({
                 'success': False,
                 'message': '主要负责人不存在'
             }), 400
-            
-        for sub_id in data['subResponsibles']:
-            if not User.query.get(sub_id):
-                return jsonify({
-                    'success': False,
-                    'message': f'次要负责人ID {sub_id} 不存在'
-                }), 400
+        if missing:
+            return jsonify({
+                'success': False,
+                'message': f'次要负责人ID {", ".join(map(str, missing))} 不存在',
+                'missingIds': missing
+            }), 400
         
         # 创建新活动
         activity = Activity(
@@ -540,20 +1581,22 @@ def apply_activity():
             end_time=end_time,
             location=data['location'],
             applicant_id=current_user.id,
-            main_responsible_id=int(data['mainResponsible']),  # 设置主要负责人
+            main_responsible_id=main_responsible_id,  # 设置主要负责人
             status='pending'
         )
         
         db.session.add(activity)
         db.session.flush()  # 获取活动ID
         
-        # 添加次要负责人
-        for sub_id in data['subResponsibles']:
-            sub_responsible = User.query.get(int(sub_id))
-            if sub_responsible:
-                activity.sub_responsibles.append(sub_responsible)
+        # 添加次要负责人，ID 已在上面确认存在，直接写关联表
+        db.session.add_all([
+            ActivitySubResponsible(activity_id=activity.id, user_id=sub_id)
+            for sub_id in sub_responsible_ids
+        ])
         
         db.session.commit()
+        data_version.bump()
+        publish_event('reviews', 'activity.submitted', {'activityId': activity.id}, branch_only=True)
         
         return jsonify({
             'success': True,
@@ -568,62 +1611,118 @@ def apply_activity():
             'message': '服务器处理请求时发生错误'
         }), 500
 
+def parse_activity_list_args(args):
+    """解析活动列表的分页和筛选参数，返回 (limit, status, cursor, date_from, date_to)，格式错误时抛出 ValueError"""
+    limit = min(max(args.get('limit', ACTIVITY_PAGE_SIZE, type=int), 1), ACTIVITY_PAGE_SIZE_MAX)
+    try:
+        cursor = decode_activity_cursor(args.get('cursor'))
+        date_from = parse_date_arg(args.get('from'))
+        date_to = parse_date_arg(args.get('to'))
+    except ValueError:
+        raise ValueError('分页游标或日期格式错误')
+    return limit, args.get('status'), cursor, date_from, date_to
+
+def activity_list_plan(user_id, limit, status, cursor, date_from, date_to):
+    """活动列表的查询计划（见 run_query_plan）"""
+    # 可见性：用户是申请人、活动已审核通过或正在进行、活动已完成且用户是参与者
+    is_participant_clause = db.exists().where(db.and_(
+        ActivityParticipant.activity_id == Activity.id,
+        ActivityParticipant.user_id == user_id
+    ))
+    query = db.select(
+        Activity.id,
+        Activity.title,
+        Activity.description,
+        Activity.points,
+        Activity.start_time,
+        Activity.end_time,
+        Activity.location,
+        Activity.status,
+        Activity.applicant_id,
+        Activity.main_responsible_id,
+        Activity.created_at
+    ).where(db.or_(
+        Activity.applicant_id == user_id,
+        Activity.status.in_(['approved', 'ongoing']),
+        db.and_(Activity.status == 'completed', is_participant_clause)
+    ))
+    if status:
+        query = query.where(Activity.status == status)
+    if date_from:
+        query = query.where(Activity.start_time >= date_from)
+    if date_to:
+        query = query.where(Activity.start_time < date_to + timedelta(days=1))
+    
+    # 按 (created_at, id) 倒序做键集分页
+    if cursor:
+        cursor_created_at, cursor_id = cursor
+        query = query.where(db.or_(
+            Activity.created_at < cursor_created_at,
+            db.and_(Activity.created_at == cursor_created_at, Activity.id < cursor_id)
+        ))
+    activities = (yield query.order_by(Activity.created_at.desc(), Activity.id.desc()).limit(limit + 1)).all()
+    has_more = len(activities) > limit
+    activities = activities[:limit]
+    activity_list = []
+    
+    # 批量取回申请人、负责人和参与者，查询次数与活动数量无关
+    activity_ids = [activity.id for activity in activities]
+    user_names = yield from user_names_plan(
+        [activity.applicant_id for activity in activities] +
+        [activity.main_responsible_id for activity in activities]
+    )
+    sub_responsibles_map = yield from activity_members_plan(ActivitySubResponsible, activity_ids)
+    participants_map = yield from activity_members_plan(ActivityParticipant, activity_ids)
+    
+    for activity in activities:
+        # 获取主要负责人和次要负责人信息
+        sub_responsibles = [name for _, name in sub_responsibles_map[activity.id]]
+        participants = [name for _, name in participants_map[activity.id]]
+        
+        activity_list.append({
+            'id': activity.id,
+            'title': activity.title,
+            'description': activity.description,
+            'points': activity.points,
+            'start_time': format_datetime(activity.start_time),
+            'end_time': format_datetime(activity.end_time),
+            'location': activity.location,
+            'status': activity.status,
+            'applicant': user_names.get(activity.applicant_id),
+            'main_responsible': user_names.get(activity.main_responsible_id),
+            'sub_responsibles': sub_responsibles,
+            'participants': participants,
+            'is_participant': any(member_id == user_id for member_id, _ in participants_map[activity.id]),
+            'is_applicant': activity.applicant_id == user_id
+        })
+    
+    return {
+        'success': True,
+        'activities': activity_list,
+        'next_cursor': encode_activity_cursor(activities[-1]) if has_more else None
+    }
+
 @app.route('/api/activity/list', methods=['GET'])
 @jwt_required()
+@cached_response(scope=current_user_scope)
 def get_activity_list():
     try:
-        current_user = User.query.get(get_jwt_identity())
+        current_user = get_current_identity()
         if not current_user:
             return jsonify({
                 'success': False,
                 'message': '用户未找到'
             }), 404
-
-        # 获取所有活动，按创建时间倒序排序
-        activities = Activity.query.order_by(Activity.created_at.desc()).all()
-        activity_list = []
-        
-        for activity in activities:
-            # 获取主要负责人和次要负责人信息
-            main_responsible = User.query.get(activity.main_responsible_id)
-            sub_responsibles = [user.name for user in activity.sub_responsibles]
-            participants = [user.name for user in activity.participants]
-            
-            # 检查当前用户是否是参与者
-            is_participant = current_user in activity.participants
-            
-            # 检查当前用户是否是申请人
-            is_applicant = activity.applicant_id == current_user.id
-            
-            # 检查活动是否应该显示
-            should_show = (
-                is_applicant or  # 用户是申请人
-                activity.status in ['approved', 'ongoing'] or  # 活动已审核通过或正在进行
-                (activity.status == 'completed' and is_participant)  # 活动已完成且用户是参与者
-            )
-            
-            if should_show:
-                activity_list.append({
-                    'id': activity.id,
-                    'title': activity.title,
-                    'description': activity.description,
-                    'points': activity.points,
-                    'start_time': activity.start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    'end_time': activity.end_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    'location': activity.location,
-                    'status': activity.status,
-                    'applicant': User.query.get(activity.applicant_id).name,
-                    'main_responsible': main_responsible.name if main_responsible else None,
-                    'sub_responsibles': sub_responsibles,
-                    'participants': participants,
-                    'is_participant': is_participant,
-                    'is_applicant': is_applicant
-                })
         
-        return jsonify({
-            'success': True,
-            'activities': activity_list
-        })
+        try:
+            args = parse_activity_list_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        
+        return jsonify(run_query_plan(activity_list_plan(current_user.id, *args)))
     except Exception as e:
         print('获取活动列表错误:', str(e))
         return jsonify({
@@ -635,55 +1734,36 @@ def get_activity_list():
 @jwt_required()
 def review_activity():
     try:
-        current_user = User.query.get(get_jwt_identity())
+        current_user = get_current_identity()
         if not is_branch_member(current_user):
             return jsonify({'success': False, 'message': '权限不足'}), 403
         
         data = request.get_json()
-        activity_id = data.get('activityId')
-        approved = data.get('approved')
+        decisions = parse_review_decisions([data], 'activityId')
+        if decisions is None:
+            return jsonify({'success': False, 'message': '参数错误'}), 400
+        activity_id, = decisions
         
-        activity = Activity.query.get_or_404(activity_id)
-        if activity.status != 'pending':
-            return jsonify({'success': False, 'message': '该活动已被审核'}), 400
-        
-        activity.status = 'approved' if approved else 'rejected'
-        activity.reviewer_id = current_user.id
-        activity.reviewed_at = datetime.utcnow()
-        
-        # 如果活动已经开始，更新状态为进行中
-        if approved and activity.start_time <= datetime.now():
-            activity.status = 'ongoing'
-        
-        # 如果活动已经结束，更新状态并分配积分
-        if approved and activity.end_time <= datetime.now():
-            activity.status = 'completed'
-            # 主要负责人加5分
-            main_responsible = User.query.get(activity.main_responsible_id)
-            if main_responsible:
-                main_responsible.points += 5
-                db.session.add(PointsRecord(
-                    user_id=main_responsible.id,
-                    points=5,
-                    reason=f'活动主要负责人：{activity.title}',
-                    status='approved'
-                ))
-            
-            # 次要负责人加3分
-            for sub_responsible in activity.sub_responsibles:
-                sub_responsible.points += 3
-                db.session.add(PointsRecord(
-                    user_id=sub_responsible.id,
-                    points=3,
-                    reason=f'活动次要负责人：{activity.title}',
-                    status='approved'
-                ))
+        try:
+            outcomes, owners = review_activities(decisions, current_user.id)
+            outcome = outcomes[activity_id]
+        except ReviewConflictError:
+            outcome = 'already_reviewed'
+        if outcome == 'not_found':
+            db.session.rollback()
+            return jsonify({'success': False, 'message': '活动不存在'}), 404
+        if outcome == 'already_reviewed':
+            db.session.rollback()
+            return jsonify({'success': False, 'message': '该活动已被审核'}), 409
         
         db.session.commit()
+        data_version.bump()
+        if notify_reviewed('activities', 'activity.reviewed', outcomes, owners):
+            publish_event('activities', 'activities.changed')
         return jsonify({
             'success': True,
             'message': '审核完成',
-            'status': activity.status
+            'status': outcome
         })
     
     except Exception as e:
@@ -694,54 +1774,163 @@ def review_activity():
             'message': '服务器处理请求时发生错误'
         }), 500
 
+@app.route('/api/activity/review/batch', methods=['POST'])
+@jwt_required()
+def review_activity_batch():
+    try:
+        current_user = get_current_identity()
+        if not is_branch_member(current_user):
+            return jsonify({'success': False, 'message': '权限不足'}), 403
+        
+        data = request.get_json() or {}
+        decisions = parse_review_decisions(data.get('items'), 'activityId')
+        if decisions is None:
+            return jsonify({
+                'success': False,
+                'message': f'items 须为 1 到 {REVIEW_BATCH_MAX} 条 {{activityId, approved}}'
+            }), 400
+        
+        outcomes, owners = review_activities(decisions, current_user.id)
+        db.session.commit()
+        data_version.bump()
+        if notify_reviewed('activities', 'activity.reviewed', outcomes, owners):
+            publish_event('activities', 'activities.changed')
+        return jsonify({'success': True, 'results': review_results(outcomes)})
+    
+    except ReviewConflictError:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': '部分活动已被其他人审核，请刷新后重试'}), 409
+    except Exception as e:
+        db.session.rollback()
+        print('批量审核活动错误:', str(e))
+        return jsonify({'success': False, 'message': '服务器处理请求时发生错误'}), 500
+
 @app.route('/api/users', methods=['GET'])
 @jwt_required()
+@cached_response()
 def get_users_list():
-    # 获取所有用户并按积分降序排序
-    users = User.query.order_by(User.points.desc()).all()
+    # 获取所有用户并按积分降序排序，只取需要的列
+    users = rows_to_dicts(
+        db.session.query(User.id, User.username, User.name, User.type, User.role, User.points)
+        .order_by(User.points.desc()),
+        ['id', 'username', 'name', 'type', 'role', 'points']
+    )
     
     # 计算每个用户的排名
-    rankings = {}
     current_rank = 1
     current_points = None
     for i, user in enumerate(users):
-        if current_points != user.points:
+        if current_points != user['points']:
             current_rank = i + 1
-            current_points = user.points
-        rankings[user.id] = current_rank
+            current_points = user['points']
+        user['rank'] = current_rank
     
     return jsonify({
         'success': True,
-        'users': [{
-            'id': user.id,
-            'username': user.username,
-            'name': user.name,
-            'type': user.type,
-            'role': user.role,
-            'points': user.points,
-            'rank': rankings[user.id]
-        } for user in users]
+        'users': users
     })
 
+DIRECTORY_MAX_LIMIT = 500
+
+def parse_directory_args(q, limit):
+    """返回 (姓名前缀, 条数上限)，limit 超出范围时抛出 ValueError"""
+    if limit is not None and not 1 <= limit <= DIRECTORY_MAX_LIMIT:
+        raise ValueError(f'limit 需在 1 到 {DIRECTORY_MAX_LIMIT} 之间')
+    return (q or '').strip(), limit
+
+def user_directory_query(prefix, limit):
+    query = db.select(User.id, User.name, User.role)
+    if prefix:
+        # 用范围条件代替 LIKE 'q%'，SQLite 和 MySQL 都能走索引，也不必转义通配符
+        query = query.where(User.name >= prefix, User.name < prefix + '\uffff')
+    query = query.order_by(User.name, User.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def user_directory_payload(rows, version):
+    return {
+        'success': True,
+        'version': version,
+        'users': [{'id': row.id, 'name': row.name, 'role': row.role} for row in rows]
+    }
+
+@app.route('/api/users/directory', methods=['GET'])
+@jwt_required()
+@cached_response()
+def get_user_directory():
+    """负责人选择器用的用户目录，只返回 id、姓名和职务
+
+    q 为姓名前缀，按 (name, id) 索引做范围查询；limit 限制条数（最多 DIRECTORY_MAX_LIMIT），
+    不传时返回全部用户。响应随数据版本缓存并带 ETag，选择器可用 If-None-Match 重新验证。
+    """
+    try:
+        prefix, limit = parse_directory_args(request.args.get('q'), request.args.get('limit', type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    rows = db.session.execute(user_directory_query(prefix, limit))
+    return jsonify(user_directory_payload(rows, data_version.current))
+
+APPROVED_POINTS_KEYS = ['userName', 'reason', 'reviewed_at']
+APPROVED_POINTS_FORMATTERS = {'reviewed_at': isoformat}
+
+def approved_points_query(args):
+    """解析已通过积分流水的参数，返回 (输出格式, 查询)，参数错误时抛出 ValueError"""
+    output_format = args.get('format', 'json')
+    if output_format not in ('json', 'ndjson', 'csv'):
+        raise ValueError('不支持的导出格式')
+    try:
+        date_from = parse_date_arg(args.get('from'))
+        date_to = parse_date_arg(args.get('to'))
+    except ValueError:
+        raise ValueError('日期格式错误')
+    user_id = args.get('user_id', type=int)
+    
+    # 获取已审核通过的积分记录，联表取得姓名，只投影需要的列
+    query = db.select(
+        User.name, PointsRecord.reason, PointsRecord.reviewed_at
+    ).join(User, User.id == PointsRecord.user_id).where(
+        PointsRecord.status == 'approved',
+        is_application(PointsRecord.category)
+    )
+    if date_from:
+        query = query.where(PointsRecord.reviewed_at >= date_from)
+    if date_to:
+        query = query.where(PointsRecord.reviewed_at < date_to + timedelta(days=1))
+    if user_id:
+        query = query.where(PointsRecord.user_id == user_id)
+    return output_format, query.order_by(PointsRecord.reviewed_at.desc())
+
+def approved_points_payload(rows):
+    return {
+        'success': True,
+        'points': rows_to_dicts(rows, APPROVED_POINTS_KEYS, APPROVED_POINTS_FORMATTERS)
+    }
+
 @app.route('/api/points/approved', methods=['GET'])
 @jwt_required()
+@cached_response()
 def get_approved_points():
-    # 获取所有已审核通过的积分记录
-    approved_records = PointsRecord.query.filter_by(status='approved').order_by(PointsRecord.reviewed_at.desc()).all()
-    
-    points = []
-    for record in approved_records:
-        user = User.query.get(record.user_id)
-        points.append({
-            'userName': user.name,
-            'reason': record.reason,
-            'reviewed_at': record.reviewed_at.isoformat()
-        })
+    try:
+        output_format, query = approved_points_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    keys, formatters = APPROVED_POINTS_KEYS, APPROVED_POINTS_FORMATTERS
     
-    return jsonify({
-        'success': True,
-        'points': points
-    })
+    # 流式导出：服务端游标分批取数，内存占用与账本大小无关
+    if output_format == 'ndjson':
+        records = db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        return Response(stream_with_context(stream_ndjson(iter_dicts(records, keys, formatters))),
+                        mimetype='application/x-ndjson')
+    if output_format == 'csv':
+        records = db.session.execute(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        rows = ([record.name, record.reason, record.reviewed_at.isoformat() if record.reviewed_at else '']
+                for record in records)
+        return Response(stream_with_context(stream_csv(['userName', 'reason', 'reviewed_at'], rows)),
+                        mimetype='text/csv', headers={'Content-Disposition': 'attachment; filename=approved_points.csv'})
+    
+    return jsonify(approved_points_payload(db.session.execute(query)))
 
 # 贡献分类及对应积分
 contributionCategories = {
@@ -795,81 +1984,154 @@ contributionCategories = {
     }
 }
 
-@app.route('/api/rankings', methods=['GET'])
-@jwt_required()
-def get_rankings():
-    period = request.args.get('period', 'total')
-    
-    if period == 'total':
-        # 总榜直接返回用户当前积分
-        # 首先确保session中的用户数据是最新的
-        db.session.commit()
-        users = User.query.order_by(User.points.desc()).all()
-        rankings = [{
-            'name': user.name,
-            'points': user.points,
-            'userId': user.id
-        } for user in users]
+def period_start(day, start_months):
+    """返回 start_months 中不晚于 day 的最近一个月份的 1 日，用于确定 day 所在的学期或学年"""
+    return max(
+        date(day.year - years_back, month, 1)
+        for years_back in (0, 1)
+        for month in start_months
+        if date(day.year - years_back, month, 1) <= day
+    )
+
+def ranking_window(period, as_of, date_from=None, date_to=None):
+    """返回时间段排行的 (起始日期, 结束日期)，均含当天；as_of 之后的日子不计入"""
+    if period == 'semester':
+        return period_start(as_of, app.config['SEMESTER_START_MONTHS']), as_of
+    if period == 'academic_year':
+        return period_start(as_of, [app.config['ACADEMIC_YEAR_START_MONTH']]), as_of
+    if period in LEADERBOARD_PERIODS:
+        return as_of - LEADERBOARD_PERIODS[period] + timedelta(days=1), as_of
+    return date_from, date_to
+
+RANKING_WINDOW_PERIODS = ['semester', 'academic_year', 'custom']
+
+RankingArgs = namedtuple('RankingArgs', ['period', 'limit', 'offset', 'around', 'window', 'as_of', 'date_from', 'date_to'])
+
+def parse_rankings_args(args):
+    """解析排行接口的查询参数，参数错误时抛出 ValueError"""
+    try:
+        as_of = parse_date_arg(args.get('as_of'))
+        date_from = parse_date_arg(args.get('from'))
+        date_to = parse_date_arg(args.get('to'))
+    except ValueError:
+        raise ValueError('日期格式应为 YYYY-MM-DD')
+    period = args.get('period', 'total')
+    if period == 'custom' and (date_from is None or date_to is None or date_from > date_to):
+        raise ValueError('自定义时间段需要提供 from 和 to，且 from 不能晚于 to')
+    if period != 'total' and period not in RANKING_WINDOW_PERIODS and period not in LEADERBOARD_PERIODS:
+        raise ValueError('无效的排行周期')
+    return RankingArgs(period, args.get('limit', type=int), args.get('offset', 0, type=int), args.get('around'),
+                       args.get('window', 5, type=int), as_of, date_from, date_to)
+
+def snapshot_leaderboard_period(args):
+    """读取预先计算好的快照的月榜、周榜返回周期名，其余返回 None"""
+    return args.period if args.period in LEADERBOARD_PERIODS and args.as_of is None else None
+
+def rankings_plan(args, user_id):
+    """排行榜的查询计划，快照排行需先调用 ensure_leaderboard"""
+    period, as_of = args.period, args.as_of
+    extra = {}
+    conditions = []
+    if period == 'total' and as_of is not None:
+        # 某一天结束时的总榜：最近的余额快照加上之后的账本记录，只包含当时已存在的用户
+        at = as_of + timedelta(days=1)
+        snapshot_at = (yield latest_snapshot_select(db, at)).scalar()
+        balances = balances_select_from(db, at, snapshot_at).subquery()
+        source = User.__table__.join(balances, balances.c.user_id == User.id)
+        conditions.append(db.or_(User.created_at.is_(None), User.created_at < at))
+        points_column, id_column = balances.c.balance, User.id
+        extra['as_of'] = as_of.strftime('%Y-%m-%d')
+    elif period == 'total':
+        # 总榜直接按 user.points 索引排序
+        source = User.__table__
+        points_column, id_column = User.points, User.id
+    elif snapshot_leaderboard_period(args) is None:
+        # 学期、学年、自定义时间段以及指定日期的月榜、周榜，累加时间段内的按天汇总
+        first_day, last_day = ranking_window(period, (as_of or datetime.utcnow()).date(),
+                                             args.date_from and args.date_from.date(),
+                                             args.date_to and args.date_to.date())
+        window_points = window_points_select(db, first_day, last_day).subquery()
+        source = User.__table__.outerjoin(window_points, window_points.c.user_id == User.id)
+        points_column, id_column = db.func.coalesce(window_points.c.points, 0), User.id
+        extra.update({'from': first_day.isoformat(), 'to': last_day.isoformat()})
     else:
-        # 计算指定时间段内的积分变化
-        if period == 'month':
-            start_date = datetime.utcnow() - timedelta(days=30)
-        elif period == 'week':
-            start_date = datetime.utcnow() - timedelta(days=7)
-        
-        # 获取时间段内所有已审核通过的积分记录
-        points_records = db.session.query(
-            PointsRecord.user_id,
-            db.func.sum(PointsRecord.points).label('period_points')
-        ).filter(
-            PointsRecord.status == 'approved',
-            PointsRecord.created_at >= start_date
-        ).group_by(PointsRecord.user_id).all()
-        
-        # 创建用户积分字典
-        points_dict = {record.user_id: record.period_points for record in points_records}
-        
-        # 获取所有用户并计算排名
-        users = User.query.all()
-        rankings = [{
-            'name': user.name,
-            'points': points_dict.get(user.id, 0),  # 如果没有记录则返回0分
-            'userId': user.id
-        } for user in users]
-        
-        # 按积分降序排序
-        rankings.sort(key=lambda x: x['points'], reverse=True)
+        # 月榜、周榜读取预先计算好的快照
+        source = LeaderboardEntry.__table__.join(User.__table__, User.id == LeaderboardEntry.user_id)
+        conditions.append(LeaderboardEntry.period == period)
+        points_column, id_column = LeaderboardEntry.points, LeaderboardEntry.user_id
     
-    return jsonify({
+    def count(*more):
+        return db.select(db.func.count()).select_from(source).where(*conditions, *more)
+    
+    total = (yield count()).scalar()
+    
+    # 以当前用户为中心取前后 window 名
+    offset, limit = args.offset, args.limit
+    if args.around == 'me':
+        me = (yield db.select(points_column.label('points')).select_from(source).where(
+            *conditions, id_column == user_id)).first()
+        if me is not None:
+            position = (yield count(db.or_(
+                points_column > me.points,
+                db.and_(points_column == me.points, id_column < user_id)
+            ))).scalar()
+            offset = max(0, position - args.window)
+            limit = 2 * args.window + 1
+    
+    offset = max(0, offset)
+    query = db.select(id_column.label('user_id'), User.name, points_column.label('points')).select_from(
+        source).where(*conditions).order_by(points_column.desc(), id_column).offset(offset)
+    if limit is not None:
+        query = query.limit(max(0, limit))
+    rows = (yield query).all()
+    first_rank = (yield count(points_column > rows[0].points)).scalar() + 1 if rows else None
+    
+    return {
         'success': True,
-        'rankings': rankings
-    })
+        'period': period,
+        **extra,
+        'total': total,
+        'offset': offset,
+        'rankings': _rank_rows(rows, first_rank, offset)
+    }
+
+@app.route('/api/rankings', methods=['GET'])
+@jwt_required()
+@cached_response(scope=lambda: get_jwt_identity() if request.args.get('around') == 'me' else None)
+def get_rankings():
+    try:
+        args = parse_rankings_args(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if snapshot_leaderboard_period(args):
+        ensure_leaderboard(args.period)
+    return jsonify(run_query_plan(rankings_plan(args, get_jwt_identity())))
 
 @app.route('/api/points/personal', methods=['GET'])
 @jwt_required()
 def get_personal_points():
     try:
-        current_user = User.query.get(get_jwt_identity())
+        current_user = get_current_identity()
         # 获取用户的所有加分申请记录
-        points_records = PointsRecord.query.filter_by(user_id=current_user.id).order_by(PointsRecord.created_at.desc()).all()
+        points_records = db.session.query(
+            PointsRecord.id,
+            PointsRecord.category,
+            PointsRecord.subcategory,
+            PointsRecord.summary,
+            PointsRecord.hours,
+            PointsRecord.points,
+            PointsRecord.status,
+            PointsRecord.created_at
+        ).filter(
+            PointsRecord.user_id == current_user.id,
+            is_application(PointsRecord.category)
+        ).order_by(PointsRecord.created_at.desc()).all()
         
-        applications = []
-        for record in points_records:
-            try:
-                category, subcategory_summary = record.reason.split('-', 1)
-                subcategory, summary = subcategory_summary.split(':', 1)
-                applications.append({
-                    'id': record.id,
-                    'category': category,
-                    'subcategory': subcategory.strip(),
-                    'summary': summary.strip(),
-                    'points': record.points,
-                    'status': record.status,
-                    'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')
-                })
-            except Exception as e:
-                print(f'Error parsing record {record.id}: {str(e)}')
-                continue
+        applications = rows_to_dicts(
+            points_records,
+            ['id', 'category', 'subcategory', 'summary', 'hours', 'points', 'status', 'created_at'],
+            {'created_at': format_datetime}
+        )
         
         return jsonify({
             'success': True,
@@ -882,11 +2144,56 @@ def get_personal_points():
             'message': '获取加分申请列表失败'
         }), 500
 
+@app.route('/api/points/summary', methods=['GET'])
+@jwt_required()
+def get_points_summary():
+    current_user = get_current_identity()
+    
+    # 按分类汇总当前用户已通过的积分
+    summary = db.session.query(
+        PointsRecord.category,
+        db.func.count(PointsRecord.id).label('count'),
+        db.func.sum(PointsRecord.points).label('points')
+    ).filter(
+        PointsRecord.user_id == current_user.id,
+        PointsRecord.status == 'approved',
+        is_application(PointsRecord.category)
+    ).group_by(PointsRecord.category).all()
+    
+    return jsonify({
+        'success': True,
+        'categories': [{
+            'category': row.category,
+            'count': row.count,
+            'points': row.points
+        } for row in summary]
+    })
+
+@app.route('/api/points/balance', methods=['GET'])
+@jwt_required()
+def get_points_balance():
+    current_user = get_current_identity()
+    
+    # 查询截至某天结束时的余额，由最近的余额快照加上之后的账本记录得出
+    try:
+        as_of = parse_date_arg(request.args.get('as_of'))
+    except ValueError:
+        return jsonify({'success': False, 'message': '日期格式应为 YYYY-MM-DD'}), 400
+    if as_of is None:
+        return jsonify({'success': False, 'message': '请提供 as_of 日期'}), 400
+    
+    balance = balances_as_of(db, as_of + timedelta(days=1), [current_user.id]).get(current_user.id, 0)
+    return jsonify({
+        'success': True,
+        'as_of': as_of.strftime('%Y-%m-%d'),
+        'balance': balance
+    })
+
 @app.route('/api/activity/join', methods=['POST'])
 @jwt_required()
 def join_activity():
     try:
-        current_user = User.query.get(get_jwt_identity())
+        current_user = get_current_identity()
         data = request.get_json()
         activity_id = data.get('activityId')
         
@@ -900,21 +2207,29 @@ def join_activity():
             }), 400
         
         # 检查是否已经报名
-        if current_user in activity.participants:
+        if ActivityParticipant.query.get((activity.id, current_user.id)):
             return jsonify({
                 'success': False,
                 'message': '您已经报名过该活动'
             }), 400
         
-        # 添加参与者
-        activity.participants.append(current_user)
+        # 添加参与者，并发重复报名由联合主键拦截
+        db.session.add(ActivityParticipant(activity_id=activity.id, user_id=current_user.id))
         db.session.commit()
+        data_version.bump()
+        publish_event('activities', 'activity.joined', {'activityId': activity.id})
         
         return jsonify({
             'success': True,
             'message': '报名成功'
         })
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': '您已经报名过该活动'
+        }), 400
     except Exception as e:
         db.session.rollback()
         print('活动报名错误:', str(e))
@@ -923,16 +2238,152 @@ def join_activity():
             'message': '服务器处理请求时发生错误'
         }), 500
 
+# 活动状态调度
+ACTIVITY_SUB_RESPONSIBLE_POINTS = 3  # 主要负责人积分见 Activity.points
+
+def start_due_activities(now, batch_size):
+    """把已开始但未结束的 approved 活动批量转为 ongoing，返回转换的数量"""
+    activity_ids = [activity_id for activity_id, in db.session.query(Activity.id).filter(
+        Activity.status == 'approved',
+        Activity.start_time <= now,
+        Activity.end_time > now
+    ).order_by(Activity.start_time).limit(batch_size)]
+    if not activity_ids:
+        return 0
+    started = Activity.query.filter(
+        Activity.id.in_(activity_ids),
+        Activity.status == 'approved'
+    ).update({Activity.status: 'ongoing'}, synchronize_session=False)
+    db.session.commit()
+    data_version.bump()
+    publish_event('activities', 'activities.changed')
+    return started
+
+def complete_due_activities(now, batch_size):
+    """把已结束的活动批量转为 completed，并在同一事务内为负责人发放积分
+
+    状态转换是带条件的 UPDATE，只有仍处于 approved/ongoing 的活动会被认领，
+    积分与状态在同一事务提交，因此重复执行或多个 worker 并发执行都不会重复发分。
+    返回本批次完成的活动数量。
+    """
+    activities = db.session.query(
+        Activity.id, Activity.title, Activity.points, Activity.main_responsible_id
+    ).filter(
+        Activity.status.in_(['approved', 'ongoing']),
+        Activity.end_time <= now
+    ).order_by(Activity.end_time).limit(batch_size).all()
+    if not activities:
+        return 0
+    
+    activity_ids = [activity.id for activity in activities]
+    claimed = Activity.query.filter(
+        Activity.id.in_(activity_ids),
+        Activity.status.in_(['approved', 'ongoing'])
+    ).update({Activity.status: 'completed'}, synchronize_session=False)
+    if claimed != len(activity_ids):
+        # 部分活动已被其他 worker 处理，放弃本批次，由调用方重新挑选
+        db.session.rollback()
+        return None
+    
+    awarded_at = datetime.utcnow()
+    titles = {activity.id: activity.title for activity in activities}
+    records = []
+    credits = []
+    
+    def award(user_id, points, role, activity_id):
+        records.append({
+            'user_id': user_id,
+            'points': points,
+            'reason': f'活动{role}：{titles[activity_id]}',
+            'category': '活动',
+            'subcategory': role,
+            'summary': titles[activity_id],
+            'status': 'approved',
+            'created_at': awarded_at,
+            'reviewed_at': awarded_at
+        })
+        credits.append((user_id, points, awarded_at))
+    
+    for activity in activities:
+        award(activity.main_responsible_id, activity.points, '主要负责人', activity.id)
+    sub_responsibles = db.session.query(
+        ActivitySubResponsible.activity_id, ActivitySubResponsible.user_id
+    ).filter(ActivitySubResponsible.activity_id.in_(activity_ids)).all()
+    for activity_id, user_id in sub_responsibles:
+        award(user_id, ACTIVITY_SUB_RESPONSIBLE_POINTS, '次要负责人', activity_id)
+    
+    db.session.execute(PointsRecord.__table__.insert(), records)
+    credit_points_bulk(credits)
+    db.session.commit()
+    data_version.bump()
+    publish_event('activities', 'activities.changed')
+    publish_event('rankings', 'rankings.changed')
+    awarded = {}
+    for user_id, points, _ in credits:
+        awarded[user_id] = awarded.get(user_id, 0) + points
+    for user_id, points in awarded.items():
+        publish_event('points', 'points.awarded', {'points': points}, user_ids=[user_id])
+    return claimed
+
+def run_activity_lifecycle(batch_size=None, now=None):
+    """分批推进所有到期活动的状态，返回 (转为进行中的数量, 完成的数量)"""
+    batch_size = batch_size or app.config['ACTIVITY_SCHEDULER_BATCH_SIZE']
+    # 活动时间按本地时间录入，与 apply_activity 的校验保持一致
+    now = now or datetime.now()
+    
+    started = 0
+    while True:
+        count = start_due_activities(now, batch_size)
+        started += count
+        if count < batch_size:
+            break
+    
+    completed = 0
+    while True:
+        count = complete_due_activities(now, batch_size)
+        if count is None:
+            continue
+        completed += count
+        if count < batch_size:
+            break
+    return started, completed
+
+def compact_balance_snapshots(now=None):
+    """写入截至今天 0 点（UTC）的余额快照，每天只有第一次调用会写入，返回写入的用户数"""
+    now = now or datetime.utcnow()
+    written = compact(db, now.replace(hour=0, minute=0, second=0, microsecond=0))
+    db.session.commit()
+    return written
+
+def start_activity_scheduler(interval=None):
+    """在当前进程内启动后台线程，定期执行 run_activity_lifecycle 和余额快照压缩"""
+    interval = interval or app.config['ACTIVITY_SCHEDULER_INTERVAL']
+    
+    def loop():
+        while True:
+            with app.app_context():
+                try:
+                    run_activity_lifecycle()
+                    compact_balance_snapshots()
+                except Exception as e:
+                    db.session.rollback()
+                    print('活动状态调度错误:', str(e))
+                finally:
+                    db.session.remove()
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=loop, name='activity-scheduler', daemon=True)
+    thread.start()
+    return thread
+
 # Initialize database and create test users
 def init_db():
     with app.app_context():
         db.create_all()
         
-        # 更新所有用户的基础分为80
-        users = User.query.all()
-        for user in users:
-            user.points = 80
-        db.session.commit()
+        # create_all 不会修改已存在的表，新增的字段和索引由版本化迁移补上
+        from migrations import upgrade
+        upgrade(db, contributionCategories)
         
         # Create test users if they don't exist
         test_users = [
@@ -946,32 +2397,115 @@ def init_db():
             if not User.query.filter_by(username=user_data['username']).first():
                 user = User(
                     username=user_data['username'],
-                    password=generate_password_hash(user_data['password']),
+                    password=password_hasher.hash(user_data['password']),
                     name=user_data['name'],
                     type=user_data['type'],
                     role=user_data['role']
                 )
                 db.session.add(user)
         
+        # 新用户的基础分记入账本
+        db.session.flush()
+        open_accounts(db)
+        invalidate_leaderboards()
         db.session.commit()
 
+@app.route('/api/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_events():
+    """SSE 事件流。浏览器的 EventSource 无法设置请求头，Token 可放在 ?token= 中
+
+    topics 为逗号分隔的主题，默认订阅全部：points（本人申请的审核结果和获得的积分）、
+    activities（活动审核、报名和状态变化）、rankings（排行变化）、reviews（待审核列表变化，
+    仅支部委员）。每隔 EVENT_HEARTBEAT_SECONDS 秒发送注释行保持连接；客户端消费过慢时
+    发送 resync 事件并断开，客户端应重新拉取数据后重连。
+    """
+    current_user = get_current_identity()
+    if current_user is None:
+        return jsonify({'success': False, 'message': '用户未找到'}), 404
+    try:
+        topics = parse_event_topics(request.args.get('topics'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    subscription = event_hub.subscribe(current_user.id, is_branch_member(current_user), topics)
+    if subscription is None:
+        return jsonify({'success': False, 'message': '实时推送连接数已满，请稍后重试'}), 503
+    heartbeat = app.config['EVENT_HEARTBEAT_SECONDS']
+    
+    def generate():
+        try:
+            yield sse_opening()
+            while not subscription.overflowed:
+                try:
+                    event = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield SSE_HEARTBEAT
+                    continue
+                yield format_sse(event)
+            yield sse_resync()
+        finally:
+            event_hub.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭 Nginx 等反向代理的响应缓冲
+    })
+
+@app.route('/api/health', methods=['GET'])
+def health():
+    """健康检查：数据库是否可用、查询耗时以及连接池的借出情况"""
+    started = time.perf_counter()
+    try:
+        db.session.execute(db.text('SELECT 1'))
+        database = {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        db.session.rollback()
+        print('健康检查错误:', str(e))
+        database = {'ok': False}
+    database['dialect'] = db.engine.dialect.name
+    return jsonify({
+        'success': database['ok'],
+        'database': database,
+        'pool': pool_stats.snapshot()
+    }), 200 if database['ok'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 文本格式的指标；配置了 METRICS_TOKEN 时需以 Bearer Token 访问"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'success': False, 'message': '权限不足'}), 403
+    pool = pool_stats.snapshot()
+    gauges = {
+        'db_pool_checked_out': ('已借出的数据库连接数', pool['checked_out']),
+        'db_pool_max_checked_out': ('同时借出连接数的峰值', pool['max_checked_out']),
+        'response_cache_entries': ('响应缓存条目数', len(response_cache)),
+        'response_cache_bytes': ('响应缓存占用字节数', response_cache.nbytes),
+        'event_subscribers': ('实时推送连接数', len(event_hub))
+    }
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
 # 添加主页路由
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    return send_static_asset('.', 'index.html')
 
 @app.route('/main.html')
 def main():
-    return send_from_directory('.', 'main.html')
+    return send_static_asset('.', 'main.html')
 
 @app.route('/admin/')
 def admin_index():
-    return send_from_directory('admin', 'index.html')
+    return send_static_asset('admin', 'index.html')
 
 @app.route('/admin/dashboard.html')
 def admin_dashboard():
-    return send_from_directory('admin', 'dashboard.html')
+    return send_static_asset('admin', 'dashboard.html')
 
 if __name__ == '__main__':
     init_db()
+    # debug 模式下重载器会启动两个进程，只在实际处理请求的子进程中启动调度线程
+    if app.config['ACTIVITY_SCHEDULER_IN_PROCESS'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_activity_scheduler()
     app.run(debug=True)
\ No newline at end of file
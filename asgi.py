@@ -0,0 +1,555 @@
+"""ASGI 入口（可选）：对外提供与 app.py 相同的接口，等待型接口由异步处理器通过异步数据库引擎处理
+
+默认部署方式仍是同步的 Flask 应用（python app.py / PythonAnywhere 的 WSGI 配置）。需要承载大量
+长连接（/api/events 实时推送）或慢速上传时，可改用 ASGI 服务器运行本模块：
+
+    pip install uvicorn aiosqlite        # MySQL 另需 asyncmy，见 requirements-optional.txt
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+- /api/events、/api/health、/api/users/directory、/api/user/info，以及轮询频繁的 /api/rankings、
+  /api/activity/list、/api/points/approved（JSON）由异步处理器直接处理，通过 SQLAlchemy 异步引擎
+  （ASYNC_DATABASE_URI）执行 app 中的查询计划，等待数据库和等待事件时不占用线程
+- 其余请求（写接口、CSV/NDJSON 流式导出、页面和静态资源）以及月榜、周榜快照的重建转交 Flask 应用，
+  在 ASYNC_WSGI_THREADS 个线程的线程池中执行，行为与同步部署完全一致；请求体在事件循环中读完后
+  才占用线程，慢速上传不会占住线程
+
+写接口仍由 Flask 处理，发布事件、递增 data_version 与同步部署相同，异步处理器共用这些状态。
+多 worker 部署与同步部署一样需要配置 EVENT_BROKER_URL。
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import io
+import json
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt import ExpiredSignatureError, InvalidTokenError
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header, parse_etags
+from app import (SSE_HEARTBEAT, CachedResponse, LeaderboardSnapshot, User, _leaderboard_is_fresh, activity_list_plan,
+                 app, approved_points_payload, approved_points_query, cached_identity, compressor, data_version,
+                 ensure_leaderboard, event_hub, is_branch_member, parse_activity_list_args, parse_directory_args,
+                 parse_event_topics, parse_rankings_args, rankings_plan, remember_user, response_cache,
+                 snapshot_leaderboard_period, sse_opening, sse_resync, user_cache, user_directory_payload,
+                 user_directory_query, user_info_payload, user_rank_queries)
+from compression import compress, negotiate
+from database import PoolStats, async_database_uri, async_engine_options
+from events import format_sse
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class ClientDisconnected(Exception):
+    pass
+
+class Request:
+    """ASGI 请求的只读视图：小写请求头和查询参数（与 Flask 的 request.args 相同的 MultiDict）"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {}
+        for name, value in scope['headers']:
+            self.headers.setdefault(name.decode('latin-1'), value.decode('latin-1'))
+        self.query = parse_qsl(scope['query_string'].decode('utf-8', 'replace'), keep_blank_values=True)
+        self.args = MultiDict(self.query)
+
+def encode_json(payload):
+    """与 jsonify 相同的编码方式（app.json_encoder、按键排序，调试模式下缩进输出）"""
+    indent, separators = None, (',', ':')
+    if app.config['JSONIFY_PRETTYPRINT_REGULAR'] or app.debug:
+        indent, separators = 2, (', ', ': ')
+    return (json.dumps(payload, cls=app.json_encoder, indent=indent, separators=separators,
+                       ensure_ascii=app.config['JSON_AS_ASCII'],
+                       sort_keys=app.config['JSON_SORT_KEYS']) + '\n').encode('utf-8')
+
+async def send_response(send, status, body, content_type='application/json', headers=None):
+    headers = dict(headers or {})
+    headers['Access-Control-Allow-Origin'] = '*'
+    headers['Content-Type'] = content_type
+    headers['Content-Length'] = str(len(body))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(request, send, payload, status=200, etag=None, cache_control=None):
+    """发送 JSON 响应；与 Flask 部署一样按 Accept-Encoding 压缩，并支持 If-None-Match"""
+    body = payload if isinstance(payload, bytes) else encode_json(payload)
+    headers = {}
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    if etag is not None:
+        headers['ETag'] = f'"{etag}"'
+        if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+            await send_response(send, 304, b'', headers=headers)
+            return
+    if status == 200:
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = negotiate(parse_accept_header(request.headers.get('accept-encoding')))
+        if encoding is not None and len(body) >= compressor.min_size:
+            body = compress(body, encoding, compressor.gzip_level, compressor.brotli_quality)
+            headers['Content-Encoding'] = encoding
+            if etag is not None:
+                headers['ETag'] = f'W/"{etag}"'
+    await send_response(send, status, body, headers=headers)
+
+async def read_body(receive, max_size):
+    """读完请求体，超过 max_size 字节时返回 None"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+async def run_query_plan(connection, plan):
+    """用异步连接执行 app 中的查询计划，步骤与 app.run_query_plan 相同"""
+    try:
+        query = next(plan)
+        while True:
+            query = plan.send(await connection.execute(query))
+    except StopIteration as e:
+        return e.value
+
+def build_environ(scope, body):
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI 要求路径为按 latin-1 解码的原始字节
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+class WSGIBridge:
+    """在有界线程池中运行 WSGI 应用的 ASGI 适配器（只支持 HTTP）
+
+    请求体在事件循环中读完后才提交到线程池。响应由工作线程逐块迭代，经有界队列交给事件循环
+    发送，客户端接收慢时工作线程随之等待；同一响应始终在同一线程中迭代，stream_with_context
+    的流式导出不受影响。
+    """
+
+    def __init__(self, wsgi_app, threads=8, max_body_size=None, buffered_chunks=8):
+        self.wsgi_app = wsgi_app
+        self.max_body_size = max_body_size
+        self.buffered_chunks = buffered_chunks
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive, self.max_body_size)
+        if body is None:
+            await send_response(send, 413, encode_json({'success': False, 'message': '请求体超过大小限制'}))
+            return
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue(maxsize=self.buffered_chunks)
+        cancelled = threading.Event()
+        future = loop.run_in_executor(self.executor, self._run, build_environ(scope, body),
+                                      loop, messages, cancelled)
+        try:
+            while True:
+                message = await messages.get()
+                if message is None:
+                    break
+                await send(message)
+        finally:
+            # 发送失败（客户端断开）时通知工作线程停止迭代
+            cancelled.set()
+        await future
+
+    def _run(self, environ, loop, messages, cancelled):
+        def put(message):
+            future = asyncio.run_coroutine_threadsafe(messages.put(message), loop)
+            while True:
+                try:
+                    future.result(timeout=1)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if cancelled.is_set():
+                        future.cancel()
+                        return False
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            started['message'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            }
+
+        def send_start():
+            if not started.get('sent'):
+                started['sent'] = True
+                return put(started['message'])
+            return True
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if not chunk:
+                        continue
+                    if not send_start() or not put({'type': 'http.response.body', 'body': chunk, 'more_body': True}):
+                        return
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            if send_start():
+                put({'type': 'http.response.body', 'body': b''})
+        except Exception as e:
+            print('ASGI 转发请求错误:', str(e))
+            if not started.get('sent'):
+                body = encode_json({'success': False, 'message': '服务器内部错误'})
+                put({'type': 'http.response.start', 'status': 500,
+                     'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+                put({'type': 'http.response.body', 'body': body})
+        finally:
+            put(None)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+class AsyncApp:
+    """ASGI 应用：ROUTES 中的接口由异步处理器处理，其余转交 Flask"""
+
+    ROUTES = {
+        ('GET', '/api/events'): 'stream_events',
+        ('GET', '/api/health'): 'health',
+        ('GET', '/api/users/directory'): 'get_user_directory',
+        ('GET', '/api/user/info'): 'get_user_info',
+        ('GET', '/api/rankings'): 'get_rankings',
+        ('GET', '/api/activity/list'): 'get_activity_list',
+        ('GET', '/api/points/approved'): 'get_approved_points'
+    }
+
+    def __init__(self, flask_app, database_uri, threads=8):
+        self.flask_app = flask_app
+        self.database_uri = async_database_uri(database_uri)
+        self.wsgi = WSGIBridge(flask_app, threads, flask_app.config['MAX_CONTENT_LENGTH'])
+        self._engine = None
+        self.pool_stats = None
+
+    @classmethod
+    def from_app(cls, flask_app):
+        config = flask_app.config
+        return cls(flask_app, config['ASYNC_DATABASE_URI'] or config['SQLALCHEMY_DATABASE_URI'],
+                   threads=config['ASYNC_WSGI_THREADS'])
+
+    @property
+    def engine(self):
+        # 延迟创建：未安装异步驱动时导入本模块不报错，启动时才提示
+        if self._engine is None:
+            self._engine = create_async_engine(self.database_uri,
+                                               **async_engine_options(self.database_uri, self.flask_app.config))
+            self.pool_stats = PoolStats.attach(self._engine.sync_engine)
+        return self._engine
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        handler = self.ROUTES.get((scope['method'], scope['path']))
+        try:
+            if handler is None:
+                await self.wsgi(scope, receive, send)
+            else:
+                await getattr(self, handler)(Request(scope, receive), send)
+        except ClientDisconnected:
+            pass
+        except HTTPError as e:
+            await send_response(send, e.status, encode_json({'success': False, 'message': e.message}))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    self.engine
+                except Exception as e:
+                    print('异步数据库引擎创建错误:', str(e))
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._engine is not None:
+                    await self._engine.dispose()
+                self.wsgi.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def authenticate(self, request, query_string=False):
+        """校验 Token 并返回声明，错误提示与 Flask 部署的 JWT 错误回调一致"""
+        config = self.flask_app.config
+        header = request.headers.get(config['JWT_HEADER_NAME'].lower())
+        prefix = config['JWT_HEADER_TYPE'] + ' '
+        if header and header.startswith(prefix):
+            token = header[len(prefix):]
+        elif query_string and request.args.get(config['JWT_QUERY_STRING_NAME']):
+            token = request.args[config['JWT_QUERY_STRING_NAME']]
+        else:
+            raise HTTPError(401, '未提供Token，请先登录')
+        try:
+            with self.flask_app.app_context():
+                claims = decode_token(token)
+        except ExpiredSignatureError:
+            raise HTTPError(401, 'Token已过期，请重新登录')
+        except (InvalidTokenError, JWTExtendedException):
+            raise HTTPError(401, '无效的Token，请重新登录')
+        if claims.get('type') == 'refresh':
+            raise HTTPError(401, '无效的Token，请重新登录')
+        return claims
+
+    async def load_user(self, user_id, connection):
+        row = (await connection.execute(
+            select(User.id, User.username, User.name, User.type, User.role, User.points).where(User.id == user_id)
+        )).first()
+        if row is not None:
+            remember_user(row)
+        return row
+
+    async def current_identity(self, claims):
+        """与 app.get_current_identity 相同：优先使用 Token 声明，其次进程内缓存，最后查询数据库"""
+        user_id = claims[self.flask_app.config['JWT_IDENTITY_CLAIM']]
+        cached = cached_identity(user_id, claims)
+        if cached is not None:
+            return cached
+        async with self.engine.connect() as connection:
+            user = await self.load_user(user_id, connection)
+        return user_cache.get(user_id) if user is not None else None
+
+    async def stream_events(self, request, send):
+        """SSE 事件流，参数和事件格式与 app.stream_events 相同，等待事件时不占用线程"""
+        current_user = await self.current_identity(self.authenticate(request, query_string=True))
+        if current_user is None:
+            raise HTTPError(404, '用户未找到')
+        try:
+            topics = parse_event_topics(request.args.get('topics'))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        subscription = event_hub.subscribe(current_user.id, is_branch_member(current_user), topics,
+                                           loop=asyncio.get_running_loop())
+        if subscription is None:
+            raise HTTPError(503, '实时推送连接数已满，请稍后重试')
+        heartbeat = self.flask_app.config['EVENT_HEARTBEAT_SECONDS']
+
+        async def write(chunk):
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+
+        async def stream():
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'access-control-allow-origin', b'*')
+            ]})
+            await write(sse_opening())
+            while not subscription.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    await write(SSE_HEARTBEAT)
+                    continue
+                await write(format_sse(event))
+            await write(sse_resync())
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def wait_disconnect():
+            while (await request.receive())['type'] != 'http.disconnect':
+                pass
+
+        streaming = asyncio.ensure_future(stream())
+        disconnected = asyncio.ensure_future(wait_disconnect())
+        try:
+            await asyncio.wait([streaming, disconnected], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            streaming.cancel()
+            disconnected.cancel()
+            event_hub.unsubscribe(subscription)
+
+    async def health(self, request, send):
+        """健康检查，数据库和连接池信息来自异步引擎"""
+        started = time.perf_counter()
+        try:
+            async with self.engine.connect() as connection:
+                await connection.execute(text('SELECT 1'))
+            database = {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+        except Exception as e:
+            print('健康检查错误:', str(e))
+            database = {'ok': False}
+        database['dialect'] = self.engine.dialect.name
+        await send_json(request, send, {
+            'success': database['ok'],
+            'database': database,
+            'pool': self.pool_stats.snapshot()
+        }, status=200 if database['ok'] else 503)
+
+    async def send_cached(self, request, send, name, scope, build):
+        """与 app.cached_response 相同：按 (接口, 查询参数, 可见范围) 缓存 JSON 响应，共用响应缓存和数据版本号
+
+        build 为返回响应数据的协程函数，缓存命中且版本号未变时不调用。
+        """
+        key = (f'asgi:{name}', tuple(sorted(request.query)), scope)
+        version = data_version.current
+        cached = response_cache.get(key)
+        if cached is None or cached.version != version:
+            body = encode_json(await build(version))
+            cached = CachedResponse(version, body, hashlib.sha1(body).hexdigest())
+            response_cache.set(key, cached, size=len(body))
+        await send_json(request, send, cached.body, etag=cached.etag, cache_control='private, no-cache')
+
+    async def get_user_directory(self, request, send):
+        """与 app.get_user_directory 相同的用户目录"""
+        self.authenticate(request)
+        try:
+            prefix, limit = parse_directory_args(request.args.get('q'), request.args.get('limit', type=int))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        async def build(version):
+            async with self.engine.connect() as connection:
+                rows = (await connection.execute(user_directory_query(prefix, limit))).all()
+            return user_directory_payload(rows, version)
+
+        await self.send_cached(request, send, 'get_user_directory', None, build)
+
+    async def get_user_info(self, request, send):
+        claims = self.authenticate(request)
+        try:
+            async with self.engine.connect() as connection:
+                current_user = await self.load_user(claims[self.flask_app.config['JWT_IDENTITY_CLAIM']], connection)
+                if current_user is None:
+                    raise HTTPError(404, '获取用户信息失败')
+                higher, total_users = [(await connection.execute(query)).scalar()
+                                       for query in user_rank_queries(current_user.points)]
+        except HTTPError:
+            raise
+        except Exception as e:
+            print('获取用户信息错误:', str(e))
+            raise HTTPError(500, f'获取用户信息失败: {str(e)}')
+        await send_json(request, send, {
+            'success': True,
+            'user': user_info_payload(current_user, higher + 1, total_users)
+        })
+
+    def _ensure_leaderboard(self, period):
+        with self.flask_app.app_context():
+            ensure_leaderboard(period)
+
+    async def ensure_leaderboard(self, period):
+        """快照新鲜时只做一次异步查询；需要重建时在线程池中执行 app.ensure_leaderboard（写入快照）"""
+        async with self.engine.connect() as connection:
+            snapshot = (await connection.execute(
+                select(LeaderboardSnapshot.built_at).where(LeaderboardSnapshot.period == period))).first()
+        if not _leaderboard_is_fresh(snapshot):
+            await asyncio.get_running_loop().run_in_executor(self.wsgi.executor, self._ensure_leaderboard, period)
+
+    async def get_rankings(self, request, send):
+        """与 app.get_rankings 相同的排行榜"""
+        claims = self.authenticate(request)
+        user_id = claims[self.flask_app.config['JWT_IDENTITY_CLAIM']]
+        try:
+            args = parse_rankings_args(request.args)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        async def build(version):
+            if snapshot_leaderboard_period(args):
+                await self.ensure_leaderboard(args.period)
+            # 快照重建后再建立连接，SQLite 的读事务才能看到新快照
+            async with self.engine.connect() as connection:
+                return await run_query_plan(connection, rankings_plan(args, user_id))
+
+        await self.send_cached(request, send, 'get_rankings', user_id if args.around == 'me' else None, build)
+
+    async def get_activity_list(self, request, send):
+        """与 app.get_activity_list 相同的活动列表"""
+        current_user = await self.current_identity(self.authenticate(request))
+        if current_user is None:
+            raise HTTPError(404, '用户未找到')
+        try:
+            args = parse_activity_list_args(request.args)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+        async def build(version):
+            try:
+                async with self.engine.connect() as connection:
+                    return await run_query_plan(connection, activity_list_plan(current_user.id, *args))
+            except Exception as e:
+                print('获取活动列表错误:', str(e))
+                raise HTTPError(500, f'获取活动列表失败: {str(e)}')
+
+        await self.send_cached(request, send, 'get_activity_list', current_user.id, build)
+
+    async def get_approved_points(self, request, send):
+        """与 app.get_approved_points 相同的已通过积分流水；CSV 和 NDJSON 流式导出转交 Flask"""
+        self.authenticate(request)
+        try:
+            output_format, query = approved_points_query(request.args)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        if output_format != 'json':
+            await self.wsgi(request.scope, request.receive, send)
+            return
+
+        async def build(version):
+            async with self.engine.connect() as connection:
+                return approved_points_payload(await connection.execute(query))
+
+        await self.send_cached(request, send, 'get_approved_points', None, build)
+
+application = AsyncApp.from_app(app)
@@ -0,0 +1,98 @@
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class PasswordHasher:
+    """按配置的哈希策略生成和校验密码
+
+    默认（workers 为 0）在当前线程内直接计算。workers 大于 0 时，计算被派发到一个
+    有界的进程池，请求线程只需等待结果；这需要按部署实测确认有收益后再开启。进程池
+    用 spawn 方式启动子进程，避免从多线程的 Web 进程 fork 时继承其他线程持有的锁而死锁。
+
+    未配置进程池时，批量哈希（hash_many）使用最多 threads 个线程的线程池：PBKDF2 由
+    hashlib.pbkdf2_hmac 计算，计算期间释放 GIL，多个线程可以同时使用多个 CPU。
+    """
+
+    def __init__(self, method, salt_length, workers=0, timeout=None, threads=1):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.timeout = timeout
+        self.threads = threads
+        self._pool = None
+        self._thread_pool = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            method=config['PASSWORD_HASH_METHOD'],
+            salt_length=config['PASSWORD_SALT_LENGTH'],
+            workers=config['PASSWORD_HASH_WORKERS'],
+            timeout=config['PASSWORD_HASH_TIMEOUT'],
+            threads=config['PASSWORD_HASH_THREADS']
+        )
+
+    def _get_pool(self):
+        # 延迟创建，保证 gunicorn 等预派生模型下每个 worker 进程各自拥有进程池
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _get_thread_pool(self):
+        if self._thread_pool is None:
+            with self._lock:
+                if self._thread_pool is None:
+                    self._thread_pool = ThreadPoolExecutor(max_workers=self.threads,
+                                                           thread_name_prefix='password-hash')
+        return self._thread_pool
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        return self._get_pool().submit(func, *args).result(timeout=self.timeout)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def hash_many(self, passwords):
+        """并行生成一批密码哈希，结果顺序与输入一致"""
+        passwords = list(passwords)
+        if not self.workers:
+            if self.threads <= 1 or len(passwords) <= 1:
+                return [generate_password_hash(password, self.method, self.salt_length) for password in passwords]
+            count = len(passwords)
+            return list(self._get_thread_pool().map(
+                generate_password_hash, passwords, [self.method] * count, [self.salt_length] * count
+            ))
+        count = len(passwords)
+        # timeout 针对单个哈希，整批的等待上限按每个进程需要串行计算的数量放大
+        timeout = self.timeout and self.timeout * math.ceil(count / self.workers)
+        return list(self._get_pool().map(
+            generate_password_hash, passwords, [self.method] * count, [self.salt_length] * count,
+            timeout=timeout,
+            chunksize=max(1, count // (self.workers * 4))
+        ))
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """哈希使用的算法、迭代次数或盐长度与当前策略不一致时返回 True"""
+        if pwhash.count('$') < 2:
+            return True
+        method, salt, _ = pwhash.split('$', 2)
+        return method != self.method or len(salt) != self.salt_length
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown()
+            self._thread_pool = None
@@ -0,0 +1,290 @@
+"""接口压测：在合成数据上测量主要接口的延迟分位数、吞吐量和每次请求的 SQL 语句数
+
+两种驱动方式：
+- client：Flask 测试客户端，不经过网络，测的是视图和数据库本身的开销
+- wsgi：在本进程内启动多线程 WSGI 服务器（werkzeug），通过 HTTP keep-alive 连接请求，
+  包含请求解析和响应序列化的开销
+
+SQL 语句数由引擎上的 before_cursor_execute 监听器统计，服务器与压测在同一进程内，
+两种方式都能统计。结果写入 JSON（--output），--compare 与之前保存的结果对比，
+p95 变慢超过 --threshold 或 SQL 语句数增加时以非零状态退出，可用于比较不同提交。
+
+默认每次运行生成一份临时 SQLite 合成库；--database-uri 指定已有库时需先用
+benchmarks.synthetic 生成数据。响应缓存默认关闭以测量真实查询，--response-cache 打开。
+
+用法：python -m benchmarks.bench_api --users 2000 --records 20000 --requests 300 --concurrency 4 \\
+        --mode client wsgi --output bench.json
+"""
+import argparse
+import http.client
+import json
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from benchmarks.common import StatementCounter, load_app
+from benchmarks.synthetic import PASSWORD, generate
+
+# (名称, 方法, 路径, 使用的身份)
+ENDPOINTS = [
+    ('login', 'POST', '/api/login', None),
+    ('user_info', 'GET', '/api/user/info', 'normal'),
+    ('user_directory', 'GET', '/api/users/directory', 'normal'),
+    ('rankings_total', 'GET', '/api/rankings?period=total', 'normal'),
+    ('rankings_month', 'GET', '/api/rankings?period=month', 'normal'),
+    ('activity_list', 'GET', '/api/activity/list', 'normal'),
+    ('points_review_list', 'GET', '/api/points/review/list', 'branch'),
+    ('points_approved', 'GET', '/api/points/approved', 'branch'),
+]
+
+LOGIN_PAYLOAD = {'username': 'member0', 'password': PASSWORD, 'type': 'normal'}
+
+def percentile(sorted_values, fraction):
+    """最近秩法分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class ClientDriver:
+    """通过 Flask 测试客户端发请求，每个线程一个客户端"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, headers, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, data=body)
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+class NoDelayHTTPConnection(http.client.HTTPConnection):
+    """关闭 Nagle 算法的连接
+
+    keep-alive 连接上一条消息分两次写入（http.client 发送 POST 的请求头和请求体、werkzeug 发送
+    响应头和响应体）时，Nagle 算法与对端的延迟确认叠加，每个请求会多等约 40 ms，测出的是 TCP
+    的等待而不是接口本身的耗时。
+    """
+
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+class WSGIDriver:
+    """在后台线程启动多线程 WSGI 服务器，每个压测线程保持一条 keep-alive 连接（两端都关闭 Nagle 算法）"""
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class RequestHandler(WSGIRequestHandler):
+            protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+            disable_nagle_algorithm = True  # 响应头和响应体分开写入，原因同 NoDelayHTTPConnection
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=RequestHandler)
+        self.port = self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        self._local = threading.local()
+
+    def request(self, method, path, headers, body):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = NoDelayHTTPConnection('127.0.0.1', self.port)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, ConnectionError):
+            # 服务器关闭了连接，重连后重试一次
+            connection.close()
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        return response.status
+
+    def close(self):
+        self.server.shutdown()
+
+def run_endpoint(driver, counter, method, path, headers, body, total, concurrency, warmup):
+    """用 concurrency 个线程共发出 total 次请求，返回该接口的统计结果"""
+    for _ in range(warmup):
+        driver.request(method, path, headers, body)
+
+    remaining = [total]
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def worker():
+        timings = []
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            status = driver.request(method, path, headers, body)
+            timings.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+        with lock:
+            latencies.extend(timings)
+
+    statements_before = counter.count
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    statements = counter.count - statements_before
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': len(errors),
+        'error_status': sorted(set(errors)),
+        'throughput_rps': round(total / elapsed, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'sql_per_request': round(statements / total, 2)
+    }
+
+def login_headers(driver_app, username, type_):
+    client = driver_app.test_client()
+    response = client.post('/api/login', json={'username': username, 'password': PASSWORD, 'type': type_})
+    if response.status_code != 200:
+        raise RuntimeError(f'压测账号 {username} 登录失败：{response.get_json()}')
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold):
+    """打印与基线的 p95 对比，返回 p95 变慢超过 threshold 或 SQL 语句数增加的 (驱动方式, 接口) 列表
+
+    延迟受机器负载影响，SQL 语句数是确定的，语句数增加通常意味着引入了 N+1 查询。
+    """
+    regressions = []
+    print(f'\n与基线 {baseline.get("revision")} 对比（p95）：')
+    for mode, endpoints in results['results'].items():
+        for name, stats in endpoints.items():
+            old = baseline.get('results', {}).get(mode, {}).get(name)
+            if old is None:
+                continue
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0
+            flag = ''
+            if change > threshold:
+                flag += ' 变慢'
+            if stats['sql_per_request'] > old['sql_per_request']:
+                flag += ' SQL 增加'
+            print(f'{mode:>6} {name:<20} {old["p95_ms"]:>9.2f} -> {stats["p95_ms"]:>9.2f} ms '
+                  f'({change:+.0%}) sql {old["sql_per_request"]} -> {stats["sql_per_request"]}{flag}')
+            if flag:
+                regressions.append((mode, name))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='接口延迟、吞吐量和 SQL 语句数压测')
+    parser.add_argument('--database-uri', help='已生成合成数据的库，默认生成临时 SQLite 库')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--activities', type=int, default=200)
+    parser.add_argument('--participants', type=int, default=20)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--mode', nargs='+', choices=['client', 'wsgi'], default=['client', 'wsgi'])
+    parser.add_argument('--endpoints', nargs='+', choices=[name for name, *_ in ENDPOINTS],
+                        default=[name for name, *_ in ENDPOINTS])
+    parser.add_argument('--requests', type=int, default=200, help='每个接口的请求数')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--response-cache', action='store_true', help='保留响应缓存（默认关闭）')
+    parser.add_argument('--output', help='结果 JSON 文件')
+    parser.add_argument('--compare', help='之前保存的结果 JSON，对比 p95')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p95 变慢超过该比例视为退化')
+    args = parser.parse_args()
+
+    app_module = load_app(args.database_uri)
+    app, db = app_module.app, app_module.db
+    dataset = None
+    if args.database_uri is None:
+        dataset = generate(app_module, args.users, args.activities, args.participants, args.records)
+    if not args.response_cache:
+        # maxsize 为 0 时写入的条目立即被淘汰，每次请求都执行视图
+        app_module.response_cache.maxsize = 0
+
+    with app.app_context():
+        engine = db.engine
+        dialect = engine.dialect.name
+    identities = {
+        'normal': login_headers(app, 'member0', 'normal'),
+        'branch': login_headers(app, 'secretary', 'branch')
+    }
+    login_body = json.dumps(LOGIN_PAYLOAD)
+
+    results = {}
+    with StatementCounter(engine) as counter:
+        for mode in args.mode:
+            driver = ClientDriver(app) if mode == 'client' else WSGIDriver(app)
+            results[mode] = {}
+            print(f'\n[{mode}] {"endpoint":<20} {"rps":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"sql":>6} {"err":>4}')
+            try:
+                for name, method, path, identity in ENDPOINTS:
+                    if name not in args.endpoints:
+                        continue
+                    if identity is None:
+                        headers, body = {'Content-Type': 'application/json'}, login_body
+                    else:
+                        headers, body = identities[identity], None
+                    stats = run_endpoint(driver, counter, method, path, headers, body,
+                                         args.requests, args.concurrency, args.warmup)
+                    results[mode][name] = stats
+                    print(f'[{mode}] {name:<20} {stats["throughput_rps"]:>8} {stats["p50_ms"]:>8} '
+                          f'{stats["p95_ms"]:>8} {stats["p99_ms"]:>8} {stats["sql_per_request"]:>6} {stats["errors"]:>4}')
+            finally:
+                driver.close()
+
+    report = {
+        'revision': git_revision(),
+        'created_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'database': dialect,
+        'dataset': dataset,
+        'settings': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'warmup': args.warmup,
+            'response_cache': args.response_cache
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'\n结果已写入 {args.output}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""并发连接容量压测：同步部署（固定线程数的 WSGI 服务器）与 ASGI 入口（uvicorn asgi:application）
+
+同步部署中每个连接在处理期间占用一个工作线程，线程数就是同时处理的连接数上限，/api/events
+这类长连接会一直占住线程。压测先建立 N 条实时推送长连接并保持（--sse 可给出多个 N），再用
+--concurrency 个线程请求普通接口，统计长连接建立数、普通请求的成功数和延迟：同步部署在长连接数
+达到线程数后，普通请求只能排队直到超时；ASGI 入口中长连接和异步接口不占用线程，转交 Flask 的
+接口（rankings）仍受线程数限制，但不再被长连接占满。
+
+两种模式使用相同的工作线程数（--threads，对应 gunicorn 的 --threads 和 ASYNC_WSGI_THREADS），
+每个请求新建一条连接。需要安装 uvicorn 和 aiosqlite。
+
+用法：python -m benchmarks.bench_asgi --threads 8 --sse 0 8 32 128 --requests 100 --concurrency 8 \\
+        --output bench-asgi.json
+"""
+import argparse
+import http.client
+import json
+import platform
+import selectors
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from benchmarks.bench_api import NoDelayHTTPConnection, git_revision, login_headers, percentile
+from benchmarks.common import load_app
+from benchmarks.synthetic import generate
+
+# (名称, 路径, 使用的身份, ASGI 入口中是否为异步处理器)
+ENDPOINTS = [
+    ('user_directory', '/api/users/directory', 'normal', True),
+    ('user_info', '/api/user/info', 'normal', True),
+    ('rankings_total', '/api/rankings?period=total', 'normal', True),
+    ('activity_list', '/api/activity/list?limit=20', 'normal', True),
+    ('approved_points', '/api/points/approved', 'normal', True),
+]
+
+class SyncServer:
+    """请求交给固定大小线程池处理的 WSGI 服务器，模拟 gunicorn gthread 等按线程数限制并发的部署"""
+
+    def __init__(self, app, threads):
+        from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+        class RequestHandler(WSGIRequestHandler):
+            disable_nagle_algorithm = True  # 与 uvicorn 一致，见 bench_api.NoDelayHTTPConnection
+
+            def log_request(self, *args, **kwargs):
+                pass
+
+        executor = self.executor = ThreadPoolExecutor(threads, thread_name_prefix='sync-worker')
+
+        class PooledWSGIServer(BaseWSGIServer):
+            def process_request(self, request, client_address):
+                executor.submit(self._process, request, client_address)
+
+            def _process(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        self.server = PooledWSGIServer('127.0.0.1', 0, app, handler=RequestHandler)
+        self.port = self.server.server_port
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class ASGIServer:
+    """在后台线程运行 uvicorn，服务 asgi.AsyncApp"""
+
+    def __init__(self, app, threads):
+        import uvicorn
+        from asgi import AsyncApp
+
+        config = app.config
+        application = AsyncApp(app, config['ASYNC_DATABASE_URI'] or config['SQLALCHEMY_DATABASE_URI'], threads=threads)
+        self.server = uvicorn.Server(uvicorn.Config(application, log_level='warning', lifespan='on'))
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        self._thread = threading.Thread(target=self.server.run, kwargs={'sockets': [sock]}, daemon=True)
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError('uvicorn 启动失败')
+            time.sleep(0.05)
+
+    def close(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
+
+def open_streams(port, path, count, timeout):
+    """建立 count 条 SSE 连接，返回 (sockets, 在 timeout 秒内收到 200 响应的连接数)"""
+    selector = selectors.DefaultSelector()
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port))
+        sock.sendall(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode('ascii'))
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+        sockets.append(sock)
+    established = 0
+    deadline = time.perf_counter() + timeout
+    while established < count and time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=max(0, deadline - time.perf_counter())):
+            data = key.fileobj.recv(4096)
+            selector.unregister(key.fileobj)
+            if data.startswith((b'HTTP/1.1 200', b'HTTP/1.0 200')):
+                established += 1
+    selector.close()
+    return sockets, established
+
+def request(port, path, headers, timeout):
+    connection = NoDelayHTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        connection.close()
+
+def run_load(port, path, headers, total, concurrency, timeout):
+    remaining = [total]
+    lock = threading.Lock()
+    latencies = []
+    failures = []
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            status = request(port, path, headers, timeout)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 200:
+                    latencies.append(elapsed)
+                else:
+                    failures.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'ok': len(latencies),
+        'timeouts': failures.count(None),
+        'errors': len(failures) - failures.count(None),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='同步部署与 ASGI 入口的并发连接容量对比')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--activities', type=int, default=100)
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--mode', nargs='+', choices=['sync', 'asgi'], default=['sync', 'asgi'])
+    parser.add_argument('--threads', type=int, default=8, help='两种模式的工作线程数')
+    parser.add_argument('--sse', type=int, nargs='+', default=[0, 8, 32, 128], help='保持的实时推送长连接数')
+    parser.add_argument('--requests', type=int, default=100, help='每种长连接数下每个接口的请求数')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=3, help='单个请求和建立长连接的超时秒数')
+    parser.add_argument('--output', help='结果 JSON 文件')
+    args = parser.parse_args()
+
+    try:
+        import aiosqlite  # noqa: F401
+        import uvicorn  # noqa: F401
+    except ImportError as e:
+        sys.exit(f'需要安装 uvicorn 和 aiosqlite（pip install uvicorn aiosqlite）：{e}')
+
+    app_module = load_app()
+    app = app_module.app
+    dataset = generate(app_module, args.users, args.activities, records=args.records)
+    # 响应缓存关闭，每次请求都访问数据库；心跳改短，断开的长连接在同步部署中能及时释放线程
+    app_module.response_cache.maxsize = 0
+    app.debug = False
+    app.config['EVENT_HEARTBEAT_SECONDS'] = 1
+    app_module.event_hub.max_subscribers = max(args.sse) + args.concurrency
+    identities = {
+        'normal': login_headers(app, 'member0', 'normal'),
+        'branch': login_headers(app, 'secretary', 'branch')
+    }
+    events_path = '/api/events?token=' + identities['branch']['Authorization'].split()[1]
+
+    results = {}
+    for mode in args.mode:
+        server = SyncServer(app, args.threads) if mode == 'sync' else ASGIServer(app, args.threads)
+        results[mode] = {}
+        print(f'\n[{mode}] {"sse":>5} {"open":>5} {"endpoint":<16} {"ok":>5} {"timeout":>8} {"rps":>8} '
+              f'{"p50":>8} {"p95":>8}')
+        try:
+            for streams in args.sse:
+                sockets, established = open_streams(server.port, events_path, streams, args.timeout)
+                row = {'streams': streams, 'established': established, 'endpoints': {}}
+                for name, path, identity, native in ENDPOINTS:
+                    stats = run_load(server.port, path, identities[identity], args.requests,
+                                     args.concurrency, args.timeout)
+                    stats['async_handler'] = native and mode == 'asgi'
+                    row['endpoints'][name] = stats
+                    print(f'[{mode}] {streams:>5} {established:>5} {name:<16} {stats["ok"]:>5} {stats["timeouts"]:>8} '
+                          f'{stats["throughput_rps"]:>8} {stats["p50_ms"]!s:>8} {stats["p95_ms"]!s:>8}')
+                results[mode][str(streams)] = row
+                for sock in sockets:
+                    sock.close()
+                # 等待服务端发现连接已断开并释放线程（同步部署在下一次心跳写入时才发现）
+                time.sleep(app.config['EVENT_HEARTBEAT_SECONDS'] + 1)
+                deadline = time.perf_counter() + 60
+                while len(app_module.event_hub) and time.perf_counter() < deadline:
+                    time.sleep(0.2)
+        finally:
+            server.close()
+
+    report = {
+        'revision': git_revision(),
+        'created_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'dataset': dataset,
+        'settings': {
+            'threads': args.threads,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'timeout': args.timeout
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'\n结果已写入 {args.output}')
+
+if __name__ == '__main__':
+    main()
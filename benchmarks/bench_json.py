@@ -0,0 +1,136 @@
+"""JSON 序列化压测：比较标准库编码与 orjson 编码、ORM 对象与列元组投影的 CPU 耗时
+
+接口部分用测试客户端顺序请求，统计每次请求的进程 CPU 时间（time.process_time），
+分别在 app.json_encoder 为 Flask 默认 JSONEncoder 和 FastJSONEncoder 时交替测量（按生产
+环境关闭调试模式）；同时单独测量把响应数据编码为 JSON 的耗时，包括调试模式下的缩进输出。序列化部分比较把同一批行取出并转为字典时，
+加载 ORM 对象与直接投影列元组的差别。响应缓存关闭，每次请求都执行视图。
+
+用法：python -m benchmarks.bench_json --users 2000 --records 20000 --requests 30
+"""
+import argparse
+import json
+import time
+from flask.json import JSONEncoder
+from benchmarks.common import load_app
+from benchmarks.synthetic import PASSWORD, generate
+
+ENDPOINTS = [
+    ('users', '/api/users', 'normal'),
+    ('rankings', '/api/rankings?period=total', 'normal'),
+    ('points_approved', '/api/points/approved', 'branch'),
+    ('activity_list', '/api/activity/list?limit=100', 'normal'),
+    ('points_review_list', '/api/points/review/list', 'branch'),
+]
+
+def cpu_ms(func, repeat):
+    """func 重复 repeat 次，返回每次的平均 CPU 毫秒数"""
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 1000
+
+def bench_endpoints(app_module, headers, repeat):
+    from serialization import FastJSONEncoder, orjson
+    app = app_module.app
+    client = app.test_client()
+    print(f'orjson: {"已安装 " + orjson.__version__ if orjson else "未安装，FastJSONEncoder 退回标准库"}')
+    print(f'\n{"endpoint":<20} {"bytes":>9} {"cpu std":>9} {"cpu fast":>9} {"encode std":>11} {"encode fast":>12}'
+          f' {"indent std":>11} {"indent fast":>12}')
+    results = {}
+    for name, path, identity in ENDPOINTS:
+        payload = client.get(path, headers=headers[identity]).get_json()
+        row = {'bytes': len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))}
+        # 两种编码器交替请求，避免缓存预热和 GC 时机偏向其中一种
+        cpu = {'std': 0.0, 'fast': 0.0}
+        for _ in range(repeat):
+            for label, encoder in (('std', JSONEncoder), ('fast', FastJSONEncoder)):
+                app.json_encoder = encoder
+                cpu[label] += cpu_ms(lambda: client.get(path, headers=headers[identity]), 1)
+        for label, encoder in (('std', JSONEncoder), ('fast', FastJSONEncoder)):
+            row[f'cpu_{label}_ms'] = round(cpu[label] / repeat, 2)
+            with app.app_context():
+                row[f'encode_{label}_ms'] = round(cpu_ms(
+                    lambda: json.dumps(payload, cls=encoder, separators=(',', ':'), sort_keys=True), repeat), 2)
+                # 调试模式下 jsonify 以 indent=2 缩进输出
+                row[f'encode_{label}_indent_ms'] = round(cpu_ms(
+                    lambda: json.dumps(payload, cls=encoder, indent=2, sort_keys=True), repeat), 2)
+        results[name] = row
+        print(f'{name:<20} {row["bytes"]:>9} {row["cpu_std_ms"]:>9} {row["cpu_fast_ms"]:>9} '
+              f'{row["encode_std_ms"]:>11} {row["encode_fast_ms"]:>12} '
+              f'{row["encode_std_indent_ms"]:>11} {row["encode_fast_indent_ms"]:>12}')
+    app.json_encoder = FastJSONEncoder
+    return results
+
+def bench_projection(app_module, repeat):
+    """同一批行：加载 ORM 对象后逐个取属性 vs 只取列元组"""
+    from serialization import format_datetime, rows_to_dicts
+    app, db = app_module.app, app_module.db
+    User, PointsRecord = app_module.User, app_module.PointsRecord
+    keys = ['id', 'category', 'subcategory', 'summary', 'hours', 'points', 'status', 'created_at']
+
+    def orm_users():
+        return [{'id': user.id, 'username': user.username, 'name': user.name, 'type': user.type,
+                 'role': user.role, 'points': user.points} for user in User.query.order_by(User.points.desc())]
+
+    def projected_users():
+        return rows_to_dicts(db.session.query(User.id, User.username, User.name, User.type, User.role, User.points)
+                             .order_by(User.points.desc()), ['id', 'username', 'name', 'type', 'role', 'points'])
+
+    def orm_records():
+        return [{key: getattr(record, key) for key in keys[:-1]} |
+                {'created_at': record.created_at.strftime('%Y-%m-%d %H:%M:%S')}
+                for record in PointsRecord.query.filter_by(status='approved')]
+
+    def projected_records():
+        columns = [getattr(PointsRecord, key) for key in keys]
+        return rows_to_dicts(db.session.query(*columns).filter(PointsRecord.status == 'approved'),
+                             keys, {'created_at': format_datetime})
+
+    print(f'\n{"rows":<20} {"count":>9} {"orm ms":>9} {"columns ms":>11}')
+    results = {}
+    with app.app_context():
+        for name, orm, projected in (('users', orm_users, projected_users),
+                                     ('approved_records', orm_records, projected_records)):
+            count = len(projected())
+            row = {
+                'rows': count,
+                'orm_ms': round(cpu_ms(lambda: (orm(), db.session.remove()), repeat), 2),
+                'columns_ms': round(cpu_ms(lambda: (projected(), db.session.remove()), repeat), 2)
+            }
+            results[name] = row
+            print(f'{name:<20} {count:>9} {row["orm_ms"]:>9} {row["columns_ms"]:>11}')
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON 序列化 CPU 耗时对比')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--activities', type=int, default=200)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=20, help='每个接口、每种编码器的请求数')
+    parser.add_argument('--output', help='结果 JSON 文件')
+    args = parser.parse_args()
+
+    app_module = load_app()
+    generate(app_module, args.users, args.activities, records=args.records)
+    # maxsize 为 0 时写入的条目立即被淘汰，每次请求都执行视图
+    app_module.response_cache.maxsize = 0
+    # 按生产环境测量：调试模式下 jsonify 会缩进输出
+    app_module.app.debug = False
+    client = app_module.app.test_client()
+    headers = {}
+    for identity, username in (('normal', 'member0'), ('branch', 'secretary')):
+        token = client.post('/api/login', json={'username': username, 'password': PASSWORD,
+                                                'type': identity}).get_json()['token']
+        headers[identity] = {'Authorization': f'Bearer {token}'}
+
+    report = {
+        'endpoints': bench_endpoints(app_module, headers, args.requests),
+        'projection': bench_projection(app_module, args.requests)
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'\n结果已写入 {args.output}')
+
+if __name__ == '__main__':
+    main()
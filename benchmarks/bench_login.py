@@ -0,0 +1,75 @@
+"""登录吞吐量压测：比较不同密码校验进程池大小下每秒可完成的登录次数
+
+用法：python -m benchmarks.bench_login --pool-sizes 0 1 2 4 --concurrency 8 --requests 200
+"""
+import argparse
+import threading
+import time
+from benchmarks.common import load_app
+
+def run_logins(app, total, concurrency, payload):
+    """用 concurrency 个线程共发出 total 次登录请求，返回耗时秒数"""
+    remaining = [total]
+    lock = threading.Lock()
+    failures = []
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            response = client.post('/api/login', json=payload)
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        raise RuntimeError(f'{len(failures)} 次登录失败，状态码 {failures[0]}')
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='登录吞吐量压测')
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    from auth import PasswordHasher
+    app, db, User = app_module.app, app_module.db, app_module.User
+
+    with app.app_context():
+        db.session.add(User(
+            username='bench',
+            password=app_module.password_hasher.hash('bench-password'),
+            name='压测用户',
+            type='normal',
+            role='党员'
+        ))
+        db.session.commit()
+    payload = {'username': 'bench', 'password': 'bench-password', 'type': 'normal'}
+
+    print(f'{"pool":>6} {"logins/s":>10} {"seconds":>9}')
+    for pool_size in args.pool_sizes:
+        hasher = PasswordHasher(
+            method=app.config['PASSWORD_HASH_METHOD'],
+            salt_length=app.config['PASSWORD_SALT_LENGTH'],
+            workers=pool_size,
+            timeout=app.config['PASSWORD_HASH_TIMEOUT']
+        )
+        app_module.password_hasher = hasher
+        run_logins(app, min(args.concurrency, args.requests), args.concurrency, payload)  # 预热进程池
+        elapsed = run_logins(app, args.requests, args.concurrency, payload)
+        hasher.shutdown()
+        print(f'{pool_size:>6} {args.requests / elapsed:>10.1f} {elapsed:>9.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import threading
+from sqlalchemy import event
+import config
+
+def load_app(database_uri=None):
+    """在导入 app 之前把数据库切换到临时库，避免压测数据写入 dev.db
+
+    返回 app 模块；未指定 database_uri 时使用临时目录下的 SQLite 文件。
+    """
+    if database_uri is None:
+        fd, path = tempfile.mkstemp(prefix='bench-', suffix='.db')
+        os.close(fd)
+        database_uri = f'sqlite:///{path}'
+    config.current_config.SQLALCHEMY_DATABASE_URI = database_uri
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.db.create_all()
+    return app_module
+
+class StatementCounter:
+    """统计期间引擎执行的 SQL 语句数，压测和测试共用
+
+    with StatementCounter(engine) as counter: ... 之后 counter.count 为执行的语句数；
+    多线程压测时各线程的语句都计入。
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
@@ -0,0 +1,178 @@
+"""合成数据生成器：按指定规模批量写入用户、活动、参与者和积分申请，用于压测和查询计划检查
+
+数据直接用 executemany 批量插入，不经过 API。生成后按账本写入基础分并修正缓存积分，
+重建按天汇总表，保证与真实数据的不变量一致（user.points 等于已通过记录之和）。
+同一 --seed 生成的数据相同，便于不同提交之间对比压测结果。
+
+所有用户的密码均为 PASSWORD；用户名 member{i} 为普通党员，委员 COMMITTEE_USERS 中依次担任
+支部书记、组织委员、宣传委员。
+
+用法：python -m benchmarks.synthetic --database-uri sqlite:///bench.db --users 2000 --activities 500 --records 20000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from benchmarks.common import load_app
+
+PASSWORD = 'bench-password'
+COMMITTEE_USERS = [('secretary', '支部书记'), ('organizer', '组织委员'), ('publicity', '宣传委员')]
+ACTIVITY_STATUSES = ['pending', 'approved', 'rejected', 'ongoing', 'completed']
+RECORD_STATUSES = ['pending', 'approved', 'approved', 'approved', 'rejected']
+CHUNK_SIZE = 1000
+
+def _chunks(rows, size=CHUNK_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def _insert(db, table, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(table.insert(), chunk)
+
+def _category_choices(categories):
+    """把贡献分类展开为 (分类, 子类, 基础分值, 是否按时长计分)
+
+    与 apply_points 一致，'其他贡献' 按时长计分，生成时随机取 1-10 小时，分值为基础分值乘以时长。
+    """
+    return [(category, subcategory, points, category == '其他贡献')
+            for category, subcategories in categories.items()
+            for subcategory, points in subcategories.items()]
+
+def generate(app_module, users=1000, activities=200, participants=20, records=10000, days=365, seed=0):
+    """写入合成数据并提交，返回各表写入的行数"""
+    from ledger import open_accounts, rebuild_rollups, reconcile
+    app, db = app_module.app, app_module.db
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+
+    def random_time():
+        return start + timedelta(seconds=rng.randrange(days * 86400))
+
+    with app.app_context():
+        tables = db.metadata.tables
+        user_table = tables['user']
+        offset = db.session.query(db.func.count(user_table.c.id)).scalar()
+        # 同一个哈希复用给所有用户，避免生成大数据集时把时间花在密码哈希上
+        password = app_module.password_hasher.hash(PASSWORD)
+
+        user_rows = [{
+            'username': f'{username}{offset}' if offset else username,
+            'password': password,
+            'name': f'委员{index}',
+            'type': 'branch',
+            'role': role,
+            'points': 0,
+            'created_at': start
+        } for index, (username, role) in enumerate(COMMITTEE_USERS)]
+        user_rows += [{
+            'username': f'member{offset + i}',
+            'password': password,
+            'name': f'党员{offset + i}',
+            'type': 'normal',
+            'role': '党员',
+            'points': 0,
+            'created_at': start + timedelta(seconds=rng.randrange(days * 86400 // 2))
+        } for i in range(users)]
+        _insert(db, user_table, user_rows)
+        usernames = [row['username'] for row in user_rows]
+        ids = dict(db.session.query(user_table.c.username, user_table.c.id).filter(
+            user_table.c.username.in_(usernames)))
+        committee_ids = [ids[row['username']] for row in user_rows[:len(COMMITTEE_USERS)]]
+        member_ids = [ids[row['username']] for row in user_rows[len(COMMITTEE_USERS):]]
+        all_ids = committee_ids + member_ids
+
+        activity_rows = []
+        for i in range(activities):
+            start_time = random_time()
+            status = rng.choice(ACTIVITY_STATUSES)
+            created_at = start_time - timedelta(days=rng.randint(1, 14))
+            activity_rows.append({
+                'title': f'合成活动{i}',
+                'description': '压测数据',
+                'points': rng.choice([2, 3, 5, 8, 10]),
+                'start_time': start_time,
+                'end_time': start_time + timedelta(hours=rng.randint(1, 6)),
+                'location': f'教室{rng.randint(100, 599)}',
+                'status': status,
+                'applicant_id': rng.choice(all_ids),
+                'main_responsible_id': rng.choice(all_ids),
+                'reviewer_id': None if status == 'pending' else rng.choice(committee_ids),
+                'created_at': created_at,
+                'reviewed_at': None if status == 'pending' else created_at + timedelta(hours=rng.randint(1, 48))
+            })
+        activity_table = tables['activity']
+        before = db.session.query(db.func.max(activity_table.c.id)).scalar() or 0
+        _insert(db, activity_table, activity_rows)
+        activity_ids = [activity_id for activity_id, in db.session.query(activity_table.c.id).filter(
+            activity_table.c.id > before).order_by(activity_table.c.id)]
+
+        participant_rows, sub_rows = [], []
+        for activity_id, activity in zip(activity_ids, activity_rows):
+            for user_id in rng.sample(all_ids, min(participants, len(all_ids))):
+                participant_rows.append({'activity_id': activity_id, 'user_id': user_id,
+                                         'created_at': activity['created_at']})
+            for user_id in rng.sample(all_ids, min(2, len(all_ids))):
+                sub_rows.append({'activity_id': activity_id, 'user_id': user_id,
+                                 'created_at': activity['created_at']})
+        _insert(db, tables['activity_participants'], participant_rows)
+        _insert(db, tables['activity_sub_responsibles'], sub_rows)
+
+        choices = _category_choices(app_module.contributionCategories)
+        record_rows = []
+        for i in range(records):
+            category, subcategory, points, hourly = rng.choice(choices)
+            hours = rng.randint(1, 10) if hourly else None
+            status = rng.choice(RECORD_STATUSES)
+            created_at = random_time()
+            record_rows.append({
+                'user_id': rng.choice(member_ids),
+                'points': points * hours if hourly else points,
+                'reason': f'{category}-{subcategory}: 合成申请{i}',
+                'category': category,
+                'subcategory': subcategory,
+                'summary': f'合成申请{i}',
+                'hours': hours,
+                'status': status,
+                'reviewer_id': None if status == 'pending' else rng.choice(committee_ids),
+                'created_at': created_at,
+                'reviewed_at': None if status == 'pending' else min(now, created_at + timedelta(hours=rng.randint(1, 72)))
+            })
+        _insert(db, tables['points_record'], record_rows)
+
+        opened = open_accounts(db, all_ids)
+        reconcile(db, fix=True)
+        rebuild_rollups(db)
+        db.session.commit()
+
+    return {
+        'users': len(user_rows),
+        'activities': len(activity_rows),
+        'participants': len(participant_rows),
+        'sub_responsibles': len(sub_rows),
+        'points_records': len(record_rows),
+        'base_records': opened
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='生成压测用的合成数据')
+    parser.add_argument('--database-uri', required=True, help='例如 sqlite:///bench.db 或 mysql+pymysql://...')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--activities', type=int, default=200)
+    parser.add_argument('--participants', type=int, default=20, help='每个活动的参与人数')
+    parser.add_argument('--records', type=int, default=10000, help='积分申请条数')
+    parser.add_argument('--days', type=int, default=365, help='数据分布在最近多少天内')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    app_module = load_app(args.database_uri)
+    started = time.perf_counter()
+    counts = generate(app_module, args.users, args.activities, args.participants,
+                      args.records, args.days, args.seed)
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f'{table:>17}: {count}')
+    print(f'生成完成，耗时 {elapsed:.2f} 秒；所有用户的密码均为 {PASSWORD}')
+
+if __name__ == '__main__':
+    main()
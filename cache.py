@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """线程安全的 LRU 缓存，条目写入 ttl 秒后过期，超过 maxsize 时淘汰最久未使用的条目
+
+    指定 maxbytes 时还按 set 传入的 size 累计占用，超出后同样按 LRU 淘汰；
+    单个条目超过 maxbytes 时不缓存。
+    """
+
+    def __init__(self, maxsize, ttl, maxbytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is not None:
+            self._bytes -= item[2]
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at, _ = item
+            if expires_at <= time.monotonic():
+                self._pop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, size=0):
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (value, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or \
+                    (self.maxbytes is not None and self._bytes > self.maxbytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._data)
+
+class DataVersion:
+    """进程内的数据版本号，写接口提交后调用 bump，缓存的响应版本号不一致即视为过期"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return self._value
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+            return self._value
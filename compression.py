@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from collections import namedtuple
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只协商 gzip
+    brotli = None
+
+# 本模块由 app 导入，不能在模块级导入 app
+#
+# 响应压缩：after_request 按 Accept-Encoding 协商 br / gzip，只压缩超过阈值的 JSON、HTML
+# 等文本响应；流式响应（SSE、CSV/NDJSON 导出）和文件响应保持原样。
+#
+# 静态页面与资源：启动时把 index.html、main.html、admin/ 和 static/ 下的文件读入内存，
+# 按内容哈希生成 ETag，并预先压缩好 br / gzip 版本。页面中引用的 static/ 资源被改写为
+# 带 ?v=<哈希> 的地址，这类请求返回一年的 immutable 缓存，重复打开页面时浏览器不再请求资源；
+# 页面本身缓存时间较短，过期后凭 ETag 重新验证，命中时直接返回 304。
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+    'text/html', 'text/css', 'text/javascript', 'text/plain', 'text/xml'
+}
+
+def available_encodings():
+    """服务端支持的压缩格式，按优先级排列"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def negotiate(accept_encodings):
+    """按客户端 Accept-Encoding 选出压缩格式，都不接受时返回 None"""
+    for encoding in available_encodings():
+        if accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+def compress(data, encoding, gzip_level=6, brotli_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    # mtime 固定为 0，同样的内容压缩结果相同
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+class Compressor:
+    """对超过 min_size 字节的文本响应按 Accept-Encoding 动态压缩"""
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            min_size=config['COMPRESS_MIN_SIZE'],
+            gzip_level=config['COMPRESS_GZIP_LEVEL'],
+            brotli_quality=config['COMPRESS_BROTLI_QUALITY']
+        )
+
+    def init_app(self, app):
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        if response.status_code != 200 or response.direct_passthrough or response.is_streamed \
+                or 'Content-Encoding' in response.headers \
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate(request.accept_encodings)
+        if encoding is None or (response.content_length or 0) < self.min_size:
+            return response
+        body = compress(response.get_data(), encoding, self.gzip_level, self.brotli_quality)
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        # 同一 ETag 的不同编码不是逐字节相同的表示，改为弱 ETag；If-None-Match 的弱比较仍能命中
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+Asset = namedtuple('Asset', ['mimetype', 'version', 'variants', 'mtime'])
+
+# 页面中对 static/ 资源的相对或绝对引用
+ASSET_REFERENCE = re.compile(r'''((?:src|href)=["'])(/?[^"'?#:]*static/[^"'?#]+)(["'])''')
+
+class StaticAssets:
+    """启动时预加载并预压缩的静态文件，按内容哈希生成 ETag 和版本号
+
+    variants 为 {编码: (内容, ETag)}，identity 为原始内容。超过 max_file_size 的文件不预加载，
+    由调用方退回 send_from_directory。reload 为 True 时（开发环境）每次请求检查文件修改时间。
+    """
+
+    def __init__(self, root, html_max_age=600, max_age=3600, versioned_max_age=365 * 24 * 3600,
+                 max_file_size=2 * 1024 * 1024, reload=False):
+        self.root = root
+        self.html_max_age = html_max_age
+        self.max_age = max_age
+        self.versioned_max_age = versioned_max_age
+        self.max_file_size = max_file_size
+        self.reload = reload
+        self._assets = {}
+
+    @classmethod
+    def from_config(cls, config, root, reload=False):
+        return cls(
+            root,
+            html_max_age=config['STATIC_HTML_MAX_AGE'],
+            max_age=config['STATIC_MAX_AGE'],
+            versioned_max_age=config['STATIC_VERSIONED_MAX_AGE'],
+            max_file_size=config['STATIC_PRELOAD_MAX_BYTES'],
+            reload=reload
+        )
+
+    def load(self, paths):
+        """预加载 paths（相对 root 的文件或目录）下的全部文件，先加载资源再加载引用它们的页面"""
+        files = []
+        for path in paths:
+            full_path = os.path.join(self.root, path)
+            if os.path.isdir(full_path):
+                for directory, _, names in os.walk(full_path):
+                    files += [os.path.relpath(os.path.join(directory, name), self.root) for name in names]
+            elif os.path.isfile(full_path):
+                files.append(path)
+        files = [name.replace(os.sep, '/') for name in files]
+        for name in sorted(files, key=lambda name: name.endswith('.html')):
+            self._load(name)
+        return len(self._assets)
+
+    def _load(self, name):
+        full_path = os.path.join(self.root, name)
+        stat = os.stat(full_path)
+        if stat.st_size > self.max_file_size:
+            return None
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if mimetype == 'text/html':
+            data = self._version_references(name, data)
+        digest = hashlib.sha256(data).hexdigest()
+        variants = {'identity': (data, digest)}
+        if mimetype in COMPRESSIBLE_MIMETYPES:
+            for encoding in available_encodings():
+                # 启动时只压缩一次，使用最高压缩级别
+                compressed = compress(data, encoding, gzip_level=9, brotli_quality=11)
+                if len(compressed) < len(data):
+                    variants[encoding] = (compressed, f'{digest}.{encoding}')
+        asset = Asset(mimetype, digest[:12], variants, stat.st_mtime)
+        self._assets[name] = asset
+        return asset
+
+    def _version_references(self, name, data):
+        """把页面中引用的已加载资源改写为 ?v=<版本号> 地址"""
+        base = os.path.dirname(name)
+        text = data.decode('utf-8')
+
+        def replace(match):
+            reference = match.group(2)
+            target = reference.lstrip('/') if reference.startswith('/') else \
+                os.path.normpath(os.path.join(base, reference)).replace(os.sep, '/')
+            asset = self._assets.get(target)
+            if asset is None:
+                return match.group(0)
+            return f'{match.group(1)}{reference}?v={asset.version}{match.group(3)}'
+
+        return ASSET_REFERENCE.sub(replace, text).encode('utf-8')
+
+    def get(self, name):
+        asset = self._assets.get(name)
+        if asset is not None and self.reload:
+            try:
+                if os.stat(os.path.join(self.root, name)).st_mtime != asset.mtime:
+                    asset = self._load(name)
+            except FileNotFoundError:
+                self._assets.pop(name, None)
+                return None
+        return asset
+
+    def send(self, name):
+        """返回预加载文件的响应，文件未预加载时返回 None"""
+        asset = self.get(name)
+        if asset is None:
+            return None
+        encoding = negotiate(request.accept_encodings)
+        data, etag = asset.variants.get(encoding) or asset.variants['identity']
+        response = Response(data, mimetype=asset.mimetype)
+        if data is not asset.variants['identity'][0]:
+            response.headers['Content-Encoding'] = encoding
+        if len(asset.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        response.cache_control.public = True
+        if self.reload:
+            # 开发环境下文件随时会改，每次都凭 ETag 重新验证
+            response.cache_control.no_cache = True
+        elif asset.mimetype == 'text/html':
+            response.cache_control.max_age = self.html_max_age
+        elif request.args.get('v') == asset.version:
+            response.cache_control.max_age = self.versioned_max_age
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.max_age = self.max_age
+        return response.make_conditional(request)
+
+    def __len__(self):
+        return len(self._assets)
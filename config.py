@@ -12,22 +12,104 @@ class Config:
     # 数据库配置
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # 连接池配置（MySQL 和 SQLite 文件库），峰值借出数可在 /api/health 查看
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = 10  # 等待空闲连接的秒数
+    DB_POOL_RECYCLE = 280  # PythonAnywhere 的 MySQL 会断开空闲 300 秒的连接，需提前回收
+    
+    # SQLite 每个连接建立时执行的 PRAGMA：WAL 模式下写入不阻塞读取
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # 毫秒
+        'mmap_size': 64 * 1024 * 1024
+    }
+    
     # JWT配置
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key')
     JWT_ACCESS_TOKEN_EXPIRES = 24 * 60 * 60  # 24小时
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
+    JWT_QUERY_STRING_NAME = 'token'  # 仅 /api/events 接受查询参数中的 Token（EventSource 无法设置请求头）
+    
+    # 当前用户缓存配置
+    USER_CLAIMS_MAX_AGE = 5 * 60  # Token 中 type、role 声明的可信时长（秒），之后改用缓存
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 5 * 60  # 秒
+    
+    # 响应缓存配置（/api/users、/api/rankings、/api/activity/list、/api/points/approved）
+    RESPONSE_CACHE_SIZE = 512  # 条目数上限
+    RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 响应体总字节数上限
+    RESPONSE_CACHE_TTL = 60  # 秒，其他进程的写入最迟在此时间后可见
+    
+    # 实时推送配置
+    EVENT_BROKER_URL = os.environ.get('EVENT_BROKER_URL')  # 多 worker 部署时设置为 Redis 地址，需安装 redis
+    EVENT_QUEUE_SIZE = 100  # 每个连接最多积压的事件数，超过后断开并要求客户端重新拉取
+    EVENT_MAX_SUBSCRIBERS = 200  # 每个进程的最大连接数
+    EVENT_HEARTBEAT_SECONDS = 15
+    EVENT_RETRY_MILLISECONDS = 3000  # 客户端断线后的重连间隔
+    
+    # ASGI 入口配置（uvicorn asgi:application），默认部署方式仍是同步的 Flask 应用
+    ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URL')  # 未设置时把 SQLALCHEMY_DATABASE_URI 换成异步驱动（aiosqlite / asyncmy）
+    ASYNC_WSGI_THREADS = int(os.environ.get('ASYNC_WSGI_THREADS', 8))  # 其余接口转交 Flask 处理时的线程数
+    
+    # 响应压缩配置，安装 brotli（pip install brotli）后优先使用 br
+    COMPRESS_MIN_SIZE = 1024  # 小于该字节数的响应不压缩
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4  # 动态响应用较低的压缩级别，静态文件启动时按最高级别预压缩
+    
+    # 静态页面与资源缓存配置
+    STATIC_HTML_MAX_AGE = 10 * 60  # 页面的缓存秒数，过期后凭 ETag 重新验证
+    STATIC_MAX_AGE = 60 * 60  # 未带版本号的资源
+    STATIC_VERSIONED_MAX_AGE = 365 * 24 * 60 * 60  # 页面中引用的资源带 ?v=<内容哈希>，可长期缓存
+    STATIC_PRELOAD_MAX_BYTES = 2 * 1024 * 1024  # 超过该大小的文件不预加载到内存
+    
+    # JSON 编码配置
+    JSON_FAST_ENCODER = True  # 安装了 orjson（pip install orjson）时 jsonify 用它编码，未安装时自动使用标准库
+    
+    # 监控配置
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # 设置后 /metrics 需以 Bearer Token 访问
+    SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.5))  # 超过该耗时的 SQL 打印到慢查询日志
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED') == '1'  # 打开后带 X-Profile 请求头的请求会被采样
+    PROFILER_OUTPUT_DIR = 'profiles'  # 折叠栈文件目录，可用 flamegraph.pl 或 speedscope 生成火焰图
+    
+    # 密码哈希配置，方法需写明迭代次数；调整后旧哈希会在用户下次登录时自动升级
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+    PASSWORD_SALT_LENGTH = 16
+    # 校验进程池大小。默认 0 在请求线程内计算，进程池需显式开启：单核主机上 bench_login 测得
+    # 0/2/4 个进程分别为 8.3/7.5/8.3 次登录每秒，没有收益；多核主机请先用
+    # python -m benchmarks.bench_login --pool-sizes 0 2 4 实测，有提升再设置（建议不超过 CPU 核数）
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    PASSWORD_HASH_TIMEOUT = 10  # 秒
+    # 未启用进程池时批量导入用户并行哈希的线程数（PBKDF2 计算时释放 GIL）
+    PASSWORD_HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS', min(4, os.cpu_count() or 1)))
     
     # 文件上传配置
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # 写入存储时每次读取的字节数
+    ATTACHMENT_CACHE_MAX_AGE = 365 * 24 * 60 * 60  # 附件按内容寻址，可长期缓存
+    THUMBNAIL_SIZE = (320, 320)
+    THUMBNAIL_WORKERS = 2  # 缩略图生成线程数，需安装 Pillow
+    
+    # 排行榜配置
+    LEADERBOARD_REFRESH_SECONDS = 10 * 60  # 月榜、周榜快照的最长重建间隔
+    SEMESTER_START_MONTHS = (3, 9)  # 春季学期 3 月 1 日开始，秋季学期 9 月 1 日开始
+    ACADEMIC_YEAR_START_MONTH = 9
+    
+    # 活动状态调度配置
+    ACTIVITY_SCHEDULER_IN_PROCESS = False  # 是否在 Web 进程内启动调度线程
+    ACTIVITY_SCHEDULER_INTERVAL = 60  # 秒
+    ACTIVITY_SCHEDULER_BATCH_SIZE = 200
 
 # 开发环境配置
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///dev.db'
+    ACTIVITY_SCHEDULER_IN_PROCESS = True
     BASE_URL = 'http://localhost:5000'
     ADMIN_URL = 'http://localhost:5001'
 
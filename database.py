@@ -0,0 +1,141 @@
+import sqlite3
+import sys
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+
+# 同步驱动对应的异步驱动，供 ASGI 入口（asgi.py）使用；aiosqlite、asyncmy 需另行安装
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+asyncmy',
+    'mysql+pymysql': 'mysql+asyncmy',
+    'mysql+mysqldb': 'mysql+asyncmy'
+}
+
+def engine_options(database_uri, config):
+    """按数据库类型生成 SQLALCHEMY_ENGINE_OPTIONS
+
+    MySQL：连接池大小、溢出、取连接超时、pre-ping，并在服务端断开空闲连接之前回收。
+    SQLite 文件库：同样使用连接池复用连接（PRAGMA 只需在建立连接时执行一次），
+    WAL 模式下读写互不阻塞，允许跨线程归还连接。内存库保持 SQLAlchemy 的默认设置。
+    """
+    url = make_url(database_uri)
+    if url.drivername.startswith('mysql'):
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': True
+        }
+    if url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:'):
+        return {
+            'poolclass': QueuePool,
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'connect_args': {'check_same_thread': False}
+        }
+    return {}
+
+def async_database_uri(database_uri):
+    """把同步驱动的连接地址换成对应的异步驱动，已是异步驱动时原样返回"""
+    url = make_url(database_uri)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+def async_engine_options(database_uri, config):
+    """异步引擎的连接池参数，与 engine_options 相同，SQLite 文件库改用异步适配的连接池"""
+    # 只有 ASGI 入口需要异步支持，同步部署不导入
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    options = engine_options(database_uri, config)
+    if options.get('poolclass') is QueuePool:
+        options['poolclass'] = AsyncAdaptedQueuePool
+        # aiosqlite 在自己的线程中操作连接，不需要 check_same_thread
+        options.pop('connect_args')
+    return options
+
+def is_sqlite_connection(dbapi_connection):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        return True
+    # 异步引擎（aiosqlite）的连接是适配器对象；适配器模块在创建异步引擎时才被导入，未导入时不必检查
+    aiosqlite = sys.modules.get('sqlalchemy.dialects.sqlite.aiosqlite')
+    return aiosqlite is not None and isinstance(dbapi_connection, aiosqlite.AsyncAdapt_aiosqlite_connection)
+
+def install_sqlite_pragmas(pragmas):
+    """每个新建立的 SQLite 连接执行一遍 PRAGMA（journal_mode、synchronous、busy_timeout 等）"""
+    @event.listens_for(Engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not is_sqlite_connection(dbapi_connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return set_sqlite_pragmas
+
+class PoolStats:
+    """统计连接池的借出情况，用于按连接池大小配置 worker 数量
+
+    max_checked_out 是进程启动以来同时借出连接数的峰值，接近 pool_size + max_overflow
+    说明请求在等待连接，应减少 worker 线程数或调大连接池。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.connects = 0
+        self.invalidated = 0
+
+    @classmethod
+    def attach(cls, engine):
+        stats = cls()
+        event.listen(engine, 'connect', stats._on_connect)
+        event.listen(engine, 'checkout', stats._on_checkout)
+        event.listen(engine, 'checkin', stats._on_checkin)
+        event.listen(engine, 'invalidate', stats._on_invalidate)
+        stats.pool = engine.pool
+        return stats
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            # 连接在借出期间失效时 checkin 收到的 dbapi_connection 为 None，同样计为归还
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidated += 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = {
+                'pool': type(self.pool).__name__,
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'connects': self.connects,
+                'invalidated': self.invalidated
+            }
+        if isinstance(self.pool, QueuePool):
+            stats.update({
+                'size': self.pool.size(),
+                'checked_in': self.pool.checkedin(),
+                'overflow': self.pool.overflow()
+            })
+        return stats
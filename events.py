@@ -0,0 +1,165 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:  # redis 为可选依赖，只有多 worker 部署需要跨进程广播
+    redis = None
+
+class Subscription:
+    """一个 SSE 连接的订阅：只接收所订阅主题中发给该用户（或所有人）的事件
+
+    队列有界，消费过慢导致队列写满时订阅被标记为 overflowed 并不再接收事件，
+    流随即结束并通知客户端重新拉取数据，避免一个慢连接占用无限内存。
+    """
+
+    def __init__(self, user_id, is_branch, topics, max_queue):
+        self.user_id = user_id
+        self.is_branch = is_branch
+        self.topics = set(topics)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def wants(self, event):
+        if event['topic'] not in self.topics:
+            return False
+        if event.get('branch_only') and not self.is_branch:
+            return False
+        user_ids = event.get('user_ids')
+        return user_ids is None or self.user_id in user_ids
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+class AsyncSubscription(Subscription):
+    """ASGI 入口使用的订阅：事件由发布线程通过 call_soon_threadsafe 交给事件循环，
+    连接在等待事件时不占用线程
+    """
+
+    def __init__(self, user_id, is_branch, topics, max_queue, loop):
+        super().__init__(user_id, is_branch, topics, max_queue)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.loop = loop
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # 事件循环已关闭，连接随之结束
+            self.overflowed = True
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class EventHub:
+    """进程内的发布/订阅中心
+
+    配置了 broker_url（Redis）时，publish 只把事件发到 Redis 频道，由每个进程的监听线程
+    收到后再分发给本进程的订阅者，多个 Web worker 和独立的调度进程因此能互相推送；
+    未配置或未安装 redis 时直接在本进程内分发。
+    """
+
+    def __init__(self, max_queue=100, max_subscribers=200, broker_url=None, channel='branch-system-events'):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.broker_url = broker_url
+        self.channel = channel
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._broker = None
+        self._listener = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_queue=config['EVENT_QUEUE_SIZE'],
+            max_subscribers=config['EVENT_MAX_SUBSCRIBERS'],
+            broker_url=config['EVENT_BROKER_URL']
+        )
+
+    def _get_broker(self):
+        # 延迟连接，保证预派生模型下每个 worker 进程各自拥有连接和监听线程
+        if self.broker_url and redis is not None and self._broker is None:
+            with self._lock:
+                if self._broker is None:
+                    self._broker = redis.Redis.from_url(self.broker_url)
+                    self._listener = threading.Thread(target=self._listen, name='event-broker', daemon=True)
+                    self._listener.start()
+        return self._broker
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._broker.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self._dispatch(json.loads(message['data']))
+            except Exception as e:
+                # 连接断开或消息格式错误，稍后重新订阅
+                print('事件广播监听错误:', str(e))
+                time.sleep(1)
+
+    def subscribe(self, user_id, is_branch, topics, loop=None):
+        """注册订阅，连接数已达上限时返回 None；传入 loop 时返回 AsyncSubscription"""
+        self._get_broker()
+        if loop is not None:
+            subscription = AsyncSubscription(user_id, is_branch, topics, self.max_queue, loop)
+        else:
+            subscription = Subscription(user_id, is_branch, topics, self.max_queue)
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscribers:
+                return None
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, topic, event_type, data=None, user_ids=None, branch_only=False):
+        """发布事件；user_ids 为空表示发给订阅了该主题的所有人"""
+        event = {
+            'id': uuid.uuid4().hex,
+            'topic': topic,
+            'type': event_type,
+            'data': data or {},
+            'user_ids': sorted(set(user_ids)) if user_ids is not None else None,
+            'branch_only': branch_only
+        }
+        broker = self._get_broker()
+        if broker is not None:
+            try:
+                broker.publish(self.channel, json.dumps(event))
+                return
+            except Exception as e:
+                # Redis 不可用时退回本进程分发，其他进程收不到这条事件
+                print('事件广播发送错误:', str(e))
+        self._dispatch(event)
+
+    def _dispatch(self, event):
+        if event.get('user_ids') is not None:
+            event['user_ids'] = set(event['user_ids'])
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.overflowed or not subscription.wants(event):
+                continue
+            subscription.put(event)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+def format_sse(event):
+    """按 text/event-stream 格式编码一条事件"""
+    payload = json.dumps({'type': event['type'], **event['data']}, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['topic']}\ndata: {payload}\n\n"
@@ -1,5 +1,5 @@
-from app import app, db, User
-from werkzeug.security import generate_password_hash
+from app import app, db, User, password_hasher
+from ledger import open_accounts
 
 def init_db():
     with app.app_context():
@@ -30,7 +30,7 @@ def init_db():
             if not User.query.filter_by(username=user_data['username']).first():
                 user = User(
                     username=user_data['username'],
-                    password=generate_password_hash(user_data['password']),
+                    password=password_hasher.hash(user_data['password']),
                     name=user_data['name'],
                     type=user_data['type'],
                     role=user_data['role'],
@@ -38,6 +38,10 @@ def init_db():
                 )
                 db.session.add(user)
         
+        # 新用户的基础分记入账本
+        db.session.flush()
+        open_accounts(db)
+        
         # 提交所有更改
         db.session.commit()
 
@@ -0,0 +1,259 @@
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import and_, bindparam, func, literal, or_, select
+
+# 本模块由 app 和 migrations 调用，不能在模块级导入 app，否则 `python app.py` 启动时会再次执行 app.py
+#
+# 积分账本：points_record 中已通过（approved）的记录是积分的唯一来源，包括每个用户的基础分
+# 和管理员调整。user.points 只是账本之和的缓存，由审核时的原子 UPDATE 维护，出现偏差时用
+# reconcile 修正。记录按审核时间 reviewed_at 计入账本，余额快照 points_balance_snapshot
+# 保存截至某一时刻（不含）每个用户的余额，任意时刻的余额 = 之前最近的快照 + 之后的账本变动。
+#
+# 按天汇总表 points_daily_rollup 按记录的创建日期（UTC）保存每个用户当天获得的积分，不含基础分，
+# 审核通过时随积分一起增量更新。学期、学年和自定义时间段的排行只需累加时间段内的每日汇总。
+
+BASE_POINTS = 80
+BASE_CATEGORY = '基础分'
+ADJUSTMENT_CATEGORY = '管理员调整'
+
+def is_application(category):
+    """排除基础分记录的条件：基础分是开户时写入的账本记录，不是用户的申请，不应出现在
+    申请列表、已通过积分流水和分类汇总中。category 为空的旧记录仍视为申请
+    """
+    return or_(category.is_(None), category != BASE_CATEGORY)
+
+def counts_in_windows(record):
+    """基础分不计入任何时间窗口的排行"""
+    return is_application(record.c.category)
+
+def _tables(db):
+    tables = db.metadata.tables
+    return tables['user'], tables['points_record'], tables['points_balance_snapshot']
+
+def open_accounts(db, user_ids=None, opened_at=None):
+    """为还没有基础分记录的用户写入基础分记录，返回写入的条数（由调用方提交事务）
+
+    user_ids 为空时处理所有用户。记录时间取用户的创建时间，没有时取 opened_at。
+    """
+    user, record, _ = _tables(db)
+    opened_at = opened_at or datetime.utcnow()
+    has_base = select(record.c.id).where(
+        record.c.user_id == user.c.id,
+        record.c.category == BASE_CATEGORY
+    ).exists()
+    opened = func.coalesce(user.c.created_at, literal(opened_at, record.c.created_at.type))
+    rows = select(
+        user.c.id,
+        literal(BASE_POINTS),
+        literal(BASE_CATEGORY),
+        literal(BASE_CATEGORY),
+        literal('approved'),
+        opened,
+        opened
+    ).where(~has_base)
+    if user_ids is not None:
+        rows = rows.where(user.c.id.in_(list(user_ids)))
+    result = db.session.execute(record.insert().from_select(
+        ['user_id', 'points', 'reason', 'category', 'status', 'created_at', 'reviewed_at'], rows
+    ))
+    return result.rowcount
+
+def _ledger_sum(record, user_id, before=None):
+    """某个用户在账本中的积分之和（标量子查询），before 为空时统计全部记录"""
+    conditions = [record.c.user_id == user_id, record.c.status == 'approved']
+    if before is not None:
+        conditions.append(record.c.reviewed_at < before)
+    return select(func.coalesce(func.sum(record.c.points), 0)).where(*conditions).scalar_subquery()
+
+def latest_snapshot_select(db, at):
+    """at 之前（含）最近一份余额快照的时刻，没有快照时为 NULL"""
+    _, _, snapshot = _tables(db)
+    return select(func.max(snapshot.c.as_of)).where(snapshot.c.as_of <= at)
+
+def balances_select(db, at):
+    """每个用户截至 at（不含）余额的查询，列为 (user_id, balance)
+
+    从 at 之前最近的一份快照出发，只累加快照之后的账本记录；还没有快照时从账本起点累加。
+    """
+    return balances_select_from(db, at, db.session.execute(latest_snapshot_select(db, at)).scalar())
+
+def balances_select_from(db, at, snapshot_at):
+    """与 balances_select 相同，快照时刻由调用方查询（异步视图用异步连接查询）"""
+    user, record, snapshot = _tables(db)
+    delta_conditions = [record.c.status == 'approved', record.c.reviewed_at < at]
+    if snapshot_at is not None:
+        delta_conditions.append(record.c.reviewed_at >= snapshot_at)
+    deltas = select(
+        record.c.user_id,
+        func.sum(record.c.points).label('points')
+    ).where(*delta_conditions).group_by(record.c.user_id).subquery()
+
+    balance = func.coalesce(deltas.c.points, 0)
+    query = select(user.c.id.label('user_id')).outerjoin(deltas, deltas.c.user_id == user.c.id)
+    if snapshot_at is not None:
+        query = query.outerjoin(snapshot, and_(
+            snapshot.c.user_id == user.c.id,
+            snapshot.c.as_of == snapshot_at
+        ))
+        balance = balance + func.coalesce(snapshot.c.balance, 0)
+    return query.add_columns(balance.label('balance'))
+
+def balances_as_of(db, at, user_ids=None):
+    """返回 {user_id: 截至 at 的余额}"""
+    query = balances_select(db, at)
+    if user_ids is not None:
+        user, _, _ = _tables(db)
+        query = query.where(user.c.id.in_(list(user_ids)))
+    return dict(db.session.execute(query).all())
+
+def compact(db, as_of):
+    """写入截至 as_of 的余额快照，返回写入的用户数；该时刻的快照已存在时不做任何事
+
+    由调用方提交事务。
+    """
+    _, _, snapshot = _tables(db)
+    exists = db.session.execute(
+        select(snapshot.c.as_of).where(snapshot.c.as_of == as_of).limit(1)
+    ).first()
+    if exists:
+        return 0
+    balances = balances_select(db, as_of).subquery()
+    result = db.session.execute(snapshot.insert().from_select(
+        ['as_of', 'user_id', 'balance'],
+        select(literal(as_of, snapshot.c.as_of.type), balances.c.user_id, balances.c.balance)
+    ))
+    return result.rowcount
+
+def reconcile(db, fix=False):
+    """检查缓存积分和余额快照与账本是否一致
+
+    返回 (积分偏差 [(user_id, 缓存值, 账本值)], 快照偏差 [(as_of, user_id, 快照值, 账本值)])。
+    fix 为 True 时用带相关子查询的 UPDATE 批量修正（由调用方提交事务），修正值在写入时
+    重新计算，不会覆盖检查之后并发审核产生的积分。
+    """
+    user, record, snapshot = _tables(db)
+
+    ledger_points = _ledger_sum(record, user.c.id)
+    point_drift = db.session.execute(
+        select(user.c.id, user.c.points, ledger_points).where(
+            func.coalesce(user.c.points, 0) != ledger_points
+        ).order_by(user.c.id)
+    ).all()
+
+    snapshot_points = _ledger_sum(record, snapshot.c.user_id, snapshot.c.as_of)
+    snapshot_drift = db.session.execute(
+        select(snapshot.c.as_of, snapshot.c.user_id, snapshot.c.balance, snapshot_points).where(
+            snapshot.c.balance != snapshot_points
+        ).order_by(snapshot.c.as_of, snapshot.c.user_id)
+    ).all()
+
+    if fix and point_drift:
+        db.session.execute(
+            user.update().where(user.c.id == bindparam('target_id'))
+            .values(points=_ledger_sum(record, user.c.id)),
+            [{'target_id': row[0]} for row in point_drift]
+        )
+    if fix and snapshot_drift:
+        db.session.execute(
+            snapshot.update().where(
+                snapshot.c.as_of == bindparam('target_as_of'),
+                snapshot.c.user_id == bindparam('target_id')
+            ).values(balance=_ledger_sum(record, snapshot.c.user_id, snapshot.c.as_of)),
+            [{'target_as_of': row[0], 'target_id': row[1]} for row in snapshot_drift]
+        )
+    return point_drift, snapshot_drift
+
+def credit_rollups(db, credits):
+    """把 (user_id, 积分, 记录创建时间) 累加到按天汇总表，同一天同一用户合并为一行
+
+    使用数据库的 upsert（SQLite/PostgreSQL 的 ON CONFLICT、MySQL 的 ON DUPLICATE KEY），
+    并发审核同一用户当天的申请也不会丢失增量。由调用方提交事务。
+    """
+    totals = {}
+    for user_id, points, created_at in credits:
+        key = (created_at.date(), user_id)
+        totals[key] = totals.get(key, 0) + points
+    if not totals:
+        return
+    rollup = db.metadata.tables['points_daily_rollup']
+    rows = [{'day': day, 'user_id': user_id, 'points': points} for (day, user_id), points in totals.items()]
+    dialect = db.engine.dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(rollup)
+        stmt = stmt.on_duplicate_key_update(points=rollup.c.points + stmt.inserted.points)
+    else:
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(rollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'user_id'],
+            set_={'points': rollup.c.points + stmt.excluded.points}
+        )
+    db.session.execute(stmt, rows)
+
+def rebuild_rollups(db):
+    """从账本重新生成按天汇总表，返回写入的行数（由调用方提交事务）"""
+    _, record, _ = _tables(db)
+    rollup = db.metadata.tables['points_daily_rollup']
+    day = func.date(record.c.created_at)
+    rows = select(day, record.c.user_id, func.sum(record.c.points)).where(
+        record.c.status == 'approved',
+        record.c.created_at.isnot(None),
+        counts_in_windows(record)
+    ).group_by(day, record.c.user_id)
+    db.session.execute(rollup.delete())
+    result = db.session.execute(rollup.insert().from_select(['day', 'user_id', 'points'], rows))
+    return result.rowcount
+
+def window_points_select(db, first_day, last_day):
+    """first_day 到 last_day（均含）之间每个用户获得的积分，列为 (user_id, points)"""
+    rollup = db.metadata.tables['points_daily_rollup']
+    return select(
+        rollup.c.user_id,
+        func.sum(rollup.c.points).label('points')
+    ).where(rollup.c.day >= first_day, rollup.c.day <= last_day).group_by(rollup.c.user_id)
+
+def main():
+    parser = argparse.ArgumentParser(description='积分账本维护：对账、余额快照和历史余额查询')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    reconcile_parser = subparsers.add_parser('reconcile', help='检查缓存积分和余额快照与账本是否一致')
+    reconcile_parser.add_argument('--fix', action='store_true', help='批量修正发现的偏差')
+    compact_parser = subparsers.add_parser('compact', help='写入余额快照，默认截至今天 0 点（UTC）')
+    compact_parser.add_argument('--as-of', help='快照时刻，格式 YYYY-MM-DD')
+    balance_parser = subparsers.add_parser('balance', help='查询截至某天结束（UTC）的余额')
+    balance_parser.add_argument('--as-of', required=True, help='格式 YYYY-MM-DD')
+    balance_parser.add_argument('--user-id', type=int, nargs='*')
+    subparsers.add_parser('rebuild-rollups', help='从账本重新生成按天汇总表')
+    args = parser.parse_args()
+
+    from app import app, db
+    with app.app_context():
+        if args.command == 'reconcile':
+            point_drift, snapshot_drift = reconcile(db, fix=args.fix)
+            for user_id, cached, ledger in point_drift:
+                print(f'用户 {user_id}: 缓存积分 {cached}，账本 {ledger}')
+            for as_of, user_id, balance, ledger in snapshot_drift:
+                print(f'快照 {as_of:%Y-%m-%d} 用户 {user_id}: 快照 {balance}，账本 {ledger}')
+            db.session.commit()
+            action = '已修正' if args.fix else '未修正（加 --fix 修正）'
+            print(f'对账完成：{len(point_drift)} 个用户积分偏差，{len(snapshot_drift)} 条快照偏差，{action}')
+        elif args.command == 'compact':
+            as_of = datetime.strptime(args.as_of, '%Y-%m-%d') if args.as_of else \
+                datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+            written = compact(db, as_of)
+            db.session.commit()
+            print(f'余额快照 {as_of:%Y-%m-%d}：写入 {written} 个用户')
+        elif args.command == 'rebuild-rollups':
+            written = rebuild_rollups(db)
+            db.session.commit()
+            print(f'按天汇总表重建完成：{written} 行')
+        else:
+            at = datetime.strptime(args.as_of, '%Y-%m-%d') + timedelta(days=1)
+            for user_id, balance in sorted(balances_as_of(db, at, args.user_id).items()):
+                print(f'{user_id}\t{balance}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request
+from sqlalchemy import event
+
+# 本模块由 app 导入，不能在模块级导入 app
+#
+# 进程内的请求与 SQL 指标：每个请求的耗时按 (方法, 路由, 状态码) 计入直方图，请求期间执行的
+# SQL 语句数和数据库耗时按路由累计，超过阈值的语句打印到慢查询日志。指标以 Prometheus 文本
+# 格式输出，多 worker 部署时每个进程各自统计，由 Prometheus 按实例聚合。
+#
+# 每个请求只做几次 perf_counter 和一次加锁的字典更新，可在生产环境常开。
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+def _labels(**labels):
+    pairs = ','.join('{}="{}"'.format(
+        name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    ) for name, value in labels.items())
+    return '{' + pairs + '}' if pairs else ''
+
+# 当前线程正在处理的请求：路由模板、开始时间、SQL 语句数和数据库耗时
+_local = threading.local()
+
+class Metrics:
+    """请求耗时直方图、SQL 语句计数和慢查询日志
+
+    用 init_app 注册请求钩子，attach 在引擎上注册 SQL 监听器。流式响应（SSE、CSV 导出）
+    只统计到视图返回为止，不含传输时间。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, slow_query_seconds=0.5, slow_query_max_length=1000):
+        self.buckets = buckets
+        self.slow_query_seconds = slow_query_seconds
+        self.slow_query_max_length = slow_query_max_length
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._statements = Counter()
+        self._db_seconds = Counter()
+        self._slow_queries = Counter()
+        self._in_progress = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(slow_query_seconds=config['SLOW_QUERY_SECONDS'])
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        return self
+
+    def _before_request(self):
+        _local.request = {
+            'route': request.url_rule.rule if request.url_rule is not None else 'unmatched',
+            'started': time.perf_counter(),
+            'statements': 0,
+            'db_seconds': 0.0
+        }
+        with self._lock:
+            self._in_progress += 1
+
+    def _after_request(self, response):
+        state = getattr(_local, 'request', None)
+        if state is None:
+            return response
+        elapsed = time.perf_counter() - state['started']
+        key = (request.method, state['route'], response.status_code)
+        with self._lock:
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = Histogram(self.buckets)
+            histogram.observe(elapsed)
+        response.headers['Server-Timing'] = 'db;dur={:.2f};desc="{} queries", app;dur={:.2f}'.format(
+            state['db_seconds'] * 1000, state['statements'], elapsed * 1000)
+        return response
+
+    def _teardown_request(self, exception=None):
+        if getattr(_local, 'request', None) is not None:
+            _local.request = None
+            with self._lock:
+                self._in_progress -= 1
+
+    # 开始时间记在本次执行的上下文上，语句出错时随上下文一起丢弃，不会在连接上越积越多；
+    # 没有执行上下文的底层调用只记一个值，同一连接上的语句不会嵌套执行
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+        else:
+            conn.info['query_started'] = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = context._metrics_started if context is not None else conn.info.pop('query_started')
+        elapsed = time.perf_counter() - started
+        state = getattr(_local, 'request', None)
+        route = state['route'] if state is not None else 'background'
+        if state is not None:
+            state['statements'] += 1
+            state['db_seconds'] += elapsed
+        slow = elapsed >= self.slow_query_seconds
+        with self._lock:
+            self._statements[route] += 1
+            self._db_seconds[route] += elapsed
+            if slow:
+                self._slow_queries[route] += 1
+        if slow:
+            print('慢查询: {:.1f}ms {} {}'.format(
+                elapsed * 1000, route, ' '.join(statement.split())[:self.slow_query_max_length]))
+
+    def render(self, gauges=None):
+        """按 Prometheus 文本格式输出全部指标，gauges 为额外的 {名称: (说明, 值)}"""
+        with self._lock:
+            durations = {key: (list(h.counts), h.count, h.sum) for key, h in self._durations.items()}
+            statements = dict(self._statements)
+            db_seconds = dict(self._db_seconds)
+            slow_queries = dict(self._slow_queries)
+            in_progress = self._in_progress
+
+        lines = [
+            '# HELP http_request_duration_seconds 请求处理耗时',
+            '# TYPE http_request_duration_seconds histogram'
+        ]
+        for (method, route, status), (counts, count, total) in sorted(durations.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append('http_request_duration_seconds_bucket{} {}'.format(
+                    _labels(method=method, route=route, status=status, le=bound), cumulative))
+            labels = _labels(method=method, route=route, status=status)
+            lines.append('http_request_duration_seconds_bucket{} {}'.format(
+                _labels(method=method, route=route, status=status, le='+Inf'), count))
+            lines.append(f'http_request_duration_seconds_count{labels} {count}')
+            lines.append(f'http_request_duration_seconds_sum{labels} {total:.6f}')
+
+        lines += ['# HELP http_requests_in_progress 正在处理的请求数',
+                  '# TYPE http_requests_in_progress gauge',
+                  f'http_requests_in_progress {in_progress}']
+
+        for name, help_text, values, fmt in (
+            ('db_statements_total', '执行的 SQL 语句数', statements, '{}'),
+            ('db_query_seconds_total', 'SQL 语句执行耗时', db_seconds, '{:.6f}'),
+            ('db_slow_queries_total', '超过慢查询阈值的语句数', slow_queries, '{}')
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for route, value in sorted(values.items()):
+                lines.append(f'{name}{_labels(route=route)} {fmt.format(value)}')
+
+        for name, (help_text, value) in (gauges or {}).items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+class SamplingProfiler:
+    """对单个请求所在线程定时采样调用栈，输出折叠栈（folded stacks）文本
+
+    每行为 "帧;帧;...;帧 采样次数"，可直接交给 flamegraph.pl 或 speedscope 生成火焰图。
+    采样在独立线程中进行，被采样的请求本身只增加读取栈帧时持有 GIL 的开销。
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+def profile_requests(app, output_dir, header='X-Profile', interval=0.005):
+    """为带 header 请求头的请求启动采样，请求结束后把折叠栈写入 output_dir
+
+    文件名通过响应头 X-Profile-File 返回。只应在排查问题时通过配置打开。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    @app.before_request
+    def start_profiler():
+        if request.headers.get(header):
+            g.profiler = SamplingProfiler(threading.get_ident(), interval).start()
+
+    @app.after_request
+    def stop_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.stop()
+        name = '{}-{}.folded'.format(time.strftime('%Y%m%d-%H%M%S'), request.endpoint or 'unmatched')
+        with open(os.path.join(output_dir, name), 'w', encoding='utf-8') as f:
+            f.write(profiler.folded())
+        response.headers['X-Profile-File'] = name
+        return response
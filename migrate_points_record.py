@@ -0,0 +1,111 @@
+import re
+from sqlalchemy import bindparam, inspect, select, text
+
+# 本模块由 app.init_db 调用，不能在模块级导入 app，否则 `python app.py` 启动时会再次执行 app.py
+
+# 活动负责人积分的 reason 格式：活动主要负责人：{title}
+ACTIVITY_REASON = re.compile(r'^活动(主要|次要)负责人：(.*)$', re.S)
+
+# 每批回填的记录数
+BATCH_SIZE = 500
+
+def parse_reason(reason, points, categories):
+    """把旧格式的 reason 拆分为 (category, subcategory, summary, hours)，无法识别时返回 None
+
+    categories 为 app.contributionCategories，用于识别已知的分类和项目名。
+    """
+    if not reason:
+        return None
+
+    match = ACTIVITY_REASON.match(reason)
+    if match:
+        return '活动', f'{match.group(1)}负责人', match.group(2), None
+
+    # 优先按已知的分类和项目名匹配，摘要中出现 '-' 或 ':' 也不会拆错
+    for category, subcategories in categories.items():
+        if not reason.startswith(f'{category}-'):
+            continue
+        rest = reason[len(category) + 1:]
+        for subcategory, base_points in subcategories.items():
+            if rest.startswith(f'{subcategory}:'):
+                summary = rest[len(subcategory) + 1:].strip()
+                hours = points // base_points if category == '其他贡献' else None
+                return category, subcategory, summary, hours
+
+    # 已下线的分类按 '{category}-{subcategory}: {summary}' 拆分
+    if '-' in reason and ':' in reason.split('-', 1)[1]:
+        category, rest = reason.split('-', 1)
+        subcategory, summary = rest.split(':', 1)
+        return category.strip(), subcategory.strip(), summary.strip(), None
+
+    return None
+
+def add_missing_columns(db, table_name='points_record'):
+    """为旧数据库的表补上模型中新增的字段，返回补上的字段名"""
+    table = db.metadata.tables[table_name]
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    added = []
+    with db.engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            added.append(column.name)
+    for index in table.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+    return added
+
+def backfill(db, categories):
+    """按批解析尚未拆分的 reason 并写入结构化字段，返回回填的记录数"""
+    table = db.metadata.tables['points_record']
+    filled = 0
+    last_id = 0
+    while True:
+        records = db.session.execute(
+            select(table.c.id, table.c.reason, table.c.points).where(
+                table.c.category.is_(None),
+                table.c.id > last_id
+            ).order_by(table.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not records:
+            break
+        last_id = records[-1].id
+
+        rows = []
+        for record in records:
+            parsed = parse_reason(record.reason, record.points, categories)
+            if parsed is None:
+                print(f'无法解析积分记录 {record.id}: {record.reason!r}')
+                continue
+            category, subcategory, summary, hours = parsed
+            rows.append({
+                'record_id': record.id,
+                'new_category': category,
+                'new_subcategory': subcategory,
+                'new_summary': summary,
+                'new_hours': hours
+            })
+        if rows:
+            db.session.execute(table.update().where(table.c.id == bindparam('record_id')).values(
+                category=bindparam('new_category'),
+                subcategory=bindparam('new_subcategory'),
+                summary=bindparam('new_summary'),
+                hours=bindparam('new_hours')
+            ), rows)
+        db.session.commit()
+        filled += len(rows)
+    return filled
+
+def migrate_points_record(db, categories, force_backfill=False):
+    """补齐结构化字段，只在字段刚被添加（或 force_backfill）时回填旧记录"""
+    added = add_missing_columns(db)
+    if added or force_backfill:
+        return backfill(db, categories)
+    return 0
+
+if __name__ == '__main__':
+    from app import app, db, contributionCategories
+    with app.app_context():
+        filled = migrate_points_record(db, contributionCategories, force_backfill=True)
+    print(f'积分记录迁移完成，回填 {filled} 条记录')
@@ -0,0 +1,212 @@
+import argparse
+import re
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, event, func, inspect, select
+from ledger import is_application, open_accounts, rebuild_rollups, reconcile
+from migrate_points_record import add_missing_columns, backfill
+
+# 本模块由 app.init_db 调用，不能在模块级导入 app，否则 `python app.py` 启动时会再次执行 app.py
+#
+# 新增字段或索引时：先修改 app.py 中的模型（新库由 create_all 直接建好），再在 MIGRATIONS
+# 末尾追加一个版本号递增的迁移，把改动补到已有的 dev.db、party.db 和 MySQL 库上。
+# 迁移函数必须可以重复执行：全新的库上 create_all 已经建好一切，迁移只会被记录为已应用。
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False)
+)
+
+def create_missing_indexes(db, table_names=None):
+    """创建模型中声明但数据库中不存在的索引，返回创建的索引名"""
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table_names is not None and table.name not in table_names:
+            continue
+        existing = {index['name'] for index in inspect(db.engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+    return created
+
+def points_record_structured_fields(db, categories):
+    """积分记录的分类、项目、摘要、时长字段，并从 reason 回填旧记录"""
+    add_missing_columns(db, 'points_record')
+    backfill(db, categories)
+
+def hot_query_indexes(db, categories):
+    """热点查询的复合索引：积分记录的状态/时间/用户、活动状态、用户积分和 (type, role)"""
+    create_missing_indexes(db)
+
+def points_ledger(db, categories):
+    """积分账本：补齐已通过记录的审核时间，为每个用户写入基础分记录，再按账本修正缓存积分
+
+    旧版本每次启动都把所有用户的积分重置为 80，迁移后以账本为准。
+    """
+    record = db.metadata.tables['points_record']
+    db.session.execute(record.update().where(
+        record.c.status == 'approved',
+        record.c.reviewed_at.is_(None)
+    ).values(reviewed_at=record.c.created_at))
+    opened = open_accounts(db)
+    point_drift, _ = reconcile(db, fix=True)
+    print(f'写入 {opened} 条基础分记录，按账本修正 {len(point_drift)} 个用户的积分')
+
+def points_daily_rollup(db, categories):
+    """按天汇总表，从账本回填"""
+    rebuild_rollups(db)
+
+def user_directory_index(db, categories):
+    """用户目录按姓名前缀搜索的索引"""
+    create_missing_indexes(db, ['user'])
+
+# (版本号, 名称, 迁移函数)，版本号只增不改
+MIGRATIONS = [
+    (1, 'points_record_structured_fields', points_record_structured_fields),
+    (2, 'hot_query_indexes', hot_query_indexes),
+    (3, 'points_ledger', points_ledger),
+    (4, 'points_daily_rollup', points_daily_rollup),
+    (5, 'user_directory_index', user_directory_index),
+]
+
+def applied_versions(db):
+    schema_version.create(bind=db.engine, checkfirst=True)
+    with db.engine.connect() as conn:
+        return {version for version, in conn.execute(select(schema_version.c.version))}
+
+def upgrade(db, categories, target=None):
+    """按版本号依次执行尚未应用的迁移，每个迁移成功后立即记录，返回本次应用的版本号"""
+    db.create_all()
+    done = applied_versions(db)
+    applied = []
+    for version, name, migration in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        print(f'应用数据库迁移 {version}: {name}')
+        migration(db, categories)
+        db.session.commit()
+        with db.engine.begin() as conn:
+            conn.execute(schema_version.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+        applied.append(version)
+    return applied
+
+def hot_queries(db):
+    """热点接口的查询形状及各自应使用的索引，用于检查执行计划，返回 [(名称, select, 索引名)]
+
+    索引名为 PRIMARY 时表示应使用表的主键。
+    """
+    tables = db.metadata.tables
+    user, activity, points_record = tables['user'], tables['activity'], tables['points_record']
+    rollup = tables['points_daily_rollup']
+    since = datetime.utcnow() - timedelta(days=30)
+    return [
+        ('待审核积分申请', select(points_record.c.id).where(
+            points_record.c.status == 'pending').order_by(points_record.c.created_at),
+         'ix_points_record_status_created_at'),
+        ('月榜/周榜窗口聚合', select(points_record.c.user_id, func.sum(points_record.c.points)).where(
+            points_record.c.status == 'approved', points_record.c.created_at >= since,
+            is_application(points_record.c.category)
+        ).group_by(points_record.c.user_id), 'ix_points_record_status_created_at'),
+        ('已通过积分流水', select(points_record.c.id).where(
+            points_record.c.status == 'approved', points_record.c.reviewed_at >= since,
+            is_application(points_record.c.category)
+        ).order_by(points_record.c.reviewed_at.desc()), 'ix_points_record_status_reviewed_at'),
+        ('个人积分记录', select(points_record.c.id).where(
+            points_record.c.user_id == 1, is_application(points_record.c.category)
+        ).order_by(points_record.c.created_at.desc()), 'ix_points_record_user_id_created_at'),
+        ('待审核活动', select(activity.c.id).where(
+            activity.c.status == 'pending').order_by(activity.c.created_at.desc()),
+         'ix_activity_status_created_at'),
+        ('活动列表分页', select(activity.c.id).order_by(
+            activity.c.created_at.desc(), activity.c.id.desc()).limit(20), 'ix_activity_created_at_id'),
+        ('到期活动', select(activity.c.id).where(
+            activity.c.status.in_(['approved', 'ongoing']), activity.c.end_time <= datetime.utcnow()
+        ).order_by(activity.c.end_time).limit(200), 'ix_activity_status_end_time'),
+        ('时间段排行', select(rollup.c.user_id, func.sum(rollup.c.points)).where(
+            rollup.c.day >= since.date(), rollup.c.day <= datetime.utcnow().date()
+        ).group_by(rollup.c.user_id), 'PRIMARY'),
+        ('用户目录前缀搜索', select(user.c.id, user.c.name, user.c.role).where(
+            user.c.name >= '张', user.c.name < '张\uffff').order_by(user.c.name, user.c.id).limit(20),
+         'ix_user_name_id'),
+        ('用户排名', select(func.count()).select_from(user).where(user.c.points > 80), 'ix_user_points'),
+        ('委员职务占用', select(user.c.role).where(
+            user.c.type == 'branch', user.c.role.in_(['宣传委员', '组织委员', '支部书记'])), 'ix_user_type_role'),
+    ]
+
+# SQLite 的 "SCAN <table>"（不带 USING INDEX）和 MySQL 的 type=ALL 表示全表扫描
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+SQLITE_INDEX = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+# SQLite 为复合主键建立的自动索引，记为 PRIMARY 与 MySQL 一致
+SQLITE_PRIMARY_KEY = re.compile(r'^sqlite_autoindex_\w+_1$')
+
+def explain(conn, stmt):
+    """返回 (执行计划的步骤, 全表扫描的步骤, 用到的索引名集合)"""
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+
+    # 在游标执行前加上 EXPLAIN 前缀，参数仍由 SQLAlchemy 按方言正常处理（IN 展开、日期转换）
+    def add_prefix(conn, cursor, statement, parameters, context, executemany):
+        return prefix + statement, parameters
+
+    event.listen(conn, 'before_cursor_execute', add_prefix, retval=True)
+    try:
+        cursor = conn.execute(stmt).cursor
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        event.remove(conn, 'before_cursor_execute', add_prefix)
+    if conn.dialect.name == 'sqlite':
+        steps = [row['detail'] for row in rows]
+        scans = [step for step in steps if SQLITE_FULL_SCAN.match(step)]
+        indexes = {match.group(1) for match in map(SQLITE_INDEX.search, steps) if match}
+        indexes = {'PRIMARY' if SQLITE_PRIMARY_KEY.match(index) else index for index in indexes}
+        return steps, scans, indexes
+    steps = [f"{row['table']}: type={row['type']} key={row['key']}" for row in rows]
+    scans = [f"{row['table']}: type=ALL" for row in rows if row['type'] == 'ALL']
+    return steps, scans, {row['key'] for row in rows if row['key']}
+
+def check_query_plans(db):
+    """检查所有热点查询的执行计划，返回 [(名称, 问题, 执行计划)]
+
+    每个查询都必须用到 hot_queries 中指定的索引且没有全表扫描；索引被删除时 SQLite
+    可能改用另一个索引，这里同样视为退化。MySQL 在表很小时可能认为全表扫描更快，
+    应在有代表性数据量的库上执行。
+    """
+    failures = []
+    with db.engine.connect() as conn:
+        for name, stmt, index in hot_queries(db):
+            steps, scans, indexes = explain(conn, stmt)
+            if scans:
+                failures.append((name, '全表扫描', steps))
+            elif index not in indexes:
+                failures.append((name, f'未使用索引 {index}', steps))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库版本化迁移')
+    parser.add_argument('command', nargs='?', default='upgrade', choices=['upgrade', 'status', 'check'],
+                        help='upgrade 应用未执行的迁移；status 查看迁移状态；check 检查热点查询是否使用指定的索引')
+    parser.add_argument('--target', type=int, help='只迁移到指定版本')
+    args = parser.parse_args()
+
+    from app import app, db, contributionCategories
+    with app.app_context():
+        if args.command == 'upgrade':
+            applied = upgrade(db, contributionCategories, args.target)
+            print(f'数据库迁移完成，本次应用 {len(applied)} 个迁移')
+        elif args.command == 'status':
+            done = applied_versions(db)
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4}  {'已应用' if version in done else '未应用'}  {name}")
+        else:
+            failures = check_query_plans(db)
+            for name, problem, steps in failures:
+                print(f'{name} {problem}: {"; ".join(steps)}')
+            if failures:
+                sys.exit(1)
+            print('所有热点查询均使用指定的索引')
+
+if __name__ == '__main__':
+    main()
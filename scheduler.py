@@ -0,0 +1,36 @@
+import argparse
+import time
+from app import app, db, compact_balance_snapshots, run_activity_lifecycle
+
+def run_once(batch_size):
+    with app.app_context():
+        try:
+            started, completed = run_activity_lifecycle(batch_size)
+            compacted = compact_balance_snapshots()
+        finally:
+            db.session.remove()
+    if started or completed:
+        print(f'活动状态调度：{started} 个活动开始，{completed} 个活动完成')
+    if compacted:
+        print(f'余额快照：写入 {compacted} 个用户')
+
+def main():
+    parser = argparse.ArgumentParser(description='活动状态调度 worker：推进活动状态、为负责人发放积分并写入每日余额快照')
+    parser.add_argument('--once', action='store_true', help='只执行一轮后退出，适合 cron 或 PythonAnywhere 定时任务')
+    parser.add_argument('--interval', type=int, default=app.config['ACTIVITY_SCHEDULER_INTERVAL'], help='两轮之间的间隔秒数')
+    parser.add_argument('--batch-size', type=int, default=app.config['ACTIVITY_SCHEDULER_BATCH_SIZE'], help='每个事务处理的活动数')
+    args = parser.parse_args()
+
+    if args.once:
+        run_once(args.batch_size)
+        return
+
+    while True:
+        try:
+            run_once(args.batch_size)
+        except Exception as e:
+            print('活动状态调度错误:', str(e))
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖，未安装时不生成缩略图
+    Image = None
+
+class AttachmentStorage:
+    """按 SHA-256 内容寻址的附件存储
+
+    文件保存在 root/ab/cd/<sha256>，相同内容只保存一份。上传流按块读取并同时
+    计算哈希，不会把整个文件读入内存，先写入 root/tmp，确认保存后再移入存储。缩略图由后台线程池异步生成，保存在
+    root/thumbs/ab/<sha256>.jpg。
+    """
+
+    def __init__(self, root, chunk_size=64 * 1024, thumbnail_size=(320, 320), thumbnail_workers=2):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.thumbnail_size = thumbnail_size
+        self.thumbnail_workers = thumbnail_workers
+        self._thumbnail_pool = None
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config, root_path):
+        return cls(
+            root=os.path.join(root_path, config['UPLOAD_FOLDER']),
+            chunk_size=config['UPLOAD_CHUNK_SIZE'],
+            thumbnail_size=config['THUMBNAIL_SIZE'],
+            thumbnail_workers=config['THUMBNAIL_WORKERS']
+        )
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def thumbnail_path_for(self, sha256):
+        return os.path.join(self.root, 'thumbs', sha256[:2], f'{sha256}.jpg')
+
+    def stage(self, stream):
+        """把上传流写入临时文件，返回 (sha256, 字节数, 临时文件路径)
+
+        临时文件在数据库提交后由 publish 移入存储，提交失败时由 discard 删除，
+        回滚的请求不会在存储中留下没有记录引用的文件。
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            return digest.hexdigest(), size, tmp_path
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+
+    def publish(self, sha256, tmp_path):
+        """把暂存的临时文件移到内容地址，返回是否为新文件"""
+        path = self.path_for(sha256)
+        if os.path.exists(path):
+            # 内容已存在，丢弃临时文件即可
+            self.discard(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return True
+
+    def discard(self, tmp_path):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def schedule_thumbnail(self, sha256):
+        """提交缩略图生成任务；未安装 Pillow 时不做任何事"""
+        if Image is None or not self.thumbnail_workers:
+            return None
+        if self._thumbnail_pool is None:
+            self._thumbnail_pool = ThreadPoolExecutor(max_workers=self.thumbnail_workers,
+                                                      thread_name_prefix='thumbnail')
+        return self._thumbnail_pool.submit(self._make_thumbnail, sha256)
+
+    def _make_thumbnail(self, sha256):
+        target = self.thumbnail_path_for(sha256)
+        if os.path.exists(target):
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with Image.open(self.path_for(sha256)) as image:
+                image.thumbnail(self.thumbnail_size)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+                with os.fdopen(fd, 'wb') as tmp:
+                    image.convert('RGB').save(tmp, 'JPEG', quality=85)
+            os.replace(tmp_path, target)
+            return target
+        except Exception as e:
+            print(f'生成缩略图失败 {sha256}:', str(e))
+            return None
@@ -0,0 +1,69 @@
+"""测试共用的夹具：每个测试使用一份新建的临时 SQLite 库
+
+app 在导入时就读取配置并创建引擎，因此在导入前把数据库和上传目录切换到临时目录，
+并降低密码哈希的迭代次数。运行：python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+WORK_DIR = tempfile.mkdtemp(prefix='branch-system-tests-')
+DATABASE = os.path.join(WORK_DIR, 'test.db')
+config.current_config.SQLALCHEMY_DATABASE_URI = f'sqlite:///{DATABASE}'
+config.current_config.UPLOAD_FOLDER = os.path.join(WORK_DIR, 'uploads')
+config.current_config.PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+config.current_config.PASSWORD_HASH_WORKERS = 0
+
+import app as app_module
+from benchmarks.common import StatementCounter
+
+# init_db 创建的测试账号
+PASSWORD = '12345679'
+NORMAL_USER = ('test', 'normal')
+BRANCH_USER = ('test3', 'branch')  # 支部书记
+
+def _reset_database():
+    with app_module.app.app_context():
+        app_module.db.session.remove()
+        app_module.db.engine.dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(DATABASE + suffix):
+            os.remove(DATABASE + suffix)
+    app_module.response_cache.clear()
+    app_module.user_cache.clear()
+    app_module._user_changed_at.clear()
+    app_module.init_db()
+
+@pytest.fixture
+def reset_database():
+    """重新建库，返回的函数可在同一个测试中再次调用"""
+    _reset_database()
+    return _reset_database
+
+@pytest.fixture
+def app(reset_database):
+    return app_module.app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def login(client):
+    def login(username, type_):
+        response = client.post('/api/login', json={'username': username, 'password': PASSWORD, 'type': type_})
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+    return login
+
+@pytest.fixture
+def count_statements(app):
+    """with count_statements() as counter: ... 之后 counter.count 为执行的语句数"""
+    with app.app_context():
+        engine = app_module.db.engine
+    return lambda: StatementCounter(engine)
@@ -0,0 +1,27 @@
+"""提交积分申请：按时长计分的贡献只接受有上限的正整数时长"""
+import io
+import pytest
+from conftest import NORMAL_USER, app_module
+
+def _apply(client, headers, hours):
+    return client.post('/api/points/apply', headers=headers, content_type='multipart/form-data', data={
+        'category': '其他贡献',
+        'subcategory': '义务劳动',
+        'summary': '打扫活动室',
+        'hours': hours,
+        'file': (io.BytesIO(b'GIF89a hours'), 'evidence.gif')
+    })
+
+@pytest.mark.parametrize('hours', ['abc', '0', '-3', '1.5', str(app_module.MAX_CONTRIBUTION_HOURS + 1)])
+def test_invalid_hours_are_rejected(app, client, login, hours):
+    response = _apply(client, login(*NORMAL_USER), hours)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': '无效的时长'}
+    with app.app_context():
+        assert app_module.PointsRecord.query.filter_by(status='pending').count() == 0
+
+def test_hours_multiply_points(app, client, login):
+    assert _apply(client, login(*NORMAL_USER), '3').status_code == 200
+    with app.app_context():
+        record = app_module.PointsRecord.query.filter_by(status='pending').one()
+        assert (record.hours, record.points) == (3, 3)
@@ -0,0 +1,72 @@
+"""ASGI 入口的异步接口与 Flask 视图返回相同的内容（需要安装 aiosqlite）"""
+import asyncio
+import json
+import pytest
+from benchmarks.synthetic import generate
+from conftest import BRANCH_USER, NORMAL_USER, app_module
+
+pytest.importorskip('aiosqlite')
+from asgi import AsyncApp
+
+def _call(application, path, headers):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        try:
+            await application(scope, receive, send)
+        finally:
+            await application.engine.dispose()
+
+    asyncio.run(run())
+    body = b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+    return messages[0]['status'], body
+
+@pytest.mark.parametrize('path', [
+    '/api/user/info',
+    '/api/users/directory',
+    '/api/users/directory?q=test&limit=2',
+    '/api/users/directory?limit=0',
+    '/api/rankings',
+    '/api/rankings?period=month&around=me',
+    '/api/rankings?period=semester&limit=3',
+    '/api/rankings?period=total&as_of=2030-01-01',
+    '/api/rankings?period=bad',
+    '/api/activity/list?limit=2',
+    '/api/activity/list?cursor=bad',
+    '/api/points/approved',
+    '/api/points/approved?from=bad',
+])
+@pytest.mark.parametrize('identity', [NORMAL_USER, BRANCH_USER], ids=['normal', 'branch'])
+def test_async_views_match_flask(app, client, login, monkeypatch, path, identity):
+    generate(app_module, users=30, activities=10, participants=3, records=100)
+    monkeypatch.setattr(app_module.response_cache, 'maxsize', 0)
+    headers = login(*identity)
+    application = AsyncApp(app, app.config['SQLALCHEMY_DATABASE_URI'])
+    try:
+        status, body = _call(application, path, headers)
+    finally:
+        application.wsgi.close()
+    response = client.get(path, headers=headers)
+    assert (status, json.loads(body)) == (response.status_code, response.get_json())
+
+def test_exports_are_forwarded_to_flask(app, client, login):
+    generate(app_module, users=10, activities=5, participants=2, records=30)
+    headers = login(*BRANCH_USER)
+    application = AsyncApp(app, app.config['SQLALCHEMY_DATABASE_URI'])
+    try:
+        status, body = _call(application, '/api/points/approved?format=csv', headers)
+    finally:
+        application.wsgi.close()
+    response = client.get('/api/points/approved?format=csv', headers=headers)
+    assert (status, body) == (200, response.get_data())
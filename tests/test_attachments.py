@@ -0,0 +1,99 @@
+"""积分申请的支撑材料：相同内容的并发上传和提交失败时的存储清理"""
+import hashlib
+import io
+import os
+import pytest
+from conftest import NORMAL_USER, app_module
+
+CONTENT = b'GIF89a evidence'
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+storage = app_module.attachment_storage
+
+def _apply(client, headers):
+    return client.post('/api/points/apply', headers=headers, content_type='multipart/form-data', data={
+        'category': '教学科研成果及竞赛',
+        'subcategory': '国家级',
+        'summary': '获奖',
+        'file': (io.BytesIO(CONTENT), 'evidence.gif')
+    })
+
+def _staged_files():
+    return os.listdir(os.path.join(storage.root, 'tmp'))
+
+@pytest.fixture
+def headers(login):
+    if os.path.exists(storage.path_for(SHA256)):
+        os.remove(storage.path_for(SHA256))
+    return login(*NORMAL_USER)
+
+def test_upload_is_published_after_commit(app, client, headers):
+    assert _apply(client, headers).status_code == 200
+    assert os.path.exists(storage.path_for(SHA256))
+    assert _staged_files() == []
+
+def test_concurrent_upload_of_same_content_reuses_row(app, client, headers, monkeypatch):
+    assert _apply(client, headers).status_code == 200
+    # 模拟另一个请求在本请求查询之后、插入之前提交了相同内容：第一次查询查不到，插入违反唯一约束
+    lookups = []
+    find_attachment = app_module.find_attachment
+
+    def racing_find_attachment(sha256):
+        lookups.append(sha256)
+        return None if len(lookups) == 1 else find_attachment(sha256)
+
+    monkeypatch.setattr(app_module, 'find_attachment', racing_find_attachment)
+    response = _apply(client, headers)
+    assert response.status_code == 200, response.get_json()
+    assert len(lookups) == 2
+    with app.app_context():
+        attachment_ids = {link.attachment_id for link in app_module.PointsRecordAttachment.query}
+        assert app_module.Attachment.query.count() == 1
+        assert len(attachment_ids) == 1
+        assert app_module.PointsRecord.query.filter_by(status='pending').count() == 2
+    assert _staged_files() == []
+
+def test_failed_commit_leaves_no_blob(app, client, headers, monkeypatch):
+    def failing_commit():
+        raise RuntimeError('commit failed')
+
+    monkeypatch.setattr(app_module.db.session, 'commit', failing_commit)
+    response = _apply(client, headers)
+    monkeypatch.undo()
+    assert response.status_code == 500
+    assert not os.path.exists(storage.path_for(SHA256))
+    assert _staged_files() == []
+    with app.app_context():
+        assert app_module.Attachment.query.count() == 0
+        assert app_module.PointsRecord.query.filter_by(status='pending').count() == 0
+
+def test_served_type_ignores_client_content_type(app, client, headers):
+    response = client.post('/api/points/apply', headers=headers, content_type='multipart/form-data', data={
+        'category': '教学科研成果及竞赛',
+        'subcategory': '国家级',
+        'summary': '获奖',
+        'file': (io.BytesIO(b'<script>alert(1)</script>'), 'evidence.png', 'text/html')
+    })
+    assert response.status_code == 200
+    with app.app_context():
+        attachment = app_module.Attachment.query.one()
+        assert attachment.mimetype == 'image/png'
+    response = client.get(f'/api/attachments/{attachment.id}', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.headers['X-Content-Type-Options'] == 'nosniff'
+    assert 'attachment' not in response.headers.get('Content-Disposition', '')
+
+def test_non_image_types_are_downloaded(app, client, headers):
+    assert _apply(client, headers).status_code == 200
+    with app.app_context():
+        # 旧数据中按客户端声明保存的类型
+        attachment = app_module.Attachment.query.one()
+        attachment.mimetype = 'text/html'
+        app_module.db.session.commit()
+        attachment_id = attachment.id
+    for extra in ({}, {'Range': 'bytes=0-3'}):
+        response = client.get(f'/api/attachments/{attachment_id}', headers={**headers, **extra})
+        assert response.status_code in (200, 206)
+        assert response.mimetype == 'application/octet-stream'
+        assert response.headers['Content-Disposition'].startswith('attachment')
+        assert response.headers['X-Content-Type-Options'] == 'nosniff'
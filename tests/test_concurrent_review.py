@@ -0,0 +1,146 @@
+"""并发审核：多名委员同时审核同一批积分申请，积分总数必须精确
+
+每个线程以不同的顺序把全部申请审核一遍，单条审核和批量审核混合进行，同一申请会被多个
+线程同时审核。审核结果由申请 ID 决定，无论哪个线程抢到结果都相同，因此最终积分可以事先算出。
+只允许 200 和 409（冲突），收到 409 的申请稍后重试，与前端的处理方式一致。
+"""
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from conftest import app_module
+from ledger import BASE_POINTS
+
+THREADS = 8
+MEMBERS = 20
+RECORDS = 300
+MAX_ATTEMPTS = 50
+
+def decision(record_id):
+    return record_id % 5 != 0
+
+def _seed():
+    app, db = app_module.app, app_module.db
+    User, PointsRecord = app_module.User, app_module.PointsRecord
+    rng = random.Random(0)
+    now = datetime.utcnow()
+    with app.app_context():
+        # 测试不需要真实的密码哈希
+        members = [User(username=f'member{i}', password='-', name=f'党员{i}', type='normal', role='党员',
+                        points=BASE_POINTS) for i in range(MEMBERS)]
+        reviewers = [User(username=f'reviewer{i}', password='-', name=f'委员{i}', type='branch', role='组织委员',
+                          points=BASE_POINTS) for i in range(3)]
+        db.session.add_all(members + reviewers)
+        db.session.flush()
+        app_module.open_accounts(db, [user.id for user in members + reviewers])
+        db.session.add_all([PointsRecord(
+            user_id=rng.choice(members).id,
+            points=rng.randint(1, 20),
+            reason='其他贡献-其他: 并发审核',
+            category='其他贡献',
+            subcategory='其他',
+            summary='并发审核',
+            status='pending',
+            created_at=now - timedelta(days=rng.randint(0, 40))
+        ) for _ in range(RECORDS)])
+        db.session.commit()
+        # 先建好月榜、周榜快照，审核时走增量更新路径
+        for period in app_module.LEADERBOARD_PERIODS:
+            app_module.ensure_leaderboard(period)
+        db.session.commit()
+        records = {record.id: (record.user_id, record.points)
+                   for record in PointsRecord.query.filter_by(status='pending')}
+        tokens = [app_module.create_user_token(user) for user in reviewers]
+        member_ids = [user.id for user in members]
+    return records, tokens, member_ids
+
+def _review_all(token, record_ids, seed, statuses, lock):
+    rng = random.Random(seed)
+    pending = list(record_ids)
+    rng.shuffle(pending)
+    attempts = Counter()
+    client = app_module.app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    while pending:
+        if rng.random() < 0.5:
+            batch = [pending.pop()]
+            response = client.post('/api/points/review', headers=headers,
+                                   json={'applicationId': batch[0], 'approved': decision(batch[0])})
+        else:
+            batch = pending[:rng.randint(5, 20)]
+            del pending[:len(batch)]
+            response = client.post('/api/points/review/batch', headers=headers, json={'items': [
+                {'applicationId': record_id, 'approved': decision(record_id)} for record_id in batch
+            ]})
+        with lock:
+            statuses[response.status_code] += 1
+        if response.status_code == 409:
+            # 冲突的申请放回队尾重试；已被别人审核的申请再次提交时同样返回 409
+            for record_id in batch:
+                attempts[record_id] += 1
+                if attempts[record_id] < MAX_ATTEMPTS:
+                    pending.insert(0, record_id)
+
+def test_concurrent_reviews_keep_points_exact(app):
+    records, tokens, member_ids = _seed()
+    statuses = Counter()
+    lock = threading.Lock()
+    threads = [threading.Thread(target=_review_all, args=(tokens[i % len(tokens)], list(records), i, statuses, lock))
+               for i in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(statuses) <= {200, 409}, statuses
+
+    db, User, PointsRecord = app_module.db, app_module.User, app_module.PointsRecord
+    expected = Counter({user_id: BASE_POINTS for user_id in member_ids})
+    for record_id, (user_id, points) in records.items():
+        if decision(record_id):
+            expected[user_id] += points
+    with app.app_context():
+        statuses_by_id = dict(db.session.query(PointsRecord.id, PointsRecord.status).filter(
+            PointsRecord.id.in_(list(records))))
+        assert statuses_by_id == {record_id: 'approved' if decision(record_id) else 'rejected'
+                                  for record_id in records}
+        actual = dict(db.session.query(User.id, User.points).filter(User.id.in_(member_ids)))
+        assert actual == dict(expected)
+        # 账本：每个用户已通过记录（含基础分）之和等于缓存的积分
+        ledger = dict(db.session.query(PointsRecord.user_id, db.func.sum(PointsRecord.points)).filter(
+            PointsRecord.status == 'approved', PointsRecord.user_id.in_(member_ids)
+        ).group_by(PointsRecord.user_id))
+        assert ledger == dict(expected)
+
+        for period in app_module.LEADERBOARD_PERIODS:
+            LeaderboardEntry = app_module.LeaderboardEntry
+            query = db.session.query(LeaderboardEntry.user_id, LeaderboardEntry.points).filter(
+                LeaderboardEntry.period == period, LeaderboardEntry.points != 0)
+            incremental = dict(query)
+            app_module.rebuild_leaderboard(period)
+            db.session.commit()
+            assert dict(query) == incremental, period
+
+def test_review_rejects_bad_input(client, login):
+    headers = login('test3', 'branch')
+    assert client.post('/api/points/review', headers=headers, json={'approved': True}).status_code == 400
+    assert client.post('/api/points/review/batch', headers=headers, json={'items': []}).status_code == 400
+
+def test_repeated_review_is_a_conflict_everywhere(app, client, login):
+    """已审核的活动和积分申请再次审核时都返回 409"""
+    headers = login('test3', 'branch')
+    with app.app_context():
+        member = app_module.User.query.filter_by(username='test').one()
+        now = datetime.utcnow()
+        activity = app_module.Activity(title='读书会', points=2, start_time=now + timedelta(days=1),
+                                       end_time=now + timedelta(days=2), location='活动室',
+                                       applicant_id=member.id, main_responsible_id=member.id)
+        record = app_module.PointsRecord(user_id=member.id, points=1, reason='其他贡献-义务劳动: 打扫',
+                              category='其他贡献', subcategory='义务劳动', status='pending')
+        app_module.db.session.add_all([activity, record])
+        app_module.db.session.commit()
+        activity_id, record_id = activity.id, record.id
+    for path, item in (('/api/activity/review', {'activityId': activity_id, 'approved': True}),
+                       ('/api/points/review', {'applicationId': record_id, 'approved': True})):
+        assert client.post(path, headers=headers, json=item).status_code == 200
+        assert client.post(path, headers=headers, json=item).status_code == 409
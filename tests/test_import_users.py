@@ -0,0 +1,36 @@
+"""批量导入用户：编码错误和 CSV 格式错误时返回报告，之前的行照常导入"""
+import pytest
+from conftest import BRANCH_USER, app_module
+
+def _import(client, headers, body, mimetype='text/csv'):
+    return client.post('/api/admin/users/import', headers={**headers, 'Content-Type': mimetype}, data=body)
+
+def _usernames(app):
+    with app.app_context():
+        return {username for username, in app_module.db.session.query(app_module.User.username)}
+
+@pytest.mark.parametrize('mimetype, header, row', [
+    ('text/csv', 'username,password,name,type,role\n', 'u{i},pw,成员{i},normal,党员\n'),
+    ('application/x-ndjson', '',
+     '{{"username": "u{i}", "password": "pw", "name": "成员{i}", "type": "normal", "role": "党员"}}\n'),
+], ids=['csv', 'ndjson'])
+def test_non_utf8_upload_reports_line_and_stops(app, client, login, mimetype, header, row):
+    headers = login(*BRANCH_USER)
+    body = header + ''.join(row.format(i=i) for i in range(3))
+    body = body.encode('utf-8') + row.format(i=3).encode('gbk')
+    response = _import(client, headers, body, mimetype)
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['created'] == 3
+    assert report['errors'] == [{'line': 5 if header else 4, 'username': None, 'message': app_module.IMPORT_DECODE_ERROR}]
+    assert {'u0', 'u1', 'u2'} <= _usernames(app)
+
+def test_malformed_csv_reports_error(app, client, login):
+    headers = login(*BRANCH_USER)
+    # 超过 csv.field_size_limit() 的字段
+    body = 'username,password,name,type,role\nu0,pw,成员,normal,党员\nu1,pw,' + 'x' * 200000 + ',normal,党员\n'
+    response = _import(client, headers, body.encode('utf-8'))
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['created'] == 1
+    assert len(report['errors']) == 1 and report['errors'][0]['message'].startswith('CSV 格式错误')
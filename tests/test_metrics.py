@@ -0,0 +1,17 @@
+"""SQL 指标监听器：出错的语句不能在连接上留下计时状态"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from metrics import Metrics
+
+def test_failed_statements_do_not_leak_timing_state():
+    engine = create_engine('sqlite://')
+    metrics = Metrics().attach(engine)
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM missing_table'))
+        assert conn.execute(text('SELECT 1')).scalar() == 1
+        assert 'query_started' not in conn.info
+    assert metrics._statements['background'] == 1
+    assert 'db_statements_total{route="background"} 1' in metrics.render()
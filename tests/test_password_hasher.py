@@ -0,0 +1,20 @@
+"""PasswordHasher 的批量哈希：未配置进程池时使用线程池，结果顺序与输入一致"""
+from auth import PasswordHasher
+
+def test_hash_many_uses_threads_without_process_pool():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', 16, workers=0, threads=4)
+    passwords = [f'password-{i}' for i in range(20)]
+    try:
+        hashes = hasher.hash_many(passwords)
+        assert hasher._thread_pool is not None
+    finally:
+        hasher.shutdown()
+    assert len(hashes) == len(passwords)
+    assert all(hasher.verify(pwhash, password) for pwhash, password in zip(hashes, passwords))
+    assert not hasher.needs_rehash(hashes[0])
+
+def test_hash_many_single_thread_is_serial():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', 16, workers=0, threads=1)
+    hashes = hasher.hash_many(['a', 'b'])
+    assert hasher._thread_pool is None
+    assert [hasher.verify(pwhash, password) for pwhash, password in zip(hashes, ['a', 'b'])] == [True, True]
@@ -0,0 +1,39 @@
+"""列表接口的 SQL 语句数不随行数增长（没有 N+1 查询）
+
+同一接口分别在 N 倍和 10N 倍的合成数据上请求，语句数必须相同。响应缓存关闭，
+每个接口先请求一次预热当前用户缓存和排行榜快照，再统计第二次请求。
+"""
+import pytest
+from benchmarks.synthetic import generate
+from conftest import BRANCH_USER, NORMAL_USER, app_module
+
+ENDPOINTS = [
+    ('/api/activity/list', NORMAL_USER),
+    ('/api/activity/review/list', BRANCH_USER),
+    ('/api/points/review/list', BRANCH_USER),
+    ('/api/points/approved', BRANCH_USER),
+]
+
+SCALES = {
+    'n': {'users': 10, 'activities': 10, 'participants': 3, 'records': 40},
+    '10n': {'users': 100, 'activities': 100, 'participants': 30, 'records': 400},
+}
+
+def _statements_per_request(client, login, count_statements, path, identity):
+    headers = login(*identity)
+    assert client.get(path, headers=headers).status_code == 200
+    with count_statements() as counter:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return counter.count
+
+@pytest.mark.parametrize('path, identity', ENDPOINTS, ids=[path for path, _ in ENDPOINTS])
+def test_statement_count_does_not_grow_with_rows(reset_database, client, login, count_statements,
+                                                 monkeypatch, path, identity):
+    monkeypatch.setattr(app_module.response_cache, 'maxsize', 0)
+    counts = {}
+    for scale, sizes in SCALES.items():
+        reset_database()
+        generate(app_module, **sizes)
+        counts[scale] = _statements_per_request(client, login, count_statements, path, identity)
+    assert counts['n'] == counts['10n'], counts
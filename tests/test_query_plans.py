@@ -0,0 +1,46 @@
+"""热点查询的执行计划：每个查询都必须用到 migrations.hot_queries 中指定的索引
+
+只检查 "没有全表扫描" 不够：删掉某个索引后 SQLite 往往改用另一个索引，计划里仍然没有 SCAN。
+"""
+import pytest
+from sqlalchemy import text
+from benchmarks.synthetic import generate
+from conftest import _reset_database, app_module
+from migrations import check_query_plans, explain, hot_queries
+
+db = app_module.db
+
+@pytest.fixture(scope='module')
+def seeded():
+    _reset_database()
+    generate(app_module, users=200, activities=100, participants=5, records=2000)
+    with app_module.app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('ANALYZE'))
+        yield
+
+def _query_names():
+    with app_module.app.app_context():
+        return [name for name, _, _ in hot_queries(db)]
+
+def test_check_query_plans_passes(seeded):
+    assert check_query_plans(db) == []
+
+@pytest.mark.parametrize('name', _query_names())
+def test_query_uses_expected_index(seeded, name):
+    stmt, index = next((stmt, index) for query, stmt, index in hot_queries(db) if query == name)
+    with db.engine.connect() as conn:
+        steps, scans, indexes = explain(conn, stmt)
+    assert not scans, steps
+    assert index in indexes, steps
+
+def test_check_fails_without_pending_points_index(seeded):
+    with db.engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_points_record_status_created_at'))
+    # EXPLAIN 不开启读事务，连接池里的其他连接不会重新读取表结构，仍会按已删除的索引规划
+    db.engine.dispose()
+    try:
+        failures = {name: problem for name, problem, _ in check_query_plans(db)}
+        assert failures.get('待审核积分申请') == '未使用索引 ix_points_record_status_created_at', failures
+    finally:
+        _reset_database()
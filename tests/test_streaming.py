@@ -0,0 +1,26 @@
+"""流式导出：第一块内容不等攒满 STREAM_FLUSH_BYTES 就输出"""
+import json
+from conftest import app_module
+
+def _rows(count):
+    for i in range(count):
+        yield {'id': i, 'summary': 'x' * 100}
+
+def test_ndjson_yields_first_record_immediately():
+    consumed = []
+
+    def items():
+        for item in _rows(1000):
+            consumed.append(item['id'])
+            yield item
+
+    chunks = app_module.stream_ndjson(items())
+    assert json.loads(next(chunks)) == {'id': 0, 'summary': 'x' * 100}
+    assert consumed == [0]
+    rest = ''.join(chunks).splitlines()
+    assert [json.loads(line)['id'] for line in rest] == list(range(1, 1000))
+
+def test_csv_yields_header_before_reading_rows():
+    chunks = app_module.stream_csv(['id'], ([i] for i in range(3)))
+    assert next(chunks) == '﻿id\r\n'
+    assert ''.join(chunks) == '0\r\n1\r\n2\r\n'